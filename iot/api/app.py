@@ -25,10 +25,22 @@ API_SERVICE_OPTS = [
     cfg.StrOpt('host',
                default='10.77.206.83',
                help='The listen IP for the iot API server'),
+    cfg.IntOpt('max_greenthreads',
+               default=1000,
+               help='Maximum number of connections the API server serves '
+                    'at once, each in its own green thread. Requests '
+                    'waiting for admission hold theirs, so keep this '
+                    'above max_inflight_requests plus '
+                    'max_queued_requests.'),
     cfg.IntOpt('max_limit',
                default=1000,
                help='The maximum number of items returned in a single '
-                    'response from a collection resource.')
+                    'response from a collection resource.'),
+    cfg.BoolOpt('metrics_public',
+                default=False,
+                help='Serve /metrics without authentication, for scrapers '
+                     'that cannot get a keystone token. Restrict access to '
+                     'the endpoint in the network instead.'),
 ]
 
 CONF = cfg.CONF
@@ -57,4 +69,11 @@ def setup_app(config=None):
         **app_conf
     )
 
-    return auth.install(app, CONF, api_config.app['acl_public_routes']) 
+    # NOTE: admission control sits behind authentication so requests are
+    # accounted to the project of their validated token.
+    app = middleware.AdmissionMiddleware(app, CONF)
+
+    public_routes = list(api_config.app['acl_public_routes'])
+    if CONF.api.metrics_public:
+        public_routes.append('/metrics')
+    return auth.install(app, CONF, public_routes)
@@ -2,7 +2,7 @@
 
 #from oslo.config import cfg
 #from iot import version
-from magnum.api import hooks
+from iot.api import hooks
 
 
 # Server Specific Configurations
@@ -17,7 +17,10 @@ app = {
     'modules': ['iot.api'],
     'debug': True,
     'hooks': [
+        hooks.MetricsHook(),
         hooks.ContextHook(),
+        hooks.RateLimitHook(),
+        hooks.DBSessionHook(),
         hooks.RPCHook(),
         #hooks.NoExceptionTracebackHook(),
     ],
@@ -18,6 +18,7 @@ import wsmeext.pecan as wsme_pecan
 from iot.api.controllers import base
 from iot.api.controllers import link
 from iot.api.controllers import v1
+from iot.common import metrics
 
 
 class Version(base.APIBase):
@@ -63,6 +64,15 @@ class Root(base.APIBase):
         return root
 
 
+class MetricsController(object):
+    """Metrics of the API in the Prometheus text format."""
+
+    @pecan.expose(content_type='text/plain')
+    def index(self):
+        pecan.response.content_type = metrics.CONTENT_TYPE
+        return metrics.render()
+
+
 class RootController(rest.RestController):
 
     _versions = ['v1']
@@ -73,6 +83,8 @@ class RootController(rest.RestController):
 
     v1 = v1.Controller()
 
+    metrics = MetricsController()
+
     @wsme_pecan.wsexpose(Root)
     def get(self):
         # NOTE: The reason why convert() it's being called for every
@@ -88,6 +100,6 @@ class RootController(rest.RestController):
         if the version number is not specified in the url.
         """
 
-        if args[0] and args[0] not in self._versions:
+        if args[0] and args[0] not in self._versions + ['metrics']:
             args = [self._default_version] + args
         return super(RootController, self)._route(args)
@@ -28,6 +28,7 @@ import wsmeext.pecan as wsme_pecan
 
 from iot.api.controllers import link
 from iot.api.controllers.v1 import device 
+from iot.api.controllers.v1 import job
 
 
 class APIBase(wtypes.Base):
@@ -85,6 +86,9 @@ class V1(APIBase):
     devices = [link.Link]
     """Links to the devices resource"""
 
+    jobs = [link.Link]
+    """Links to the jobs resource"""
+
     @staticmethod
     def convert():
         v1 = V1()
@@ -106,6 +110,13 @@ class V1(APIBase):
                                         'devices', '',
                                         bookmark=True)
                    ]
+        v1.jobs = [link.Link.make_link('self', pecan.request.host_url,
+                                       'jobs', ''),
+                   link.Link.make_link('bookmark',
+                                       pecan.request.host_url,
+                                       'jobs', '',
+                                       bookmark=True)
+                   ]
         return v1
 
 
@@ -113,6 +124,7 @@ class Controller(rest.RestController):
     """Version 1 API controller root."""
 
     devices = device.DevicesController()
+    jobs = job.JobsController()
 
     @wsme_pecan.wsexpose(V1)
     def get(self):
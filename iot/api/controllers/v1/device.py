@@ -24,10 +24,12 @@ import wsmeext.pecan as wsme_pecan
 from iot.api.controllers import base
 from iot.api.controllers import link
 from iot.api.controllers.v1 import collection
+from iot.api.controllers.v1 import job
 from iot.api.controllers.v1 import types
 from iot.api.controllers.v1 import utils as api_utils
 from iot.common import context
 from iot.common import exception
+from iot.common import utils
 from iot import objects
 from iot.openstack.common import log as logging
 
@@ -66,11 +68,11 @@ class Device(base.APIBase):
 
     def __init__(self, **kwargs):
         self.fields = []
-        for field in Objects.Device.fields:
-            if not hasattr(self, fields):
+        for field in objects.Device.fields:
+            if not hasattr(self, field):
                 continue
             self.fields.append(field)
-            setattr(self, field, kwargs.get(field, wstypes.Unset))
+            setattr(self, field, kwargs.get(field, wtypes.Unset))
 
     @staticmethod
     def convert_with_links(device, url, expand=True):
@@ -202,3 +204,41 @@ class DevicesController(rest.RestController):
                                                 device_uuid)
         return Device.converts_with_links(rpc_device)
         #return Device.sample()
+
+    @wsme_pecan.wsexpose(job.Job, body=Device, status_code=202)
+    def post(self, device):
+        """Create a new device.
+
+        The device is created by the conductor. The response is sent as
+        soon as the operation is queued and describes a job that can be
+        polled for its outcome.
+
+        :param device: a device within the request body.
+        """
+        if self.from_devices:
+            raise exception.OperationNotPermitted()
+
+        context = pecan.request.context
+        device_uuid = utils.generate_uuid()
+        device_obj = objects.Device(context,
+                                    uuid=device_uuid,
+                                    name=device.name,
+                                    project_id=context.tenant,
+                                    user_id=context.user)
+        rpc_job = pecan.request.rpcapi.device_create_async(device.name,
+                                                           device_uuid,
+                                                           device_obj)
+        return job.Job.convert_with_links(rpc_job)
+
+    @wsme_pecan.wsexpose(job.Job, types.uuid, status_code=202)
+    def delete(self, device_uuid):
+        """Delete a device.
+
+        :param device_uuid: UUID of a device.
+        :returns: the job tracking the deletion.
+        """
+        if self.from_devices:
+            raise exception.OperationNotPermitted()
+
+        rpc_job = pecan.request.rpcapi.device_delete_async(device_uuid)
+        return job.Job.convert_with_links(rpc_job)
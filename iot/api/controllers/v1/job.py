@@ -0,0 +1,106 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import uuid
+
+import pecan
+from pecan import rest
+import wsme
+from wsme import types as wtypes
+import wsmeext.pecan as wsme_pecan
+
+from iot.api.controllers import base
+from iot.api.controllers import link
+from iot.api.controllers.v1 import types
+from iot.common import exception
+from iot import objects
+
+
+class Job(base.APIBase):
+    """API representation of an asynchronous operation.
+
+    Operations that are carried out by the conductor return a job right
+    away. Its status goes from PENDING to RUNNING, then to SUCCEEDED or
+    FAILED.
+    """
+
+    uuid = types.uuid
+    """Unique UUID for this job"""
+
+    action = wtypes.text
+    """The operation, e.g. device_create"""
+
+    resource_uuid = types.uuid
+    """The UUID of the resource the operation applies to"""
+
+    status = wtypes.text
+    """PENDING, RUNNING, SUCCEEDED or FAILED"""
+
+    status_reason = wtypes.text
+    """Why the job failed, if it did"""
+
+    links = wsme.wsattr([link.Link], readonly=True)
+    """A list containing a self link and associated job links"""
+
+    def __init__(self, **kwargs):
+        self.fields = []
+        for field in objects.Job.fields:
+            if not hasattr(self, field):
+                continue
+            self.fields.append(field)
+            setattr(self, field, kwargs.get(field, wtypes.Unset))
+
+    @staticmethod
+    def _convert_with_links(job, url):
+        job.links = [link.Link.make_link('self', url,
+                                         'jobs', job.uuid),
+                     link.Link.make_link('bookmark', url,
+                                         'jobs', job.uuid,
+                                         bookmark=True)
+                     ]
+        return job
+
+    @classmethod
+    def convert_with_links(cls, rpc_job):
+        job = Job(**rpc_job.as_dict())
+        return cls._convert_with_links(job, pecan.request.host_url)
+
+    @classmethod
+    def sample(cls):
+        sample = cls(uuid=str(uuid.uuid1()),
+                     action='device_create',
+                     resource_uuid=str(uuid.uuid1()),
+                     status=objects.Job.PENDING,
+                     created_at=datetime.datetime.utcnow(),
+                     updated_at=datetime.datetime.utcnow())
+        return cls._convert_with_links(sample, 'http://localhost:9513')
+
+
+class JobsController(rest.RestController):
+    """REST controller for Jobs."""
+
+    @wsme_pecan.wsexpose(Job, types.uuid)
+    def get_one(self, job_uuid):
+        """Retrieve the status of an asynchronous operation.
+
+        :param job_uuid: UUID of the job.
+        """
+        context = pecan.request.context
+        rpc_job = objects.Job.get_by_uuid(context, job_uuid)
+        # Jobs of other projects are reported as missing rather than
+        # forbidden, so their uuids cannot be probed.
+        if not context.is_admin and rpc_job.project_id != context.tenant:
+            raise exception.JobNotFound(job=job_uuid)
+        return Job.convert_with_links(rpc_job)
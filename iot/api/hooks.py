@@ -16,13 +16,124 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import time
+import uuid
 
 from oslo.config import cfg
 from oslo.utils import importutils
+import pecan
 from pecan import hooks
 
+from iot.api.controllers import root
 from iot.common import context
+from iot.common import exception
+from iot.common import metrics
+from iot.common import ratelimit
+from iot.common import tracing
 from iot.conductor import api as conductor_api
+from iot.db import api as dbapi
+from iot.db import query_stats
+from iot.openstack.common._i18n import _LE
+from iot.openstack.common import log as logging
+
+DEADLINE_OPTS = [
+    cfg.FloatOpt('request_timeout',
+                 default=0,
+                 help='Seconds an API request may take, including the RPC '
+                      'calls and database queries made on its behalf, '
+                      'before work on it is abandoned. 0 means no '
+                      'deadline unless the client sets one with the '
+                      'X-Request-Timeout header.'),
+    cfg.FloatOpt('max_request_timeout',
+                 default=300,
+                 help='Upper bound on the timeout a client may request '
+                      'with the X-Request-Timeout header.'),
+]
+
+cfg.CONF.register_opts(DEADLINE_OPTS, group='api')
+
+LOG = logging.getLogger(__name__)
+
+REQUEST_TIME = metrics.histogram('iot_api_request_seconds',
+                                 'Time spent handling API requests',
+                                 ('method', 'route', 'status'))
+IN_PROGRESS = metrics.gauge('iot_api_requests_in_progress',
+                            'API requests being handled')
+
+
+def _request_timeout(header):
+    """Return the deadline for a request in seconds from now, or None."""
+    timeout = cfg.CONF.api.request_timeout
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = None
+        if requested is not None and requested > 0:
+            timeout = min(requested, cfg.CONF.api.max_request_timeout)
+    return timeout or None
+
+
+def _resources(controller_class):
+    """Return the names of the sub-controllers of a controller class."""
+    return frozenset(name for name, value in vars(controller_class).items()
+                     if not name.startswith('_') and not callable(value))
+
+
+_VERSIONS = frozenset(root.RootController._versions)
+_ROOT_RESOURCES = _resources(root.RootController) - _VERSIONS
+_RESOURCES = frozenset().union(*[
+    _resources(type(getattr(root.RootController, version)))
+    for version in _VERSIONS])
+
+
+def _route(path):
+    """Return the resource a request path is for, e.g. 'devices'.
+
+    The version is optional in paths, as for the root controller. Paths
+    the API does not route give 'unknown', so the route only takes a
+    bounded set of values whatever clients send.
+    """
+    parts = [p for p in path.split('/') if p]
+    if not parts:
+        return ''
+    if parts[0] in _ROOT_RESOURCES:
+        return parts[0]
+    if parts[0] in _VERSIONS:
+        if len(parts) == 1:
+            return parts[0]
+        parts = parts[1:]
+    return parts[0] if parts[0] in _RESOURCES else 'unknown'
+
+
+class MetricsHook(hooks.PecanHook):
+    """Record the duration and outcome of every API request.
+
+    Requests are labelled with their resource rather than their path so
+    the number of series stays bounded.
+    """
+
+    # Run before the other hooks and after them on the way out, so the
+    # time they take is accounted too.
+    priority = 10
+
+    def before(self, state):
+        state.request.metrics_start = time.time()
+        IN_PROGRESS.inc()
+
+    def after(self, state):
+        start = getattr(state.request, 'metrics_start', None)
+        if start is None:
+            return
+        IN_PROGRESS.dec()
+        status = state.response.status_int
+        # Unknown paths would each add a series.
+        route = 'unknown' if status == 404 else _route(state.request.path)
+        REQUEST_TIME.labels(state.request.method, route,
+                            str(status)).observe(time.time() - start)
+        query_stats.report(getattr(state.request, 'context', None),
+                           '%s %s' % (state.request.method,
+                                      state.request.path))
 
 
 class ContextHook(hooks.PecanHook):
@@ -45,8 +156,28 @@ class ContextHook(hooks.PecanHook):
     X-Auth-Token:
         Used for context.auth_token.
 
+    X-Request-Timeout:
+        Seconds the client is prepared to wait, sets context.deadline.
+
+    traceparent:
+        The trace of the client, parent of the trace of the request if
+        the request is sampled for tracing.
+
     """
 
+    def __init__(self, auth_uri=None):
+        self._auth_uri = auth_uri
+
+    @property
+    def auth_uri(self):
+        # Resolved on first use rather than per request. The configuration
+        # is not loaded yet when the pecan config module creates the hook.
+        if self._auth_uri is None:
+            # Import auth_token to have keystone_authtoken settings setup.
+            importutils.import_module('keystonemiddleware.auth_token')
+            self._auth_uri = cfg.CONF.keystone_authtoken.auth_uri
+        return self._auth_uri
+
     def before(self, state):
         headers = state.request.headers
         user = headers.get('X-User')
@@ -61,8 +192,7 @@ class ContextHook(hooks.PecanHook):
 
         auth_url = headers.get('X-Auth-Url')
         if auth_url is None:
-            importutils.import_module('keystonemiddleware.auth_token')
-            auth_url = cfg.CONF.keystone_authtoken.auth_uri
+            auth_url = self.auth_uri
 
         state.request.context = context.make_context(
             auth_token=auth_token,
@@ -75,6 +205,104 @@ class ContextHook(hooks.PecanHook):
             domain_id=domain_id,
             domain_name=domain_name)
 
+        timeout = _request_timeout(headers.get('X-Request-Timeout'))
+        if timeout is not None:
+            state.request.context.set_timeout(timeout)
+
+        # The trace starts with the token validation when there is one.
+        environ = state.request.environ
+        auth_start = environ.get('iot.auth_start')
+        root = tracing.start_request(
+            state.request.context, headers.get(tracing.TRACEPARENT_HEADER),
+            start=auth_start)
+        if root is not None:
+            state.request.trace_span = root
+            if auth_start is not None:
+                tracing.record_span('keystone.auth', auth_start,
+                                    environ.get('iot.auth_end'),
+                                    ctxt=state.request.context)
+
+    def after(self, state):
+        root = getattr(state.request, 'trace_span', None)
+        if root is None:
+            return
+        root.tags.update(method=state.request.method,
+                         path=state.request.path,
+                         status=state.response.status_int)
+        state.response.headers['X-Trace-Id'] = root.trace_id
+        root.finish()
+
+
+class RateLimitHook(hooks.PecanHook):
+    """Limit the request rate of each project with token buckets.
+
+    Projects get a bucket per resource and per kind of request, so a
+    project flooding one resource neither starves other projects nor its
+    own requests to other resources. Requests over the limit are refused
+    with 429 and a Retry-After header before they reach the controller.
+    """
+
+    _READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+    def __init__(self, limiter=None):
+        self._limiter = limiter
+
+    @property
+    def limiter(self):
+        # Built on first use, the configuration is not loaded when the
+        # pecan config module creates the hook.
+        if self._limiter is None:
+            self._limiter = ratelimit.RateLimiter()
+        return self._limiter
+
+    def before(self, state):
+        request = state.request
+        # The project of the validated token, not whatever a client sent.
+        project = getattr(request.context, 'tenant', None)
+        if not project or not self.limiter.enabled:
+            return
+        kind = 'read' if request.method in self._READ_METHODS else 'write'
+        wait = self.limiter.check(project, _route(request.path), kind)
+        if wait:
+            pecan.abort(429, headers={'Retry-After': str(int(wait) + 1)})
+
+
+class DBSessionHook(hooks.PecanHook):
+    """Run the database calls of a request in one session.
+
+    Only has an effect when [database]request_session is set. The
+    changes of requests that fail are rolled back.
+
+    The changes are committed once the controller has built the
+    response, but before it is sent. If the commit fails, the response
+    is replaced with a 500 error, since nothing the request did was
+    saved.
+    """
+
+    def before(self, state):
+        dbapi.get_instance().begin_request(state.request.context)
+
+    def after(self, state):
+        context = getattr(state.request, 'context', None)
+        if context is None:
+            return
+        try:
+            dbapi.get_instance().end_request(
+                context, failed=state.response.status_int >= 400)
+        except Exception as e:
+            # Logged with a correlation id, as controllers do for errors.
+            correlation_id = str(uuid.uuid4())
+            LOG.error(_LE('%(id)s: could not commit the changes of the '
+                          'request: %(error)s'),
+                      {'id': correlation_id, 'error': e})
+            response = state.response
+            response.status = 500
+            response.content_type = 'application/json'
+            response.json = {
+                'faultcode': 'Server',
+                'faultstring': exception.OBFUSCATED_MSG % correlation_id,
+                'debuginfo': None}
+
 
 class RPCHook(hooks.PecanHook):
     """Attach the rpcapi object to the request so controllers can get to it."""
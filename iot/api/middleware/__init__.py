@@ -12,12 +12,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from iot.api.middleware import admission
 from iot.api.middleware import auth_token
 from iot.api.middleware import parsable_error
 
 
+AdmissionMiddleware = admission.AdmissionMiddleware
 AuthTokenMiddleware = auth_token.AuthTokenMiddleware
 ParsableErrorMiddleware = parsable_error.ParsableErrorMiddleware
 
-__all__ = (AuthTokenMiddleware,
+__all__ = (AdmissionMiddleware,
+           AuthTokenMiddleware,
            ParsableErrorMiddleware)
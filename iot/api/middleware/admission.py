@@ -0,0 +1,354 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""
+Middleware limiting the number of requests the API works on at once.
+
+A request is admitted straight away while the worker and its project are
+below their in-flight limits. Otherwise it waits in a bounded queue
+ordered by priority, reads before writes before bulk writes, for at most
+``admission_max_wait`` seconds. Requests that find the queue full, or
+that wait too long, are rejected at once with 503 and a Retry-After
+header rather than piling up behind work the worker cannot keep up with.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+
+from oslo.config import cfg
+
+from iot.common import metrics
+from iot.openstack.common._i18n import _
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log
+
+LOG = log.getLogger(__name__)
+
+ADMISSION_OPTS = [
+    cfg.IntOpt('max_inflight_requests',
+               default=64,
+               help='Maximum number of requests a single API worker '
+                    'processes concurrently. 0 disables admission '
+                    'control.'),
+    cfg.IntOpt('max_inflight_requests_per_project',
+               default=16,
+               help='Maximum number of requests of a single project a '
+                    'single API worker processes concurrently. 0 means '
+                    'no per-project limit.'),
+    cfg.IntOpt('max_queued_requests',
+               default=128,
+               help='Maximum number of requests waiting for admission. '
+                    'Requests beyond this are rejected with 503. Each '
+                    'waiting request holds a green thread of the API '
+                    'server, see max_greenthreads.'),
+    cfg.FloatOpt('admission_max_wait',
+                 default=5.0,
+                 help='Seconds a request may wait for admission before it '
+                      'is rejected with 503.'),
+    cfg.IntOpt('admission_retry_after',
+               default=1,
+               help='Value in seconds of the Retry-After header sent with '
+                    'rejected requests.'),
+    cfg.IntOpt('bulk_request_size',
+               default=64 * 1024,
+               help='Write requests with a body of at least this many '
+                    'bytes are queued as bulk writes, behind other '
+                    'requests.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(ADMISSION_OPTS, group='api')
+
+PRIORITY_READ = 0
+PRIORITY_WRITE = 1
+PRIORITY_BULK = 2
+
+_PRIORITY_NAMES = {PRIORITY_READ: 'read',
+                   PRIORITY_WRITE: 'write',
+                   PRIORITY_BULK: 'bulk'}
+
+_READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+ADMITTED = metrics.counter('iot_api_admission_admitted_total',
+                           'Requests admitted by the API',
+                           ('priority', 'queued'))
+REJECTED = metrics.counter('iot_api_admission_rejected_total',
+                           'Requests rejected by API admission control',
+                           ('priority', 'reason'))
+INFLIGHT = metrics.gauge('iot_api_admission_inflight',
+                         'Requests admitted and not finished yet')
+QUEUED = metrics.gauge('iot_api_admission_queued',
+                       'Requests waiting for admission')
+QUEUE_WAIT = metrics.histogram('iot_api_admission_queue_seconds',
+                               'Time requests waited for admission',
+                               ('priority',))
+
+
+def request_priority(environ):
+    """Return the queueing priority of a request, lower goes first."""
+    if environ.get('REQUEST_METHOD', 'GET') in _READ_METHODS:
+        return PRIORITY_READ
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length >= CONF.api.bulk_request_size:
+        return PRIORITY_BULK
+    return PRIORITY_WRITE
+
+
+def request_project(environ):
+    """Return the project a request is accounted to, or None."""
+    return (environ.get('HTTP_X_PROJECT_ID') or
+            environ.get('HTTP_X_TENANT_ID'))
+
+
+class _Waiter(object):
+    __slots__ = ('priority', 'project', 'event', 'state')
+
+    QUEUED = 0
+    ADMITTED = 1
+    EVICTED = 2
+    CANCELLED = 3
+
+    def __init__(self, priority, project):
+        self.priority = priority
+        self.project = project
+        self.event = threading.Event()
+        self.state = self.QUEUED
+
+
+class AdmissionController(object):
+    """Track in-flight requests and queue the ones over the limits.
+
+    :param max_inflight: requests processed at once, 0 for no limit.
+    :param max_per_project: requests of one project processed at once,
+                            0 for no limit.
+    :param max_queued: requests allowed to wait for admission.
+    :param max_wait: seconds a request may wait for admission.
+    """
+
+    def __init__(self, max_inflight, max_per_project=0, max_queued=0,
+                 max_wait=0):
+        self.max_inflight = max_inflight
+        self.max_per_project = max_per_project
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.inflight = 0
+        self._projects = {}
+        self._queue = []
+        self._queued = 0
+        # Entries of the heap whose request stopped waiting, removed
+        # lazily.
+        self._dead = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _has_room(self, project):
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            return False
+        if (self.max_per_project and project is not None and
+                self._projects.get(project, 0) >= self.max_per_project):
+            return False
+        return True
+
+    def _take(self, project):
+        self.inflight += 1
+        if project is not None:
+            self._projects[project] = self._projects.get(project, 0) + 1
+
+    def _drop(self, waiter, state):
+        """Stop a queued request from waiting.
+
+        Its heap entry stays behind until it is popped, or until half of
+        the heap is made of such entries and it is rebuilt without them.
+        """
+        waiter.state = state
+        self._queued -= 1
+        self._dead += 1
+        if self._dead * 2 > len(self._queue):
+            self._queue = [entry for entry in self._queue
+                           if entry[2].state == _Waiter.QUEUED]
+            heapq.heapify(self._queue)
+            self._dead = 0
+
+    def _evict_lower(self, priority):
+        """Drop the worst queued request if it ranks below priority."""
+        victim = None
+        for entry in self._queue:
+            waiter = entry[2]
+            if waiter.state != _Waiter.QUEUED:
+                continue
+            if victim is None or entry[:2] > victim[:2]:
+                victim = entry
+        if victim is None or victim[0] <= priority:
+            return False
+        waiter = victim[2]
+        self._drop(waiter, _Waiter.EVICTED)
+        waiter.event.set()
+        return True
+
+    def _dispatch(self):
+        """Admit queued requests, best first, while there is room."""
+        skipped = []
+        while self._queue and not (self.max_inflight and
+                                   self.inflight >= self.max_inflight):
+            entry = heapq.heappop(self._queue)
+            waiter = entry[2]
+            if waiter.state != _Waiter.QUEUED:
+                self._dead -= 1
+                continue
+            if not self._has_room(waiter.project):
+                # Blocked on its project limit, let others go ahead.
+                skipped.append(entry)
+                continue
+            self._take(waiter.project)
+            self._queued -= 1
+            waiter.state = _Waiter.ADMITTED
+            waiter.event.set()
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+
+    def acquire(self, priority, project=None):
+        """Wait for a slot.
+
+        :returns: None once admitted, otherwise the reason for rejection,
+                  one of 'queue_full', 'timeout' or 'evicted'.
+        """
+        with self._lock:
+            if not self._queued and self._has_room(project):
+                self._take(project)
+                ADMITTED.labels(_PRIORITY_NAMES[priority], 'no').inc()
+                return None
+            if (self._queued >= self.max_queued and
+                    not self._evict_lower(priority)):
+                return 'queue_full'
+            waiter = _Waiter(priority, project)
+            heapq.heappush(self._queue,
+                           (priority, next(self._seq), waiter))
+            self._queued += 1
+            # Capacity may be free for this request even though others
+            # wait on their project limits.
+            self._dispatch()
+
+        waited = 0.0
+        if waiter.state == _Waiter.QUEUED:
+            start = time.time()
+            waiter.event.wait(self.max_wait or None)
+            waited = time.time() - start
+        with self._lock:
+            if waiter.state == _Waiter.QUEUED:
+                self._drop(waiter, _Waiter.CANCELLED)
+        QUEUE_WAIT.labels(_PRIORITY_NAMES[priority]).observe(waited)
+        if waiter.state == _Waiter.ADMITTED:
+            ADMITTED.labels(_PRIORITY_NAMES[priority], 'yes').inc()
+            return None
+        if waiter.state == _Waiter.EVICTED:
+            return 'evicted'
+        return 'timeout'
+
+    def release(self, project=None):
+        """Give back the slot of a finished request."""
+        with self._lock:
+            self.inflight -= 1
+            if project is not None:
+                count = self._projects.get(project, 0) - 1
+                if count > 0:
+                    self._projects[project] = count
+                else:
+                    self._projects.pop(project, None)
+            if self._queue:
+                self._dispatch()
+
+    def stats(self):
+        """Return the current in-flight and queued request counts."""
+        with self._lock:
+            queued = dict((name, 0) for name in _PRIORITY_NAMES.values())
+            for priority, _seq, waiter in self._queue:
+                if waiter.state == _Waiter.QUEUED:
+                    queued[_PRIORITY_NAMES[priority]] += 1
+            return {'inflight': self.inflight,
+                    'inflight_projects': dict(self._projects),
+                    'queue_depth': self._queued,
+                    'queued': queued,
+                    'rejected': REJECTED.snapshot()}
+
+
+class _ReleasingIterator(object):
+    """Release the admission slot once the response has been sent."""
+
+    def __init__(self, app_iter, release):
+        self._app_iter = app_iter
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._app_iter)
+
+    def close(self):
+        try:
+            close = getattr(self._app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class AdmissionMiddleware(object):
+    """Admit, queue or reject requests before they reach the API."""
+
+    def __init__(self, app, conf=None):
+        self.app = app
+        conf = conf or CONF
+        self.retry_after = str(max(1, conf.api.admission_retry_after))
+        self.controller = AdmissionController(
+            max_inflight=conf.api.max_inflight_requests,
+            max_per_project=conf.api.max_inflight_requests_per_project,
+            max_queued=conf.api.max_queued_requests,
+            max_wait=conf.api.admission_max_wait)
+        INFLIGHT.set_function(lambda: self.controller.inflight)
+        QUEUED.set_function(lambda: self.controller._queued)
+
+    def _reject(self, start_response, priority, reason):
+        REJECTED.labels(_PRIORITY_NAMES[priority], reason).inc()
+        LOG.warn(_LW('Rejecting %(priority)s request: %(reason)s'),
+                 {'priority': _PRIORITY_NAMES[priority], 'reason': reason})
+        body = json.dumps({'error_message': _(
+            'The server is busy, please retry the request later.')})
+        start_response('503 Service Unavailable',
+                       [('Content-Type', 'application/json'),
+                        ('Content-Length', str(len(body))),
+                        ('Retry-After', self.retry_after)])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        if not self.controller.max_inflight:
+            return self.app(environ, start_response)
+        priority = request_priority(environ)
+        project = request_project(environ)
+        reason = self.controller.acquire(priority, project)
+        if reason is not None:
+            return self._reject(start_response, priority, reason)
+
+        def release():
+            self.controller.release(project)
+
+        try:
+            app_iter = self.app(environ, start_response)
+        except Exception:
+            release()
+            raise
+        return _ReleasingIterator(app_iter, release)
@@ -12,17 +12,162 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import hashlib
+import hmac
+import os
 import re
+import threading
+import time
 
 from keystonemiddleware import auth_token
+from oslo.config import cfg
+from oslo.utils import timeutils
+import six
 
 from magnum.common import exception
 from magnum.common import utils
 from magnum.openstack.common._i18n import _
 from magnum.openstack.common import log
 
+TOKEN_CACHE_OPTS = [
+    cfg.IntOpt('token_cache_size',
+               default=10000,
+               help='Number of validated tokens each API worker keeps in '
+                    'memory, so repeated requests with the same token are '
+                    'not validated against keystone again. 0 disables the '
+                    'cache.'),
+    cfg.IntOpt('token_cache_time',
+               default=300,
+               help='Seconds a validated token is trusted without asking '
+                    'keystone again. Tokens are never trusted past their '
+                    'expiry.'),
+    cfg.IntOpt('token_negative_cache_time',
+               default=10,
+               help='Seconds a token keystone rejected is rejected '
+                    'without asking keystone again.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(TOKEN_CACHE_OPTS, group='api')
+
 LOG = log.getLogger(__name__)
 
+# Headers auth_token sets from a validated user token. Clients may send
+# them too, so they are stripped before the cached ones are applied.
+_IDENTITY_HEADERS = ('HTTP_X_IDENTITY_STATUS',
+                     'HTTP_X_DOMAIN_ID', 'HTTP_X_DOMAIN_NAME',
+                     'HTTP_X_PROJECT_ID', 'HTTP_X_PROJECT_NAME',
+                     'HTTP_X_PROJECT_DOMAIN_ID', 'HTTP_X_PROJECT_DOMAIN_NAME',
+                     'HTTP_X_USER_ID', 'HTTP_X_USER_NAME',
+                     'HTTP_X_USER_DOMAIN_ID', 'HTTP_X_USER_DOMAIN_NAME',
+                     'HTTP_X_ROLES', 'HTTP_X_SERVICE_CATALOG',
+                     'HTTP_X_TENANT_ID', 'HTTP_X_TENANT_NAME',
+                     'HTTP_X_TENANT', 'HTTP_X_USER', 'HTTP_X_ROLE',
+                     'HTTP_X_TRUST_ID', 'HTTP_X_IS_ADMIN_PROJECT')
+
+_ENV_KEYS = ('keystone.token_info', 'keystone.token_auth')
+
+# auth_token sets the X-Service-* headers from a service token, which is
+# not part of the cache key: requests carrying one are never served from
+# the cache, and the headers are stripped from those that are.
+_SERVICE_TOKEN = 'HTTP_X_SERVICE_TOKEN'
+_SERVICE_HEADER_PREFIX = 'HTTP_X_SERVICE_'
+
+
+def _strip_identity(env):
+    """Remove the identity headers a client may have forged."""
+    for key in list(env):
+        if (key in _IDENTITY_HEADERS or
+                key.startswith(_SERVICE_HEADER_PREFIX)):
+            del env[key]
+
+
+def _token_expiry(token_info):
+    """Return the expiry of a v2 or v3 token as a timestamp, or None."""
+    try:
+        if 'access' in token_info:
+            expires = token_info['access']['token']['expires']
+        else:
+            expires = token_info['token']['expires_at']
+        expires = timeutils.normalize_time(timeutils.parse_isotime(expires))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return time.time() + timeutils.delta_seconds(timeutils.utcnow(), expires)
+
+
+class TokenCache(object):
+    """A bounded LRU of token validation results.
+
+    Tokens are keyed by an HMAC under a key private to the process, so
+    neither the raw tokens nor plain digests of them are held in memory.
+    Rejected tokens are remembered for a shorter time than valid ones.
+    """
+
+    def __init__(self, size, ttl, negative_ttl):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, token):
+        if isinstance(token, six.text_type):
+            token = token.encode('utf-8')
+        return hmac.new(self._key, token, hashlib.sha256).digest()
+
+    def get(self, token):
+        """Return (found, value) for a token."""
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return False, None
+            self._entries[digest] = entry
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, token, value, expires=None, rejected=False):
+        """Remember the outcome of validating a token.
+
+        :param value: what get() returns for the token.
+        :param expires: timestamp after which the token is invalid.
+        :param rejected: keystone rejected the token, keep it for the
+                         shorter negative cache time.
+        """
+        ttl = self.negative_ttl if rejected else self.ttl
+        if ttl <= 0:
+            return
+        until = time.time() + ttl
+        if expires is not None:
+            until = min(until, expires)
+        digest = self._digest(token)
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._entries[digest] = (until, value)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _mark_authenticated(app):
+    """Note in the environment when the request passed authentication.
+
+    Together with iot.auth_start this gives the time spent validating the
+    token, which the request trace shows.
+    """
+    def call(env, start_response):
+        env['iot.auth_end'] = time.time()
+        return app(env, start_response)
+    return call
+
 
 class AuthTokenMiddleware(auth_token.AuthProtocol):
     """A wrapper on Keystone auth_token middleware.
@@ -44,6 +189,61 @@ class AuthTokenMiddleware(auth_token.AuthProtocol):
             raise exception.ConfigInvalid(error_msg=msg)
 
         super(AuthTokenMiddleware, self).__init__(app, conf)
+        self._app = _mark_authenticated(self._app)
+        self._token_cache = self._make_token_cache()
+
+    @staticmethod
+    def _make_token_cache():
+        if CONF.api.token_cache_size <= 0:
+            return None
+        return TokenCache(CONF.api.token_cache_size,
+                          CONF.api.token_cache_time,
+                          CONF.api.token_negative_cache_time)
+
+    def _authenticate(self, env, start_response):
+        """Validate the request token with keystone and call the app."""
+        return super(AuthTokenMiddleware, self).__call__(env, start_response)
+
+    def _call_cached(self, token, env, start_response):
+        found, entry = self._token_cache.get(token)
+        if found:
+            _strip_identity(env)
+            identity, rejection = entry
+            if rejection is not None:
+                LOG.debug('Rejecting a recently rejected token')
+                status, headers, body = rejection
+                start_response(status, list(headers))
+                return [body]
+            env.update(identity)
+            return self._app(env, start_response)
+
+        response = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return start_response(status, headers, exc_info)
+
+        app_iter = self._authenticate(env, capture_start_response)
+        if env.get('HTTP_X_IDENTITY_STATUS') == 'Confirmed':
+            identity = dict((key, env[key])
+                            for key in _IDENTITY_HEADERS + _ENV_KEYS
+                            if key in env)
+            self._token_cache.set(
+                token, (identity, None),
+                expires=_token_expiry(env.get('keystone.token_info') or {}))
+        elif response and response[0].startswith('401'):
+            # The body is replayed along with the headers, which describe
+            # it, e.g. its Content-Length.
+            try:
+                body = b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            self._token_cache.set(token,
+                                  (None, (response[0], response[1], body)),
+                                  rejected=True)
+            return [body]
+        return app_iter
 
     def __call__(self, env, start_response):
         path = utils.safe_rstrip(env.get('PATH_INFO'), '/')
@@ -57,4 +257,11 @@ class AuthTokenMiddleware(auth_token.AuthProtocol):
         if env['is_public_api']:
             return self._app(env, start_response)
 
-        return super(AuthTokenMiddleware, self).__call__(env, start_response)
+        env['iot.auth_start'] = time.time()
+
+        token = env.get('HTTP_X_AUTH_TOKEN', env.get('HTTP_X_STORAGE_TOKEN'))
+        if (token and self._token_cache is not None and
+                _SERVICE_TOKEN not in env):
+            return self._call_cached(token, env, start_response)
+
+        return self._authenticate(env, start_response)
@@ -12,17 +12,21 @@
 
 """Starter script for the IoT API service."""
 
-import logging as std_logging
-import os
-import sys
-from wsgiref import simple_server
+# Requests are served by green threads, which must not block each other.
+import eventlet
+eventlet.monkey_patch(os=False)
 
-from oslo.config import cfg
+import logging as std_logging  # noqa
+import os  # noqa
+import sys  # noqa
 
-from iot.api import app as api_app
-from iot.common import service
-from iot.openstack.common._i18n import _
-from iot.openstack.common import log as logging
+from eventlet import wsgi  # noqa
+from oslo.config import cfg  # noqa
+
+from iot.api import app as api_app  # noqa
+from iot.common import service  # noqa
+from iot.openstack.common._i18n import _  # noqa
+from iot.openstack.common import log as logging  # noqa
 
 
 LOG = logging.getLogger(__name__)
@@ -32,9 +36,12 @@ def main():
     service.prepare_service(sys.argv)
     app = api_app.setup_app()
 
-    # Create the WSGI server and start it
+    # Create the WSGI server and start it. Each connection is served by a
+    # green thread of the pool, admission control decides how many of
+    # them work on their request at once.
     host, port = cfg.CONF.api.host, cfg.CONF.api.port
-    srv = simple_server.make_server(host, port, app)
+    sock = eventlet.listen((host, port))
+    pool = eventlet.GreenPool(cfg.CONF.api.max_greenthreads)
 
     LOG.info(_('Starting server in PID %s') % os.getpid())
     LOG.debug("Configuration:")
@@ -50,4 +57,5 @@ def main():
                  dict(host=host, port=port))
         print "serving on http://%s:%s" % (host,port)
 
-    srv.serve_forever()
+    wsgi.server(sock, app, custom_pool=pool,
+                log=logging.WritableLogger(LOG))
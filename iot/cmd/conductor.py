@@ -20,8 +20,11 @@ import sys
 
 from oslo.config import cfg
 
+from iot.common import metrics
+from iot.common import profiler
 from iot.common import rpc_service as service
 from iot.conductor.handlers import driver 
+from iot.conductor.handlers import indirection
 from iot.openstack.common._i18n import _
 from iot.openstack.common import log as logging
 
@@ -31,6 +34,8 @@ LOG = logging.getLogger(__name__)
 def main():
     cfg.CONF(sys.argv[1:], project='iot')
     logging.setup('iot')
+    profiler.setup()
+    metrics.setup()
 
     LOG.info(_('Starting server in PID %s') % os.getpid())
     LOG.debug("Configuration:")
@@ -40,6 +45,7 @@ def main():
     cfg.CONF.import_opt('host', 'iot.conductor.config', group='conductor')
     endpoints = [
         driver.Handler(),
+        indirection.Handler(),
     ]
 
     server = service.Service(cfg.CONF.conductor.topic,
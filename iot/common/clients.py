@@ -44,7 +44,11 @@ cfg.CONF.register_opts(heat_client_opts, group='heat_client')
 
 
 class OpenStackClients(object):
-    """Convenience class to create and cache client instances."""
+    """Convenience class to create and cache client instances.
+
+    Clients are shared with other instances authenticated the same way,
+    see iot_keystoneclient.ClientCache.
+    """
 
     def __init__(self, context):
         self.context = context
@@ -77,6 +81,18 @@ class OpenStackClients(object):
         if self._heat:
             return self._heat
 
+        keystone = self.keystone()
+        key = ('heat', self.auth_url, self.context.tenant,
+               self.context.trust_id,
+               iot_keystoneclient.token_key(self.auth_token))
+        # The heat client authenticates with the keystone token, it is
+        # only as fresh as the token it was created with.
+        self._heat = iot_keystoneclient.CLIENT_CACHE.get(
+            key, lambda: (self._heat_client_init(),
+                          keystone.client.auth_ref))
+        return self._heat
+
+    def _heat_client_init(self):
         endpoint_type = self._get_client_option('heat', 'endpoint_type')
         endpoint = self.url_for(service_type='orchestration',
                                 endpoint_type=endpoint_type)
@@ -92,6 +108,4 @@ class OpenStackClients(object):
             'key_file': self._get_client_option('heat', 'key_file'),
             'insecure': self._get_client_option('heat', 'insecure')
         }
-        self._heat = heatclient.Client(**args)
-
-        return self._heat
+        return heatclient.Client(**args)
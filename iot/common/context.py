@@ -12,7 +12,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import time
+
 from oslo_context import context
+import six
+
+from iot.common import exception
+from iot.common import tracing
 
 
 class RequestContext(context.RequestContext):
@@ -21,13 +27,19 @@ class RequestContext(context.RequestContext):
     def __init__(self, auth_token=None, auth_url=None, domain_id=None,
                  domain_name=None, user=None, tenant=None, is_admin=False,
                  is_public_api=False, read_only=False, show_deleted=False,
-                 request_id=None, trust_id=None, auth_token_info=None):
+                 request_id=None, trust_id=None, auth_token_info=None,
+                 timeout=None, trace=None):
         """Stores several additional request parameters:
 
         :param domain_id: The ID of the domain.
         :param domain_name: The name of the domain.
         :param is_public_api: Specifies whether the request should be processed
                               without authentication.
+        :param timeout: Seconds from now after which nobody is waiting for
+                        the outcome of the request any more. See
+                        set_timeout().
+        :param trace: The trace the request is recorded in, a
+                      tracing.TraceContext or its traceparent value.
 
         """
         self.is_public_api = is_public_api
@@ -36,6 +48,12 @@ class RequestContext(context.RequestContext):
         self.auth_url = auth_url
         self.auth_token_info = auth_token_info
         self.trust_id = trust_id
+        self.deadline = None
+        if timeout is not None:
+            self.set_timeout(timeout)
+        if isinstance(trace, six.string_types):
+            trace = tracing.TraceContext.from_header(trace)
+        self.trace = trace
 
         super(RequestContext, self).__init__(auth_token=auth_token,
                                              user=user, tenant=tenant,
@@ -44,20 +62,101 @@ class RequestContext(context.RequestContext):
                                              show_deleted=show_deleted,
                                              request_id=request_id)
 
+    def set_timeout(self, timeout):
+        """Set the deadline of the request to timeout seconds from now.
+
+        The deadline only ever moves closer: a timeout that ends after the
+        current deadline is ignored.
+        """
+        deadline = time.time() + timeout
+        if self.deadline is None or deadline < self.deadline:
+            self.deadline = deadline
+
+    def time_remaining(self):
+        """Return the seconds left before the deadline, or None."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def check_deadline(self, operation=None):
+        """Raise DeadlineExceeded if the deadline has passed.
+
+        :param operation: what was about to be done, for the error message.
+        """
+        if self.expired:
+            raise exception.DeadlineExceeded(
+                operation=operation or 'request',
+                request_id=self.request_id)
+
+    def __setattr__(self, name, value):
+        # Any change makes the values cached for log records stale.
+        self.__dict__.pop('_log_values', None)
+        super(RequestContext, self).__setattr__(name, value)
+
+    def to_log_dict(self):
+        """Return the values log records are formatted with.
+
+        The values are computed once and cached on the context until it
+        is changed, rather than for every record logged.
+        """
+        values = self.__dict__.get('_log_values')
+        if values is None:
+            values = self.to_dict()
+            # The remaining time and the open span would be stale in the
+            # cached copy.
+            values.pop('timeout', None)
+            values.pop('trace', None)
+            self.__dict__['_log_values'] = values
+        return values
+
     def to_dict(self):
-        return {'auth_token': self.auth_token,
-                'user': self.user,
-                'tenant': self.tenant,
-                'is_admin': self.is_admin,
-                'read_only': self.read_only,
-                'show_deleted': self.show_deleted,
-                'request_id': self.request_id,
-                'domain_id': self.domain_id,
-                'domain_name': self.domain_name,
-                'is_public_api': self.is_public_api}
+        values = {'auth_token': self.auth_token,
+                  'user': self.user,
+                  'tenant': self.tenant,
+                  'is_admin': self.is_admin,
+                  'read_only': self.read_only,
+                  'show_deleted': self.show_deleted,
+                  'request_id': self.request_id,
+                  'domain_id': self.domain_id,
+                  'domain_name': self.domain_name,
+                  'is_public_api': self.is_public_api}
+        # NOTE: the deadline travels as the time remaining rather than as
+        # an absolute time, so clock skew between hosts does not matter.
+        # It is left out when unset, older services reject unknown keys.
+        if self.deadline is not None:
+            values['timeout'] = max(0.0, self.time_remaining())
+        # Likewise only traced requests carry their trace, with the span
+        # open when the context is sent as the parent of remote spans.
+        if self.trace is not None:
+            values['trace'] = self.trace.to_header()
+        return values
 
     @classmethod
     def from_dict(cls, values):
         values.pop('user', None)
         values.pop('tenant', None)
         return cls(**values)
+
+
+def get_current():
+    """Return the context of the request being processed, if any."""
+    return context.get_current()
+
+
+def check_deadline(operation=None):
+    """Raise DeadlineExceeded if the current request is past its deadline."""
+    ctxt = get_current()
+    if ctxt is not None and getattr(ctxt, 'deadline', None) is not None:
+        ctxt.check_deadline(operation)
+
+
+def time_remaining():
+    """Return the seconds left to the current request, or None."""
+    ctxt = get_current()
+    if ctxt is None or getattr(ctxt, 'deadline', None) is None:
+        return None
+    return ctxt.time_remaining()
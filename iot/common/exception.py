@@ -263,6 +263,16 @@ class OrphanedObjectError(IoTException):
     message = _('Cannot call %(method)s on orphaned %(objtype)s object')
 
 
+class DeadlineExceeded(IoTException):
+    message = _("Deadline of request %(request_id)s exceeded before "
+                "%(operation)s.")
+    code = 504
+
+
+class ObjectActionError(IoTException):
+    message = _('Object action %(action)s failed because: %(reason)s')
+
+
 class Invalid(IoTException):
     message = _("Unacceptable parameters.")
     code = 400
@@ -342,6 +352,14 @@ class DeviceAlreadyExists(Conflict):
     message = _("A device with UUID %(uuid)s already exists.")
 
 
+class JobNotFound(ResourceNotFound):
+    message = _("Job %(job)s could not be found.")
+
+
+class JobAlreadyExists(Conflict):
+    message = _("A job with UUID %(uuid)s already exists.")
+
+
 class KeystoneUnauthorized(IoTException):
     message = _("Not authorized in Keystone.")
 
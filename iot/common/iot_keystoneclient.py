@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import copy
+import hashlib
+import threading
 
 import keystoneclient.exceptions as kc_exception
 from keystoneclient.v3 import client as kc_v3
 from oslo.config import cfg
 from oslo.utils import importutils
+import six
 
 from magnum.common import context
 from magnum.common import exception
@@ -31,11 +35,89 @@ trust_opts = [
                 default=['magnum_assembly_update'],
                 help=_('Subset of trustor roles to be delegated to magnum.')),
 ]
+client_cache_opts = [
+    cfg.IntOpt('client_cache_size',
+               default=1000,
+               help=_('Number of authenticated OpenStack clients kept per '
+                      'process and shared between requests. 0 disables '
+                      'sharing.')),
+    cfg.IntOpt('client_cache_refresh_margin',
+               default=60,
+               help=_('Seconds before its token expires at which a shared '
+                      'client is replaced by a newly authenticated one.')),
+]
 cfg.CONF.register_opts(trust_opts)
+cfg.CONF.register_opts(client_cache_opts)
 cfg.CONF.import_opt('auth_uri', 'keystonemiddleware.auth_token',
                     group='keystone_authtoken')
 
 
+def token_key(token):
+    """Return a digest of a token suitable for use in a cache key."""
+    if token is None:
+        return None
+    if isinstance(token, six.text_type):
+        token = token.encode('utf-8')
+    return hashlib.sha256(token).hexdigest()
+
+
+class ClientCache(object):
+    """Authenticated clients shared by all requests of a process.
+
+    Each entry is a client and the keystone auth_ref its token came from.
+    An entry whose token is about to expire is replaced by a new client,
+    so callers never get a client with a stale token. Reusing clients
+    also reuses their HTTP connections.
+    """
+
+    def __init__(self):
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_fresh(auth_ref):
+        if auth_ref is None:
+            return True
+        try:
+            return not auth_ref.will_expire_soon(
+                stale_duration=cfg.CONF.client_cache_refresh_margin)
+        except Exception:
+            # An auth_ref without a parsable expiry, do not trust it.
+            return False
+
+    def get(self, key, create):
+        """Return the client cached for key, creating it if need be.
+
+        :param key: a tuple identifying the endpoint, project and
+                    credentials the client is authenticated with.
+        :param create: called to create the client, returns a
+                       (client, auth_ref) tuple.
+        """
+        size = cfg.CONF.client_cache_size
+        if size <= 0:
+            return create()[0]
+        with self._lock:
+            entry = self._clients.pop(key, None)
+            if entry is not None and self._is_fresh(entry[1]):
+                self._clients[key] = entry
+                return entry[0]
+        # Authenticate outside of the lock, this is a call to keystone.
+        entry = create()
+        with self._lock:
+            self._clients[key] = entry
+            while len(self._clients) > size:
+                self._clients.popitem(last=False)
+        return entry[0]
+
+    def clear(self):
+        """Forget all clients, e.g. after forking worker processes."""
+        with self._lock:
+            self._clients.clear()
+
+
+CLIENT_CACHE = ClientCache()
+
+
 class KeystoneClientV3(object):
     """Keystone client wrapper so we can encapsulate logic in one place."""
 
@@ -80,15 +162,38 @@ class KeystoneClientV3(object):
         if not self._admin_client:
             # Create admin client connection to v3 API
             admin_creds = self._service_admin_creds()
-            c = kc_v3.Client(**admin_creds)
-            if c.authenticate():
-                self._admin_client = c
-            else:
-                LOG.error("Admin client authentication failed")
-                raise exception.AuthorizationFailure()
+            key = ('admin', self.v3_endpoint, admin_creds['username'],
+                   admin_creds['project_name'])
+            self._admin_client = CLIENT_CACHE.get(
+                key, lambda: self._admin_client_init(admin_creds))
         return self._admin_client
 
+    @staticmethod
+    def _admin_client_init(admin_creds):
+        c = kc_v3.Client(**admin_creds)
+        if not c.authenticate():
+            LOG.error("Admin client authentication failed")
+            raise exception.AuthorizationFailure()
+        return c, c.auth_ref
+
     def _v3_client_init(self):
+        if self.context.trust_id is not None:
+            key = ('trust', self.v3_endpoint, self.context.trust_id)
+        else:
+            key = ('token', self.v3_endpoint, self.context.tenant,
+                   token_key(self.context.auth_token))
+        client = CLIENT_CACHE.get(key, self._v3_client_create)
+        # If we are authenticating with a trust set the context auth_token
+        # with the trust scoped token
+        if self.context.trust_id is not None:
+            self.context.auth_token = client.auth_ref.auth_token
+            self.context.auth_url = self.v3_endpoint
+            self.context.user = client.auth_ref.user_id
+            self.context.tenant = client.auth_ref.project_id
+            self.context.user_name = client.auth_ref.username
+        return client
+
+    def _v3_client_create(self):
         kwargs = {
             'auth_url': self.v3_endpoint,
             'endpoint': self.v3_endpoint
@@ -126,21 +231,12 @@ class KeystoneClientV3(object):
         client = kc_v3.Client(**kwargs)
         if 'auth_ref' not in kwargs:
             client.authenticate()
-        # If we are authenticating with a trust set the context auth_token
-        # with the trust scoped token
-        if 'trust_id' in kwargs:
-            # Sanity check
-            if not client.auth_ref.trust_scoped:
-                LOG.error(_("trust token re-scoping failed!"))
-                raise exception.AuthorizationFailure()
-            # All OK so update the context with the token
-            self.context.auth_token = client.auth_ref.auth_token
-            self.context.auth_url = self.v3_endpoint
-            self.context.user = client.auth_ref.user_id
-            self.context.tenant = client.auth_ref.project_id
-            self.context.user_name = client.auth_ref.username
+        # Sanity check
+        if 'trust_id' in kwargs and not client.auth_ref.trust_scoped:
+            LOG.error(_("trust token re-scoping failed!"))
+            raise exception.AuthorizationFailure()
 
-        return client
+        return client, client.auth_ref
 
     def _service_admin_creds(self):
         # Import auth_token to have keystone_authtoken settings setup.
@@ -151,7 +247,8 @@ class KeystoneClientV3(object):
             'auth_url': self.v3_endpoint,
             'endpoint': self.v3_endpoint,
             'project_name': cfg.CONF.keystone_authtoken.admin_tenant_name}
-        LOG.info('admin creds %s' % creds)
+        LOG.debug('admin creds for user %(username)s in project '
+                  '%(project_name)s', creds)
         return creds
 
     def create_trust_context(self):
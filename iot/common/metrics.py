@@ -0,0 +1,498 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process metrics registry.
+
+Metrics are registered once, usually at module import time, and updated
+from hot paths. Updating a metric is a dict lookup and a few arithmetic
+operations; nothing is formatted until the registry is queried.
+
+Example::
+
+    REQUESTS = metrics.counter('iot_requests_total', 'Handled requests',
+                               ('method',))
+    REQUESTS.labels('GET').inc()
+
+:func:`render` returns the metrics in the Prometheus text format. When a
+service runs several worker processes, set ``metrics_multiprocess_dir``
+and each worker periodically writes its values to a file there; any
+worker then renders the sum of all of them.
+"""
+
+import atexit
+import bisect
+import errno
+import json
+import os
+import threading
+
+from oslo.config import cfg
+import six
+
+METRICS_OPTS = [
+    cfg.StrOpt('metrics_multiprocess_dir',
+               help='Directory where the worker processes of a service '
+                    'share their metrics. Every service needs its own '
+                    'directory, which should be emptied when the service '
+                    'starts. Unset when the service runs a single '
+                    'process.'),
+    cfg.IntOpt('metrics_dump_interval',
+               default=10,
+               help='Seconds between two writes of the metrics of a '
+                    'worker to metrics_multiprocess_dir.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(METRICS_OPTS)
+
+INF = float('inf')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, INF)
+
+
+class _CounterValue(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class _GaugeValue(object):
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from function whenever the gauge is collected."""
+        self.function = function
+
+    def snapshot(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class _HistogramValue(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {'buckets': list(zip(self.buckets, self.counts)),
+                'sum': self.sum,
+                'count': self.count}
+
+
+class Metric(object):
+    """A named metric with an optional set of label names."""
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _new_value(self):
+        raise NotImplementedError()
+
+    def labels(self, *labelvalues):
+        """Return the child metric for the given label values."""
+        value = self._values.get(labelvalues)
+        if value is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError('%s expects labels %s, got %s' %
+                                 (self.name, self.labelnames, labelvalues))
+            with self._lock:
+                value = self._values.setdefault(labelvalues,
+                                                self._new_value())
+        return value
+
+    def collect(self):
+        """Return a list of (labels dict, value) pairs."""
+        return [(dict(zip(self.labelnames, key)), value)
+                for key, value in list(self._values.items())]
+
+    def snapshot(self):
+        """Return the current values keyed by label value tuples."""
+        return dict((key, value.snapshot())
+                    for key, value in list(self._values.items()))
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """A value that goes up and down.
+
+    :param multiprocess_mode: how the values of several worker processes
+                              are combined, 'sum', 'max' or 'all' to keep
+                              them apart under a pid label.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, labelnames=(),
+                 multiprocess_mode='sum'):
+        super(Gauge, self).__init__(name, description, labelnames)
+        if multiprocess_mode not in ('sum', 'max', 'all'):
+            raise ValueError('Unknown multiprocess mode %s' %
+                             multiprocess_mode)
+        self.multiprocess_mode = multiprocess_mode
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Histogram(Metric):
+    """A distribution of observations over fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=None):
+        super(Histogram, self).__init__(name, description, labelnames)
+        buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        if buckets[-1] != INF:
+            buckets += (INF,)
+        self.buckets = buckets
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry(object):
+    """A collection of metrics, queryable at runtime."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = cls(name, *args, **kwargs)
+                    self._metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError('Metric %s is already registered as a %s' %
+                             (name, metric.kind))
+        return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name, description, labelnames=(),
+              multiprocess_mode='sum'):
+        return self._get_or_create(Gauge, name, description, labelnames,
+                                   multiprocess_mode=multiprocess_mode)
+
+    def histogram(self, name, description, labelnames=(), buckets=None):
+        return self._get_or_create(Histogram, name, description, labelnames,
+                                   buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def metrics(self):
+        return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def snapshot(self):
+        """Return {metric name: {label values: value}} for all metrics."""
+        return dict((m.name, m.snapshot()) for m in self.metrics())
+
+    def reset(self):
+        for metric in self.metrics():
+            metric.reset()
+
+    def families(self):
+        """Return the metrics as a list of families for render_text."""
+        families = []
+        for metric in self.metrics():
+            families.append({
+                'name': metric.name,
+                'kind': metric.kind,
+                'description': metric.description,
+                'labelnames': list(metric.labelnames),
+                'mode': getattr(metric, 'multiprocess_mode', None),
+                'values': sorted(metric.snapshot().items()),
+            })
+        return families
+
+
+REGISTRY = Registry()
+
+
+def _escape(value, quote=True):
+    if not isinstance(value, six.string_types):
+        value = str(value)
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    if quote:
+        value = value.replace('"', '\\"')
+    return value
+
+
+def _format_value(value):
+    if value == INF:
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in pairs)
+
+
+def render_text(families):
+    """Format families of metrics in the Prometheus text format."""
+    lines = []
+    for family in families:
+        name = family['name']
+        labelnames = family['labelnames']
+        lines.append('# HELP %s %s' % (name, _escape(family['description'],
+                                                     quote=False)))
+        lines.append('# TYPE %s %s' % (name, family['kind']))
+        for labelvalues, value in family['values']:
+            if family['kind'] != 'histogram':
+                lines.append('%s%s %s' % (
+                    name, _format_labels(labelnames, labelvalues),
+                    _format_value(value)))
+                continue
+            cumulative = 0
+            for bound, count in value['buckets']:
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (
+                    name, _format_labels(labelnames, labelvalues,
+                                         [('le', _format_value(bound))]),
+                    cumulative))
+            labels = _format_labels(labelnames, labelvalues)
+            lines.append('%s_sum%s %s' % (name, labels,
+                                          _format_value(value['sum'])))
+            lines.append('%s_count%s %d' % (name, labels, value['count']))
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+def _merge(current, value, kind, mode):
+    if kind == 'histogram':
+        return {'buckets': [(bound, count + other) for (bound, count), (
+                            _bound, other) in zip(current['buckets'],
+                                                  value['buckets'])],
+                'sum': current['sum'] + value['sum'],
+                'count': current['count'] + value['count']}
+    if kind == 'gauge' and mode == 'max':
+        return max(current, value)
+    return current + value
+
+
+def aggregate(directory):
+    """Combine the metrics every worker wrote to directory.
+
+    Counters and histograms of all workers are added up, including those
+    of workers that have exited so totals do not go backwards. Gauges are
+    only taken from live workers.
+    """
+    merged = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            pid = int(filename[:-len('.json')])
+            with open(os.path.join(directory, filename)) as f:
+                families = json.load(f)
+        except (ValueError, IOError, OSError):
+            # Not ours, or being replaced by its worker right now.
+            continue
+        alive = None
+        for family in families:
+            kind, mode = family['kind'], family.get('mode')
+            if kind == 'gauge':
+                if alive is None:
+                    alive = _pid_alive(pid)
+                if not alive:
+                    continue
+            target = merged.setdefault(family['name'], dict(
+                family, values={},
+                labelnames=(family['labelnames'] +
+                            (['pid'] if mode == 'all' else []))))
+            for labelvalues, value in family['values']:
+                key = tuple(labelvalues)
+                if mode == 'all':
+                    key += (str(pid),)
+                if key in target['values']:
+                    value = _merge(target['values'][key], value, kind, mode)
+                target['values'][key] = value
+    families = []
+    for name in sorted(merged):
+        family = merged[name]
+        family['values'] = sorted(family['values'].items())
+        families.append(family)
+    return families
+
+
+def dump(directory, registry=None):
+    """Write the metrics of this process to directory."""
+    registry = registry or REGISTRY
+    path = os.path.join(directory, '%d.json' % os.getpid())
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'w') as f:
+        json.dump(registry.families(), f)
+    os.rename(tmp_path, path)
+
+
+class _Writer(object):
+    """Periodically dump the metrics of this process."""
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='metrics-writer')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                dump(self.directory)
+            except (IOError, OSError):
+                pass
+
+    def stop(self):
+        self._stop.set()
+        try:
+            dump(self.directory)
+        except (IOError, OSError):
+            pass
+
+
+_writer_pid = None
+
+
+def setup():
+    """Start sharing the metrics of this process if configured to.
+
+    Call this in every worker process, after it has been forked.
+    """
+    global _writer_pid
+    directory = CONF.metrics_multiprocess_dir
+    if not directory or _writer_pid == os.getpid():
+        return
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    _writer_pid = os.getpid()
+    _Writer(directory, max(1, CONF.metrics_dump_interval)).start()
+
+
+def render(registry=None):
+    """Return all metrics in the Prometheus text format."""
+    directory = CONF.metrics_multiprocess_dir
+    if not directory or registry is not None:
+        return render_text((registry or REGISTRY).families())
+    # Include the latest values of this worker rather than those of its
+    # last periodic write.
+    dump(directory)
+    return render_text(aggregate(directory))
+
+
+def counter(name, description, labelnames=()):
+    """Get or create a counter in the default registry."""
+    return REGISTRY.counter(name, description, labelnames)
+
+
+def gauge(name, description, labelnames=(), multiprocess_mode='sum'):
+    """Get or create a gauge in the default registry."""
+    return REGISTRY.gauge(name, description, labelnames, multiprocess_mode)
+
+
+def histogram(name, description, labelnames=(), buckets=None):
+    """Get or create a histogram in the default registry."""
+    return REGISTRY.histogram(name, description, labelnames, buckets)
@@ -0,0 +1,362 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run many local commands concurrently.
+
+Each command runs in its own subprocess from a bounded green thread pool,
+so independent commands overlap their I/O waits and spread over all cores.
+Output is captured through a bounded buffer: at most
+``parallel_execute_output_limit`` bytes per stream are kept, split between
+the beginning and the end of the stream.
+"""
+
+import collections
+import multiprocessing
+import os
+import shlex
+import signal
+import time
+
+import eventlet
+from eventlet.green import subprocess
+from eventlet import greenpool
+from oslo.config import cfg
+from oslo.utils import excutils
+from oslo_concurrency import processutils
+import six
+
+from iot.common import context
+from iot.common import utils
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+
+PARALLEL_OPTS = [
+    cfg.IntOpt('parallel_execute_workers',
+               default=0,
+               help='Maximum number of commands run concurrently by '
+                    'execute_parallel. 0 means twice the number of CPUs.'),
+    cfg.IntOpt('parallel_execute_timeout',
+               default=300,
+               help='Default per-command timeout in seconds for '
+                    'execute_parallel. 0 disables the timeout.'),
+    cfg.IntOpt('parallel_execute_output_limit',
+               default=64 * 1024,
+               help='Maximum number of bytes of stdout and of stderr kept '
+                    'for each command run by execute_parallel.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(PARALLEL_OPTS)
+
+LOG = logging.getLogger(__name__)
+
+_READ_CHUNK = 4096
+# Seconds to wait for a killed command to exit.
+_KILL_WAIT = 5
+
+
+def _default_workers():
+    if CONF.parallel_execute_workers > 0:
+        return CONF.parallel_execute_workers
+    try:
+        return multiprocessing.cpu_count() * 2
+    except NotImplementedError:
+        return 2
+
+
+class BoundedOutput(object):
+    """Collect a stream keeping only its first and last bytes.
+
+    Memory use stays below ``limit`` bytes however much the command
+    writes; the number of bytes dropped from the middle is recorded.
+    """
+
+    def __init__(self, limit):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self._head = []
+        self._head_len = 0
+        self._tail = collections.deque()
+        self._tail_len = 0
+        self.dropped = 0
+
+    def write(self, chunk):
+        room = self.head_limit - self._head_len
+        if room > 0:
+            self._head.append(chunk[:room])
+            self._head_len += len(chunk[:room])
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self._tail.append(chunk)
+        self._tail_len += len(chunk)
+        while self._tail_len > self.tail_limit:
+            excess = self._tail_len - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= excess:
+                self._tail.popleft()
+                self._tail_len -= len(first)
+                self.dropped += len(first)
+            else:
+                self._tail[0] = first[excess:]
+                self._tail_len -= excess
+                self.dropped += excess
+
+    @property
+    def truncated(self):
+        return self.dropped > 0
+
+    def getvalue(self):
+        head = b''.join(self._head)
+        tail = b''.join(self._tail)
+        if self.dropped:
+            marker = six.b('\n... [%d bytes truncated] ...\n' % self.dropped)
+            return head + marker + tail
+        return head + tail
+
+
+class CommandResult(object):
+    """The outcome of one command run by execute_parallel."""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.exit_code = None
+        self.stdout = b''
+        self.stderr = b''
+        self.duration = 0.0
+        self.timed_out = False
+        self.truncated = False
+        self.error = None
+
+    @property
+    def succeeded(self):
+        return (self.error is None and not self.timed_out and
+                self.exit_code == 0)
+
+    def check(self):
+        """Raise ProcessExecutionError if the command did not succeed."""
+        if self.succeeded:
+            return
+        if self.error is not None:
+            description = six.text_type(self.error)
+        elif self.timed_out:
+            description = 'Timed out after %.2f seconds' % self.duration
+        else:
+            description = None
+        raise processutils.ProcessExecutionError(
+            exit_code=self.exit_code, stdout=self.stdout,
+            stderr=self.stderr, cmd=' '.join(map(str, self.cmd)),
+            description=description)
+
+    def __repr__(self):
+        return ('<CommandResult cmd=%r exit_code=%s timed_out=%s '
+                'duration=%.3f>' % (self.cmd, self.exit_code,
+                                    self.timed_out, self.duration))
+
+
+class CommandResults(list):
+    """Ordered CommandResult list with aggregate accessors."""
+
+    @property
+    def succeeded(self):
+        return [r for r in self if r.succeeded]
+
+    @property
+    def failed(self):
+        return [r for r in self if not r.succeeded]
+
+    @property
+    def timed_out(self):
+        return [r for r in self if r.timed_out]
+
+    @property
+    def duration(self):
+        """Sum of the wall time of all commands."""
+        return sum(r.duration for r in self)
+
+    def check(self):
+        """Raise ProcessExecutionError for the first failed command."""
+        for result in self:
+            result.check()
+
+
+def _drain(stream, sink):
+    try:
+        while True:
+            chunk = stream.read(_READ_CHUNK)
+            if not chunk:
+                break
+            sink.write(chunk)
+    finally:
+        stream.close()
+
+
+def _kill(proc, root_helper=None):
+    """Kill a command and everything it started.
+
+    The command leads its own process group. Commands run through the
+    root helper belong to root, so they are killed through it as well.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+        return
+    except OSError as e:
+        if root_helper is None:
+            LOG.warn(_LW('Could not kill process group %(pid)d: %(error)s'),
+                     {'pid': proc.pid, 'error': e})
+            return
+    args = shlex.split(root_helper) + ['kill', '-KILL', '--',
+                                       '-%d' % proc.pid]
+    try:
+        with eventlet.Timeout(_KILL_WAIT):
+            subprocess.call(args, close_fds=True)
+    except (OSError, eventlet.Timeout) as e:
+        LOG.warn(_LW('Could not kill process group %(pid)d: %(error)s'),
+                 {'pid': proc.pid, 'error': e})
+
+
+def _stop(proc, readers, root_helper=None):
+    """Kill a running command and stop reading its output.
+
+    :returns: the exit code of the command, or None if it did not exit
+              within _KILL_WAIT seconds.
+    """
+    _kill(proc, root_helper)
+    exit_code = None
+    with eventlet.Timeout(_KILL_WAIT, False):
+        exit_code = proc.wait()
+    for reader in readers:
+        reader.kill()
+    return exit_code
+
+
+def run_command(cmd, timeout=None, output_limit=None, run_as_root=False,
+                root_helper=None, env_variables=None, cwd=None,
+                process_input=None):
+    """Run a single command with a timeout and bounded output capture.
+
+    Unlike :func:`iot.common.utils.execute` this never raises for a
+    failing command; inspect or ``check()`` the returned result instead.
+
+    :param cmd: the command line as a list or tuple of arguments.
+    :param timeout: seconds after which the command is killed. Defaults
+                    to ``parallel_execute_timeout``, and never extends
+                    past the deadline of the current request.
+    :param output_limit: bytes of stdout and of stderr to keep. Defaults
+                         to ``parallel_execute_output_limit``.
+    :returns: a :class:`CommandResult`.
+    :raises: DeadlineExceeded if the current request is past its deadline.
+    """
+    if timeout is None:
+        timeout = CONF.parallel_execute_timeout
+    remaining = context.time_remaining()
+    if remaining is not None:
+        context.check_deadline(' '.join(map(str, cmd)))
+        timeout = min(timeout, remaining) if timeout else remaining
+    if output_limit is None:
+        output_limit = CONF.parallel_execute_output_limit
+
+    result = CommandResult(cmd)
+    args = [str(c) for c in cmd]
+    if run_as_root:
+        root_helper = root_helper or utils._get_root_helper()
+        args = shlex.split(root_helper) + args
+    env = None
+    if env_variables:
+        env = os.environ.copy()
+        env.update(env_variables)
+
+    out = BoundedOutput(output_limit)
+    err = BoundedOutput(output_limit)
+    start = time.time()
+    try:
+        proc = subprocess.Popen(args,
+                                stdin=(subprocess.PIPE
+                                       if process_input is not None
+                                       else None),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                close_fds=True,
+                                preexec_fn=os.setsid,
+                                env=env,
+                                cwd=cwd)
+    except Exception as e:
+        result.error = e
+        result.duration = time.time() - start
+        utils.record_command(cmd, result.duration, 'error')
+        return result
+
+    readers = [eventlet.spawn(_drain, proc.stdout, out),
+               eventlet.spawn(_drain, proc.stderr, err)]
+
+    timer = eventlet.Timeout(timeout or None)
+    try:
+        if process_input is not None:
+            proc.stdin.write(process_input)
+            proc.stdin.close()
+        result.exit_code = proc.wait()
+        for reader in readers:
+            reader.wait()
+    except eventlet.Timeout as t:
+        helper = root_helper if run_as_root else None
+        if t is not timer:
+            # A timeout of the caller, who gives up on the command.
+            with excutils.save_and_reraise_exception():
+                _stop(proc, readers, helper)
+        result.timed_out = True
+        LOG.warn(_LW('Command %(cmd)s timed out after %(timeout)s '
+                     'seconds, killing it'),
+                 {'cmd': args[0], 'timeout': timeout})
+        result.exit_code = _stop(proc, readers, helper)
+        if result.exit_code is None:
+            LOG.warn(_LW('Command %s did not exit after being killed'),
+                     args[0])
+    finally:
+        timer.cancel()
+
+    result.duration = time.time() - start
+    result.stdout = out.getvalue()
+    result.stderr = err.getvalue()
+    result.truncated = out.truncated or err.truncated
+    utils.record_command(cmd, result.duration,
+                         'timeout' if result.timed_out else result.exit_code)
+    return result
+
+
+def execute_parallel(commands, max_workers=None, **kwargs):
+    """Run several commands concurrently with bounded concurrency.
+
+    :param commands: an iterable of commands, each a list or tuple of
+                     arguments.
+    :param max_workers: maximum number of commands running at once.
+                        Defaults to ``parallel_execute_workers``.
+    :param kwargs: passed to :func:`run_command` for every command.
+    :returns: a :class:`CommandResults` in the order of ``commands``.
+    """
+    pool = greenpool.GreenPool(max_workers or _default_workers())
+    # The green threads of the pool do not inherit the current request,
+    # hand it over so its deadline and trace apply to the commands.
+    ctxt = context.get_current()
+
+    def run(cmd):
+        if ctxt is not None:
+            ctxt.update_store()
+        return run_command(cmd, **kwargs)
+
+    results = CommandResults(pool.imap(run, commands))
+    failed = results.failed
+    if failed:
+        LOG.debug('%(failed)d of %(total)d parallel commands failed',
+                  {'failed': len(failed), 'total': len(results)})
+    return results
@@ -0,0 +1,345 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Profile a running service on demand.
+
+Sending ``profiler_signal`` (SIGUSR2 by default) to an iot-api or
+iot-conductor process profiles it for ``profiler_duration`` seconds and
+writes the result to ``profiler_output_dir`` in the collapsed stack
+format read by flamegraph.pl and speedscope. Modes:
+
+cpu
+    Sample the stack running on each native thread. With eventlet this
+    is the green thread holding the CPU, so this shows where CPU time
+    goes.
+
+greenlets
+    Sample the stacks of all green threads, running or not. This shows
+    where requests spend their wall time, including while they wait on
+    I/O.
+
+cprofile
+    Run cProfile. Writes a pstats file next to the collapsed
+    caller;callee pairs.
+
+Example::
+
+    kill -USR2 $(pgrep -f iot-conductor)
+    flamegraph.pl /var/lib/iot/profiles/iot-conductor-*.collapsed > cpu.svg
+"""
+
+import collections
+import cProfile
+import gc
+import os
+import pstats
+import signal
+import sys
+import time
+import weakref
+
+from oslo.config import cfg
+from oslo.utils import importutils
+
+from iot.common import paths
+from iot.openstack.common._i18n import _LI
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+
+eventlet = importutils.try_import('eventlet')
+greenlet = importutils.try_import('greenlet')
+
+# The sampler must run on a native thread, green threads only get to run
+# when the one profiled yields.
+if eventlet is not None:
+    from eventlet import patcher
+    from eventlet import tpool
+    _threading = patcher.original('threading')
+    _sleep = patcher.original('time').sleep
+else:
+    import threading as _threading
+    _sleep = time.sleep
+
+PROFILER_OPTS = [
+    cfg.StrOpt('profiler_signal',
+               default='SIGUSR2',
+               help='Signal that starts profiling the process. An empty '
+                    'value disables the profiler.'),
+    cfg.StrOpt('profiler_mode',
+               default='cpu',
+               choices=('cpu', 'greenlets', 'cprofile'),
+               help='What the profiler records: samples of the running '
+                    'stacks, samples of all green thread stacks, or '
+                    'cProfile statistics.'),
+    cfg.IntOpt('profiler_duration',
+               default=30,
+               help='Seconds a profile runs for.'),
+    cfg.FloatOpt('profiler_sample_interval',
+                 default=0.01,
+                 help='Seconds between two stack samples.'),
+    cfg.StrOpt('profiler_output_dir',
+               default=paths.state_path_def('profiles'),
+               help='Directory the profiles are written to.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(PROFILER_OPTS)
+
+LOG = logging.getLogger(__name__)
+
+_lock = _threading.Lock()
+
+
+def _frame_name(code):
+    return '%s (%s:%d)' % (code.co_name, code.co_filename,
+                           code.co_firstlineno)
+
+
+def _collapse(frame):
+    """Return the stack of a frame, outermost first, joined by ';'."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+def write_collapsed(path, counts):
+    """Write {stack: count} in the collapsed stack format."""
+    with open(path, 'w') as f:
+        for stack, count in sorted(counts.items()):
+            f.write('%s %d\n' % (stack, count))
+
+
+class StackSampler(object):
+    """Count how often each stack is seen at a fixed interval.
+
+    :param interval: seconds between samples.
+    :param greenlets: also sample green threads that are not running.
+    """
+
+    def __init__(self, interval, greenlets=False):
+        self.interval = interval
+        self.greenlets = greenlets and eventlet is not None
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._seen = None
+        self._seen_lock = _threading.Lock()
+        self._previous_trace = None
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            with self._seen_lock:
+                self._seen.add(args[1])
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def start_tracking(self):
+        """Track the green threads that run from now on.
+
+        greenlet.settrace applies to the calling thread only, so this
+        must be called from the thread the green threads run on.
+        """
+        self._seen = weakref.WeakSet(
+            o for o in gc.get_objects() if isinstance(o, greenlet.greenlet))
+        self._previous_trace = greenlet.settrace(self._trace)
+
+    def stop_tracking(self):
+        greenlet.settrace(self._previous_trace)
+        self._seen = None
+
+    def _frames(self):
+        me = _threading.current_thread().ident
+        frames = [frame for ident, frame in sys._current_frames().items()
+                  if ident != me]
+        if self.greenlets:
+            # The frame of a running greenlet is the frame of its thread.
+            frames.extend(g.gr_frame for g in self._greenlets()
+                          if g.gr_frame is not None)
+        return frames
+
+    def _greenlets(self):
+        """Return the green threads seen so far.
+
+        The hub thread adds to them while the sampler copies them, and
+        their weak references die in whichever thread collects them.
+        """
+        while True:
+            with self._seen_lock:
+                try:
+                    return list(self._seen)
+                except RuntimeError:
+                    # A reference died during the copy.
+                    pass
+
+    def sample(self):
+        for frame in self._frames():
+            self.counts[_collapse(frame)] += 1
+        self.samples += 1
+
+    def run(self, duration):
+        """Sample for duration seconds, from a native thread."""
+        end = time.time() + duration
+        while time.time() < end:
+            self.sample()
+            _sleep(self.interval)
+        return self.counts
+
+
+def _cprofile_collapsed(stats):
+    """Turn pstats data into caller;callee pairs weighted in microseconds.
+
+    cProfile does not record whole stacks, a flame graph of this is only
+    two levels deep but still shows who calls the expensive functions.
+    """
+    counts = {}
+
+    def label(func):
+        filename, line, name = func
+        return '%s (%s:%d)' % (name, filename, line)
+
+    for func, (_cc, _nc, tt, _ct, callers) in stats.stats.items():
+        if not callers:
+            counts[label(func)] = int(tt * 1e6)
+        for caller, values in callers.items():
+            # values is (cc, nc, tt, ct) in python 2.7
+            counts['%s;%s' % (label(caller), label(func))] = int(
+                values[2] * 1e6)
+    return dict((stack, n) for stack, n in counts.items() if n)
+
+
+def _output_path(mode):
+    directory = CONF.profiler_output_dir
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return os.path.join(directory, '%s-%d-%s-%s' % (
+        os.path.basename(sys.argv[0]) or 'iot', os.getpid(), mode,
+        time.strftime('%Y%m%dT%H%M%S')))
+
+
+def _finish(base, counts, started):
+    path = base + '.collapsed'
+    write_collapsed(path, counts)
+    LOG.info(_LI('Profile of %(seconds).1f seconds written to %(path)s'),
+             {'seconds': time.time() - started, 'path': path})
+    return path
+
+
+def _sample(base, mode, duration):
+    # Only the sampling itself runs on a native thread. Tracking green
+    # threads and logging, whose locks are green, happen on the hub.
+    started = time.time()
+    try:
+        sampler = StackSampler(CONF.profiler_sample_interval,
+                               greenlets=(mode == 'greenlets'))
+        if sampler.greenlets:
+            sampler.start_tracking()
+        try:
+            if eventlet is not None:
+                counts = tpool.execute(sampler.run, duration)
+            else:
+                counts = sampler.run(duration)
+        finally:
+            if sampler.greenlets:
+                sampler.stop_tracking()
+        _finish(base, counts, started)
+    except Exception:
+        LOG.exception(_LW('Profiling failed'))
+    finally:
+        _lock.release()
+
+
+def _start_cprofile(base, duration):
+    # cProfile only profiles the thread that enabled it, so it has to be
+    # enabled and disabled from the main thread, where the green threads
+    # run.
+    profile = cProfile.Profile()
+    started = time.time()
+
+    def stop():
+        try:
+            profile.disable()
+            profile.dump_stats(base + '.pstats')
+            _finish(base, _cprofile_collapsed(pstats.Stats(profile)),
+                    started)
+        except Exception:
+            LOG.exception(_LW('Profiling failed'))
+        finally:
+            _lock.release()
+
+    profile.enable()
+    eventlet.spawn_after(duration, stop)
+
+
+def start(mode=None, duration=None):
+    """Profile the process in the background.
+
+    With eventlet, this must be called from a green thread of the main
+    thread.
+
+    :param mode: 'cpu', 'greenlets' or 'cprofile', by default
+                 ``profiler_mode``.
+    :param duration: seconds to profile for, by default
+                     ``profiler_duration``.
+    :returns: the path of the profile without extension, or None if a
+              profile is already being taken.
+    """
+    mode = mode or CONF.profiler_mode
+    duration = duration or CONF.profiler_duration
+    if not _lock.acquire(False):
+        LOG.warn(_LW('A profile is already being taken, ignoring request'))
+        return None
+    try:
+        base = _output_path(mode)
+        LOG.info(_LI('Profiling %(mode)s for %(duration)d seconds'),
+                 {'mode': mode, 'duration': duration})
+        if mode == 'cprofile' and eventlet is not None:
+            _start_cprofile(base, duration)
+        elif mode == 'cprofile':
+            LOG.warn(_LW('cProfile needs eventlet, sampling instead'))
+            mode = 'cpu'
+        if mode != 'cprofile' and eventlet is not None:
+            eventlet.spawn_n(_sample, base, mode, duration)
+        elif mode != 'cprofile':
+            sampler = _threading.Thread(target=_sample,
+                                        args=(base, mode, duration),
+                                        name='profiler')
+            sampler.daemon = True
+            sampler.start()
+    except Exception:
+        _lock.release()
+        raise
+    return base
+
+
+def _handle_signal(signo, frame):
+    # Do the work outside of the signal handler, which may have
+    # interrupted code holding the logging locks.
+    if eventlet is not None:
+        eventlet.spawn_n(start)
+    else:
+        _threading.Thread(target=start).start()
+
+
+def setup():
+    """Start a profile whenever the process receives profiler_signal."""
+    name = CONF.profiler_signal
+    if not name:
+        return
+    signo = getattr(signal, name, None)
+    if not isinstance(signo, int):
+        LOG.warn(_LW('Unknown profiler signal %s, profiler disabled'), name)
+        return
+    signal.signal(signo, _handle_signal)
@@ -0,0 +1,227 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Token bucket rate limiting.
+
+Every key, for example a project and a class of API routes, has a bucket
+holding up to ``burst`` tokens that refills at ``rate`` tokens a second.
+A request takes one token and is refused while the bucket is empty.
+
+Buckets live in a store. :class:`MemoryStore` keeps them in the process
+and is exact for a single worker. :class:`MemcachedStore` shares them
+between workers and hosts. Any class with the same ``consume`` method can
+be configured in their place with ``rate_limit_backend``.
+"""
+
+import threading
+import time
+
+from oslo.config import cfg
+from oslo.utils import importutils
+
+from iot.common import metrics
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+
+memcache = importutils.try_import('memcache')
+
+RATE_LIMIT_OPTS = [
+    cfg.FloatOpt('rate_limit_read_rate',
+                 default=50.0,
+                 help='Sustained read requests per second allowed to a '
+                      'single project on a single resource. 0 disables '
+                      'rate limiting of reads.'),
+    cfg.IntOpt('rate_limit_read_burst',
+               default=100,
+               help='Read requests a project may make at once on a single '
+                    'resource after being idle: the size of its token '
+                    'bucket, not an allowance on top of the sustained '
+                    'rate.'),
+    cfg.FloatOpt('rate_limit_write_rate',
+                 default=10.0,
+                 help='Sustained write requests per second allowed to a '
+                      'single project on a single resource. 0 disables '
+                      'rate limiting of writes.'),
+    cfg.IntOpt('rate_limit_write_burst',
+               default=20,
+               help='Write requests a project may make at once on a single '
+                    'resource after being idle: the size of its token '
+                    'bucket, not an allowance on top of the sustained '
+                    'rate.'),
+    cfg.StrOpt('rate_limit_backend',
+               default='iot.common.ratelimit.MemoryStore',
+               help='Class storing the token buckets. Use '
+                    'iot.common.ratelimit.MemcachedStore to share the '
+                    'limits between API workers.'),
+    cfg.ListOpt('rate_limit_memcached_servers',
+                default=[],
+                help='Memcached servers used by MemcachedStore.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(RATE_LIMIT_OPTS, group='api')
+
+LOG = logging.getLogger(__name__)
+
+LIMITED = metrics.counter('iot_api_rate_limited_total',
+                          'Requests refused by the rate limiter',
+                          ('route',))
+
+
+def _refill(tokens, updated, rate, burst, now):
+    if now > updated:
+        tokens = min(burst, tokens + (now - updated) * rate)
+    return tokens
+
+
+class MemoryStore(object):
+    """Token buckets kept in the memory of this process.
+
+    Buckets that have been idle long enough to be full again carry no
+    information and are dropped every ``prune_interval`` seconds.
+    """
+
+    prune_interval = 60
+
+    def __init__(self, conf=None):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_prune = time.time() + self.prune_interval
+
+    def consume(self, key, rate, burst, now=None):
+        """Take a token from the bucket of key.
+
+        :returns: 0 if a token was taken, otherwise the seconds until the
+                  next token is available.
+        """
+        now = now or time.time()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = _refill(bucket[0], bucket[1], rate, burst, now)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, rate, burst)
+                return 0
+            self._buckets[key] = (tokens, now, rate, burst)
+            return (1 - tokens) / rate
+
+    def _prune(self, now):
+        self._next_prune = now + self.prune_interval
+        for key, (tokens, updated, rate, burst) in list(
+                self._buckets.items()):
+            if _refill(tokens, updated, rate, burst, now) >= burst:
+                del self._buckets[key]
+
+
+class MemcachedStore(object):
+    """Token buckets shared between processes through memcached.
+
+    Each bucket is a single value updated with compare-and-set, so
+    workers racing on the same bucket retry rather than overwrite each
+    other. A request still losing the race after ``cas_retries`` attempts
+    is refused, the bucket being that busy. If memcached cannot be
+    reached the process falls back to its own buckets instead of failing
+    the request.
+    """
+
+    key_prefix = 'iot-ratelimit:'
+    cas_retries = 3
+
+    def __init__(self, conf=None):
+        conf = conf or CONF
+        if memcache is None:
+            raise ImportError('MemcachedStore requires python-memcached')
+        self._client = memcache.Client(conf.api.rate_limit_memcached_servers,
+                                       cache_cas=True)
+        self._local = MemoryStore()
+
+    def consume(self, key, rate, burst, now=None):
+        now = now or time.time()
+        mkey = str(self.key_prefix + key)
+        # Keep a bucket at least until it would be full again.
+        ttl = int(burst / rate) + 1
+        contended = False
+        try:
+            for _attempt in range(self.cas_retries):
+                value = self._client.gets(mkey)
+                if value is None:
+                    tokens = burst
+                else:
+                    tokens, updated = value
+                    tokens = _refill(tokens, updated, rate, burst, now)
+                if tokens >= 1:
+                    wait, tokens = 0, tokens - 1
+                else:
+                    wait = (1 - tokens) / rate
+                if value is None:
+                    stored = self._client.add(mkey, (tokens, now), ttl)
+                else:
+                    contended = True
+                    stored = self._client.cas(mkey, (tokens, now), ttl)
+                if stored:
+                    return wait
+        except Exception:
+            LOG.warn(_LW('Rate limit backend failed, using the local '
+                         'buckets of this worker'), exc_info=True)
+            return self._local.consume(key, rate, burst, now)
+        if contended:
+            # Refuse rather than let the request through unaccounted.
+            return 1.0 / rate
+        # python-memcached reports unreachable servers by storing nothing.
+        LOG.warn(_LW('Rate limit backend stores nothing, using the local '
+                     'buckets of this worker'))
+        return self._local.consume(key, rate, burst, now)
+
+
+class RateLimiter(object):
+    """Apply separate read and write limits to each key."""
+
+    def __init__(self, conf=None, store=None):
+        conf = conf or CONF
+        self.limits = {
+            'read': (conf.api.rate_limit_read_rate,
+                     conf.api.rate_limit_read_burst),
+            'write': (conf.api.rate_limit_write_rate,
+                      conf.api.rate_limit_write_burst),
+        }
+        if store is None:
+            store = importutils.import_object(conf.api.rate_limit_backend,
+                                              conf)
+        self.store = store
+
+    @property
+    def enabled(self):
+        return any(rate > 0 for rate, _burst in self.limits.values())
+
+    def check(self, project, route, kind):
+        """Take a token for a request of project on a route.
+
+        :param project: the project making the request.
+        :param route: the class of route, e.g. the resource name.
+        :param kind: 'read' or 'write'.
+        :returns: 0 if the request may go ahead, otherwise the seconds
+                  after which it may be retried.
+        """
+        rate, burst = self.limits[kind]
+        if rate <= 0:
+            return 0
+        wait = self.store.consume('%s:%s:%s' % (project, route, kind),
+                                  rate, max(1, burst))
+        if wait:
+            LIMITED.labels(route).inc()
+        return wait
@@ -14,13 +14,52 @@
 
 """Common RPC service and API tools for IoT."""
 
+import functools
+import time
+
 import eventlet
 from oslo.config import cfg
 from oslo import messaging
 
 import iot.common.context
+from iot.common import metrics
+from iot.common import tracing
+from iot.db import query_stats
 from iot.objects import base as objects_base
-
+from iot.openstack.common._i18n import _LI
+from iot.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+rpc_opts = [
+    cfg.BoolOpt('rpc_packed_objects',
+                default=False,
+                help='Ask for objects in RPC replies in the compact '
+                     'msgpack format, and send requests in it to topics '
+                     'whose servers have replied in it. Only enable this '
+                     'once every IoT service has been upgraded to '
+                     'understand it.'),
+]
+
+cfg.CONF.register_opts(rpc_opts)
+
+CLIENT_TIME = metrics.histogram('iot_rpc_client_seconds',
+                                'Time spent sending RPC calls and casts',
+                                ('method', 'type'))
+CLIENT_ERRORS = metrics.counter('iot_rpc_client_errors_total',
+                                'RPC calls and casts that failed',
+                                ('method', 'type', 'error'))
+HANDLER_TIME = metrics.histogram('iot_rpc_handler_seconds',
+                                 'Time spent handling RPC requests',
+                                 ('method',))
+HANDLER_ERRORS = metrics.counter('iot_rpc_handler_errors_total',
+                                 'RPC requests whose handler raised',
+                                 ('method', 'error'))
+
+# Context key by which a client tells the server that it accepts replies
+# in the packed object format.
+PACKED_CONTEXT_KEY = 'iot_packed_objects'
 
 # NOTE(paulczar):
 # Ubuntu 14.04 forces librabbitmq when kombu is used
@@ -55,10 +94,57 @@ class RequestContextSerializer(messaging.Serializer):
         return self._base.deserialize_entity(context, entity)
 
     def serialize_context(self, context):
-        return context.to_dict()
+        values = context.to_dict()
+        if cfg.CONF.rpc_packed_objects:
+            # NOTE: older services reject unknown context keys, so this is
+            # only advertised once the operator has enabled the format.
+            values[PACKED_CONTEXT_KEY] = True
+        return values
 
     def deserialize_context(self, context):
-        return iot.common.context.RequestContext.from_dict(context)
+        context = dict(context)
+        accepts_packed = context.pop(PACKED_CONTEXT_KEY, False)
+        ctxt = iot.common.context.RequestContext.from_dict(context)
+        # Replies to this request are packed only if the caller asked.
+        ctxt.accepts_packed_objects = accepts_packed
+        return ctxt
+
+
+class DeadlineEndpoint(object):
+    """Wraps an RPC endpoint to shed requests that are past their deadline.
+
+    A request whose caller has already given up is rejected with
+    DeadlineExceeded before the endpoint method runs, rather than being
+    computed for nobody. The time taken and the errors raised by the
+    endpoint methods are recorded in the metrics.
+    """
+
+    def __init__(self, endpoint):
+        self._endpoint = endpoint
+
+    def __getattr__(self, name):
+        attr = getattr(self._endpoint, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def method(ctxt, *args, **kwargs):
+            if getattr(ctxt, 'expired', False):
+                LOG.info(_LI('Dropping %(method)s for request %(request)s, '
+                             'its deadline has passed'),
+                         {'method': name, 'request': ctxt.request_id})
+                ctxt.check_deadline(name)
+            start = time.time()
+            try:
+                with tracing.span('rpc.handle', ctxt, method=name):
+                    return attr(ctxt, *args, **kwargs)
+            except Exception as e:
+                HANDLER_ERRORS.labels(name, type(e).__name__).inc()
+                raise
+            finally:
+                HANDLER_TIME.labels(name).observe(time.time() - start)
+                query_stats.report(ctxt, name)
+        return method
 
 
 class Service(object):
@@ -66,12 +152,14 @@ class Service(object):
 
     def __init__(self, topic, server, handlers):
         serializer = RequestContextSerializer(
-            objects_base.IoTObjectSerializer())
+            objects_base.IoTObjectSerializer(
+                packed=cfg.CONF.rpc_packed_objects))
         transport = messaging.get_transport(cfg.CONF,
                                             aliases=TRANSPORT_ALIASES)
         # TODO(asalkeld) add support for version='x.y'
         target = messaging.Target(topic=topic, server=server)
-        self._server = messaging.get_rpc_server(transport, target, handlers,
+        endpoints = [DeadlineEndpoint(handler) for handler in handlers]
+        self._server = messaging.get_rpc_server(transport, target, endpoints,
                                                 serializer=serializer)
 
     def serve(self):
@@ -81,23 +169,69 @@ class Service(object):
 
 class API(object):
     def __init__(self, transport=None, context=None, topic=None):
+        if topic is None:
+            topic = ''
+        # Objects in requests are packed once a server of the topic has
+        # replied with packed objects, showing it understands them.
         serializer = RequestContextSerializer(
-            objects_base.IoTObjectSerializer())
+            objects_base.IoTObjectSerializer(
+                packed=cfg.CONF.rpc_packed_objects, peer=topic))
         if transport is None:
             transport = messaging.get_transport(cfg.CONF,
                                                 aliases=TRANSPORT_ALIASES)
         self._context = context
-        if topic is None:
-            topic = ''
         target = messaging.Target(topic=topic)
         self._client = messaging.RPCClient(transport, target,
                                            serializer=serializer)
 
+    def _commit_request_session(self, ctxt):
+        # Let the receiver see what the request has written so far.
+        request_session = getattr(ctxt, 'db_session', None)
+        if request_session is not None:
+            request_session.commit()
+
     def _call(self, method, *args, **kwargs):
-        return self._client.call(self._context, method, *args, **kwargs)
+        return self._call_in_context(self._context, method, *args, **kwargs)
+
+    def _call_in_context(self, ctxt, method, *args, **kwargs):
+        """Make an RPC call on behalf of ctxt rather than self._context."""
+        self._commit_request_session(ctxt)
+        client = self._client
+        remaining = getattr(ctxt, 'time_remaining', lambda: None)()
+        if remaining is not None:
+            # Do not wait for a reply past the deadline of the request.
+            ctxt.check_deadline(method)
+            client = client.prepare(timeout=remaining)
+        start = time.time()
+        try:
+            # The span is open while the context is serialized, so the
+            # conductor's spans are its children.
+            with tracing.span('rpc.call', ctxt, method=method):
+                return client.call(ctxt, method, *args, **kwargs)
+        except Exception as e:
+            CLIENT_ERRORS.labels(method, 'call', type(e).__name__).inc()
+            if (remaining is not None and
+                    isinstance(e, messaging.MessagingTimeout)):
+                ctxt.check_deadline(method)
+            raise
+        finally:
+            CLIENT_TIME.labels(method, 'call').observe(time.time() - start)
 
     def _cast(self, method, *args, **kwargs):
-        self._client.cast(self._context, method, *args, **kwargs)
+        self._cast_in_context(self._context, method, *args, **kwargs)
+
+    def _cast_in_context(self, ctxt, method, *args, **kwargs):
+        """Make an RPC cast on behalf of ctxt rather than self._context."""
+        self._commit_request_session(ctxt)
+        start = time.time()
+        try:
+            with tracing.span('rpc.cast', ctxt, method=method):
+                self._client.cast(ctxt, method, *args, **kwargs)
+        except Exception as e:
+            CLIENT_ERRORS.labels(method, 'cast', type(e).__name__).inc()
+            raise
+        finally:
+            CLIENT_TIME.labels(method, 'cast').observe(time.time() - start)
 
     def echo(self, message):
         self._cast('echo', message=message)
@@ -13,9 +13,13 @@
 
 from oslo.config import cfg
 
+from iot.common import metrics
+from iot.common import profiler
 from iot.openstack.common import log as logging
 
 
 def prepare_service(argv=[]):
     cfg.CONF(argv[1:], project='iot')
     logging.setup('iot')
+    profiler.setup()
+    metrics.setup()
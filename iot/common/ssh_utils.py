@@ -0,0 +1,283 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pooled SSH sessions for running commands on remote hosts."""
+
+import hashlib
+import threading
+import time
+
+import eventlet
+from eventlet import pools
+from oslo.config import cfg
+from oslo_concurrency import processutils
+
+from iot.common import utils
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+from iot.openstack.common import loopingcall
+
+SSH_POOL_OPTS = [
+    cfg.IntOpt('ssh_max_connections_per_host',
+               default=4,
+               help='Maximum number of pooled SSH connections kept open '
+                    'to a single host.'),
+    cfg.IntOpt('ssh_idle_timeout',
+               default=300,
+               help='Seconds a pooled SSH connection may stay unused '
+                    'before it is closed.'),
+    cfg.IntOpt('ssh_max_channels',
+               default=8,
+               help='Maximum number of channels opened concurrently on a '
+                    'single SSH connection by execute_many. Keep this '
+                    'below the MaxSessions setting of the remote sshd.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(SSH_POOL_OPTS)
+
+LOG = logging.getLogger(__name__)
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+# Closes idle connections, started along with the first pool.
+_evictor = None
+
+
+def _pool_key(connection):
+    # Connections made with different credentials may have different
+    # rights on the host, so they are pooled apart. Only a digest of the
+    # credentials is kept in the key.
+    credentials = repr((connection.get('password'),
+                        connection.get('key_contents'),
+                        connection.get('key_filename')))
+    return (connection.get('host'), connection.get('port', 22),
+            connection.get('username'),
+            hashlib.sha256(credentials.encode('utf-8')).hexdigest())
+
+
+class SSHPool(pools.Pool):
+    """A pool of SSH connections to a single host.
+
+    Connections are created on demand up to ``max_size``. A connection is
+    checked before it is handed out: transports that are no longer active
+    are discarded, connections unused for longer than ``idle_timeout`` are
+    closed, and connections idle for longer than the keepalive interval are
+    probed with an SSH ignore message first.
+    """
+
+    def __init__(self, connection, max_size=None, idle_timeout=None):
+        self.connection = dict(connection)
+        self.idle_timeout = (CONF.ssh_idle_timeout if idle_timeout is None
+                             else idle_timeout)
+        # id(ssh) -> timestamp of the last time it went back to the pool
+        self._last_used = {}
+        if max_size is None:
+            max_size = CONF.ssh_max_connections_per_host
+        super(SSHPool, self).__init__(min_size=0, max_size=max_size)
+
+    def create(self):
+        return utils.ssh_connect(self.connection)
+
+    def _discard(self, ssh):
+        self._last_used.pop(id(ssh), None)
+        self.current_size -= 1
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, ssh):
+        transport = ssh.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        idle = time.time() - self._last_used.get(id(ssh), 0)
+        if self.idle_timeout and idle > self.idle_timeout:
+            return False
+        keepalive = CONF.ssh_keepalive_interval
+        if keepalive and idle > keepalive:
+            # The keepalive would have noticed a dead peer by now, but
+            # only if the transport thread got to run. Probe explicitly.
+            try:
+                transport.send_ignore()
+            except Exception:
+                return False
+        return True
+
+    def get(self):
+        """Return a live connection, creating one if the pool allows it."""
+        while self.free_items:
+            ssh = self.free_items.popleft()
+            if ssh is not None and self._is_alive(ssh):
+                return ssh
+            if ssh is not None:
+                self._discard(ssh)
+        if self.current_size < self.max_size:
+            self.current_size += 1
+            try:
+                return self.create()
+            except Exception:
+                self.current_size -= 1
+                raise
+        ssh = self.channel.get()
+        if ssh is not None and self._is_alive(ssh):
+            return ssh
+        if ssh is not None:
+            self._discard(ssh)
+        self.current_size += 1
+        try:
+            return self.create()
+        except Exception:
+            self.current_size -= 1
+            raise
+
+    def put(self, ssh):
+        self._last_used[id(ssh)] = time.time()
+        super(SSHPool, self).put(ssh)
+
+    def remove(self, ssh):
+        """Drop a connection that the caller found to be broken."""
+        self._discard(ssh)
+        if self.waiting():
+            # The connection will not come back to the pool: wake up a
+            # caller waiting for one, which creates a new connection.
+            self.channel.put(None)
+
+    def evict_idle(self):
+        """Close free connections that have been idle for too long."""
+        now = time.time()
+        for ssh in list(self.free_items):
+            if now - self._last_used.get(id(ssh), 0) > self.idle_timeout:
+                self.free_items.remove(ssh)
+                self._discard(ssh)
+
+    def close(self):
+        while self.free_items:
+            self._discard(self.free_items.popleft())
+
+
+def get_pool(connection):
+    """Return the shared SSHPool for the host described by connection.
+
+    :param connection: a dict of connection parameters, as accepted by
+                       :func:`iot.common.utils.ssh_connect`.
+    """
+    key = _pool_key(connection)
+    pool = _POOLS.get(key)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(key)
+            if pool is None:
+                pool = SSHPool(connection)
+                _POOLS[key] = pool
+                _start_evictor()
+    return pool
+
+
+def _start_evictor():
+    global _evictor
+    if _evictor is None and CONF.ssh_idle_timeout > 0:
+        _evictor = loopingcall.FixedIntervalLoopingCall(evict_idle)
+        _evictor.start(interval=CONF.ssh_idle_timeout,
+                       initial_delay=CONF.ssh_idle_timeout,
+                       name='ssh_evict_idle')
+
+
+def evict_idle():
+    """Close idle connections in every pool.
+
+    Runs every ``ssh_idle_timeout`` seconds once a pool exists, so an
+    unused connection is closed within twice that time.
+    """
+    for pool in list(_POOLS.values()):
+        pool.evict_idle()
+
+
+def close_all():
+    """Close all pooled connections, e.g. before forking workers."""
+    global _evictor
+    with _POOLS_LOCK:
+        if _evictor is not None:
+            _evictor.stop()
+            _evictor = None
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
+
+
+def _start_command(ssh, cmd):
+    channel = ssh.get_transport().open_session()
+    channel.exec_command(cmd)
+    return channel
+
+
+def _finish_command(channel, cmd, check_exit_code):
+    # Both streams are read at once: a command filling the stderr window
+    # blocks until it is read, and would never close stdout.
+    stderr = eventlet.spawn(channel.makefile_stderr('rb').read)
+    try:
+        out = channel.makefile('rb').read()
+    except Exception:
+        stderr.kill()
+        raise
+    err = stderr.wait()
+    exit_status = channel.recv_exit_status()
+    if check_exit_code and exit_status != 0:
+        raise processutils.ProcessExecutionError(exit_code=exit_status,
+                                                 stdout=out,
+                                                 stderr=err,
+                                                 cmd=cmd)
+    return out, err
+
+
+def execute_many(connection, commands, check_exit_code=True):
+    """Run a batch of commands over a single pooled SSH session.
+
+    The commands are started on separate channels multiplexed over one
+    transport, at most ``ssh_max_channels`` at a time, so they pay for a
+    single handshake and run concurrently on the remote host.
+
+    :param connection: a dict of connection parameters.
+    :param commands: a list of command lines to run.
+    :param check_exit_code: raise ProcessExecutionError for the first
+                            command, in order, that exited non-zero.
+    :returns: a list of (stdout, stderr) tuples, one per command.
+    :raises: SSHConnectFailed
+    :raises: ProcessExecutionError
+    """
+    pool = get_pool(connection)
+    results = []
+    ssh = pool.get()
+    try:
+        window = max(1, CONF.ssh_max_channels)
+        for start in range(0, len(commands), window):
+            batch = commands[start:start + window]
+            channels = [_start_command(ssh, cmd) for cmd in batch]
+            try:
+                for channel, cmd in zip(channels, batch):
+                    results.append(_finish_command(channel, cmd,
+                                                   check_exit_code))
+            finally:
+                for channel in channels:
+                    channel.close()
+    except processutils.ProcessExecutionError:
+        pool.put(ssh)
+        raise
+    except Exception:
+        LOG.warn(_LW('Dropping SSH connection to %s after a failure'),
+                 connection.get('host'))
+        pool.remove(ssh)
+        raise
+    pool.put(ssh)
+    return results
@@ -0,0 +1,298 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lightweight tracing of requests across the API and the conductor.
+
+The API decides whether to trace a request when it builds its context,
+following ``trace_sample_rate``. A traced request carries a
+:class:`TraceContext` on its RequestContext, which travels with the
+context over RPC so the conductor records its spans in the same trace.
+
+Spans cover the whole API request, token validation, RPC calls and their
+handling, database statements and commands run. Each finished span is
+written as one JSON document to a file or sent in a UDP datagram::
+
+    {"trace_id": "...", "span_id": "...", "parent_id": "...",
+     "name": "rpc.call", "service": "iot-api", "host": "...",
+     "start": 1420070400.0, "duration": 0.012, "tags": {...}}
+
+Requests that are not traced only pay for an attribute lookup.
+"""
+
+import binascii
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+from oslo.config import cfg
+from oslo_context import context
+
+from iot.common import paths
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+
+TRACING_OPTS = [
+    cfg.FloatOpt('trace_sample_rate',
+                 default=0.0,
+                 help='Fraction of API requests that are traced, between '
+                      '0 and 1. The conductor traces the requests the API '
+                      'decided to trace.'),
+    cfg.StrOpt('trace_exporter',
+               default='file',
+               choices=('file', 'udp'),
+               help='Where finished spans go: appended to trace_file or '
+                    'sent to trace_udp_address.'),
+    cfg.StrOpt('trace_file',
+               default=paths.state_path_def('traces.json'),
+               help='File spans are appended to, one JSON document per '
+                    'line.'),
+    cfg.StrOpt('trace_udp_address',
+               default='127.0.0.1:9931',
+               help='host:port spans are sent to, one JSON document per '
+                    'datagram.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(TRACING_OPTS)
+
+LOG = logging.getLogger(__name__)
+
+# Header a client may send to make its own trace the parent of the
+# request, in the W3C trace context format.
+TRACEPARENT_HEADER = 'traceparent'
+
+_SERVICE = os.path.basename(sys.argv[0]) or 'iot'
+_HOST = socket.gethostname()
+
+# Datagrams larger than this are likely to be dropped on the way.
+_MAX_DATAGRAM = 65000
+
+
+def _new_id(nbytes):
+    return binascii.hexlify(os.urandom(nbytes)).decode('ascii')
+
+
+class TraceContext(object):
+    """The trace a request belongs to and the span it entered through.
+
+    The context is shared by every green thread working on the request,
+    so it never changes while spans open and close: span_id stays the
+    root span of the request in the API, or the span of the caller in the
+    conductor. The spans open in each green thread are kept apart, see
+    current_span_id().
+    """
+
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id=None, span_id=None):
+        self.trace_id = trace_id or _new_id(16)
+        self.span_id = span_id
+
+    def to_header(self):
+        """The traceparent value, parented to the calling thread's span."""
+        return '00-%s-%s-01' % (self.trace_id,
+                                current_span_id(self) or '0' * 16)
+
+    @classmethod
+    def from_header(cls, header):
+        """Parse a traceparent value, returns None if it is malformed."""
+        parts = (header or '').strip().split('-')
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            int(parts[1], 16)
+            int(parts[2], 16)
+        except ValueError:
+            return None
+        if parts[1] == '0' * 32:
+            return None
+        return cls(parts[1], None if parts[2] == '0' * 16 else parts[2])
+
+
+class _FileExporter(object):
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def export(self, data):
+        with self._lock:
+            self._file.write(data + '\n')
+            self._file.flush()
+
+
+class _UDPExporter(object):
+
+    def __init__(self, address):
+        host, _sep, port = address.rpartition(':')
+        self._address = (host.strip('[]'), int(port))
+        family = socket.AF_INET6 if ':' in self._address[0] else \
+            socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+
+    def export(self, data):
+        if len(data) <= _MAX_DATAGRAM:
+            self._socket.sendto(data, self._address)
+
+
+# Spans opened by span() and not finished yet, innermost last, kept per
+# thread (per green thread once eventlet has patched threading).
+_local = threading.local()
+
+
+def _open_spans():
+    try:
+        return _local.spans
+    except AttributeError:
+        _local.spans = []
+        return _local.spans
+
+
+def current_span_id(trace):
+    """Return the innermost span of trace open in the calling thread.
+
+    Falls back to the span the trace entered through when the thread has
+    no span of its own open, e.g. in a green thread spawned by a request.
+    """
+    for open_span in reversed(_open_spans()):
+        if open_span.trace_id == trace.trace_id:
+            return open_span.span_id
+    return trace.span_id
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                if CONF.trace_exporter == 'udp':
+                    _exporter = _UDPExporter(CONF.trace_udp_address)
+                else:
+                    _exporter = _FileExporter(CONF.trace_file)
+    return _exporter
+
+
+class Span(object):
+    """A timed operation within a trace.
+
+    :param trace: the TraceContext the span belongs to; the innermost
+                  span of it open in the calling thread becomes the
+                  parent of this one.
+    :param name: what is being done, e.g. 'rpc.call'.
+    :param tags: details of the operation.
+    :param start: when the operation started, by default now.
+    """
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'tags',
+                 'start')
+
+    def __init__(self, trace, name, tags=None, start=None):
+        self.trace_id = trace.trace_id
+        self.parent_id = current_span_id(trace)
+        self.span_id = _new_id(8)
+        self.name = name
+        self.tags = tags or {}
+        self.start = start or time.time()
+
+    def finish(self, end=None):
+        """Export the span, ending now or at end."""
+        data = json.dumps({'trace_id': self.trace_id,
+                           'span_id': self.span_id,
+                           'parent_id': self.parent_id,
+                           'name': self.name,
+                           'service': _SERVICE,
+                           'host': _HOST,
+                           'start': self.start,
+                           'duration': (end or time.time()) - self.start,
+                           'tags': self.tags},
+                          default=str)
+        try:
+            _get_exporter().export(data)
+        except Exception:
+            # Tracing must never fail the request it observes.
+            LOG.warn(_LW('Could not export span %s'), self.name,
+                     exc_info=True)
+
+
+def _trace_of(ctxt):
+    if ctxt is None:
+        ctxt = context.get_current()
+    return getattr(ctxt, 'trace', None)
+
+
+def start_request(ctxt, header=None, start=None, sample_rate=None):
+    """Decide whether to trace a request and open its root span.
+
+    :param ctxt: the RequestContext of the request.
+    :param header: the traceparent header sent by the client, if any.
+    :param start: when the request arrived, by default now.
+    :param sample_rate: by default ``trace_sample_rate``.
+    :returns: the root Span, to be finished with the request, or None
+              when the request is not traced.
+    """
+    if sample_rate is None:
+        sample_rate = CONF.trace_sample_rate
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    trace = TraceContext.from_header(header) if header else None
+    ctxt.trace = trace or TraceContext()
+    span = Span(ctxt.trace, 'api.request', start=start)
+    ctxt.trace.span_id = span.span_id
+    return span
+
+
+@contextlib.contextmanager
+def span(name, ctxt=None, **tags):
+    """Trace the block as a span of the request of ctxt.
+
+    Nested spans and RPC calls made within the block by the same thread
+    are its children; other green threads sharing the context keep their
+    own spans. Yields the Span, or None when the request is not traced.
+
+    :param ctxt: the RequestContext, by default the current one.
+    """
+    trace = _trace_of(ctxt)
+    if trace is None:
+        yield None
+        return
+    current = Span(trace, name, tags)
+    spans = _open_spans()
+    spans.append(current)
+    try:
+        yield current
+    except Exception as e:
+        current.tags['error'] = type(e).__name__
+        raise
+    finally:
+        spans.remove(current)
+        current.finish()
+
+
+def record_span(name, start, end=None, ctxt=None, **tags):
+    """Record an operation that has already happened as a span."""
+    trace = _trace_of(ctxt)
+    if trace is not None:
+        Span(trace, name, tags, start=start).finish(end)
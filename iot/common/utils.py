@@ -14,14 +14,17 @@
 
 """Utilities and helper functions."""
 
+import collections
 import contextlib
 import errno
 import hashlib
+import logging as std_logging
 import os
 import random
 import re
 import shutil
 import tempfile
+import time
 import uuid
 
 import netaddr
@@ -31,7 +34,10 @@ from oslo_concurrency import processutils
 import paramiko
 import six
 
+from iot.common import context
 from iot.common import exception
+from iot.common import metrics
+from iot.common import tracing
 from iot.openstack.common._i18n import _
 from iot.openstack.common._i18n import _LE
 from iot.openstack.common._i18n import _LW
@@ -44,6 +50,14 @@ UTILS_OPTS = [
                     'running commands as root.'),
     cfg.StrOpt('tempdir',
                help='Explicitly specify the temporary working directory.'),
+    cfg.IntOpt('execute_log_output_limit',
+               default=1024,
+               help='Maximum number of characters of command stdout and '
+                    'stderr included in debug logs by execute().'),
+    cfg.IntOpt('ssh_keepalive_interval',
+               default=20,
+               help='Interval in seconds between TCP keepalive packets sent '
+                    'on SSH connections. 0 disables keepalives.'),
 ]
 
 CONF = cfg.CONF
@@ -56,6 +70,63 @@ def _get_root_helper():
     return 'sudo iot-rootwrap %s' % CONF.rootwrap_config
 
 
+COMMAND_DURATION = metrics.histogram(
+    'iot_command_duration_seconds',
+    'Wall time of commands run through execute() and trycmd().',
+    ('command', 'exit_code'))
+
+
+class _LazyCommandLine(object):
+    """Render a command line only when a log record is emitted."""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+
+    def __str__(self):
+        return ' '.join(map(str, self.cmd))
+
+
+class _LazyTruncated(object):
+    """Render command output, cut to a bounded length, only when needed."""
+
+    def __init__(self, text, limit):
+        self.text = text
+        self.limit = limit
+
+    def __str__(self):
+        text = self.text
+        if self.limit and len(text) > self.limit:
+            return '%s... [%d characters truncated]' % (
+                text[:self.limit], len(text) - self.limit)
+        return text
+
+
+def record_command(cmd, duration, exit_code):
+    """Record the wall time and exit code of a command.
+
+    The command is added to the metrics and, as a span that has just
+    ended, to the trace of the current request.
+
+    :param cmd: the command line; only the executable name is recorded.
+    :param duration: wall time in seconds.
+    :param exit_code: the exit code, or a short string such as 'timeout'.
+    """
+    name = os.path.basename(str(cmd[0])) if cmd else ''
+    COMMAND_DURATION.labels(name, str(exit_code)).observe(duration)
+    end = time.time()
+    tracing.record_span('execute', end - duration, end, command=name,
+                        exit_code=exit_code)
+
+
+def get_command_stats():
+    """Return the recorded command durations keyed by (command, exit code).
+
+    :returns: a dict mapping (command, exit_code) to a dict with the
+              'count', the total wall time 'sum' and the 'buckets'.
+    """
+    return COMMAND_DURATION.snapshot()
+
+
 def execute(*cmd, **kwargs):
     """Convenience wrapper around oslo's execute() method.
 
@@ -66,8 +137,10 @@ def execute(*cmd, **kwargs):
     :returns: (stdout, stderr) from process execution
     :raises: UnknownArgumentError
     :raises: ProcessExecutionError
+    :raises: DeadlineExceeded if the current request is past its deadline.
     """
 
+    context.check_deadline(_LazyCommandLine(cmd))
     use_standard_locale = kwargs.pop('use_standard_locale', False)
     if use_standard_locale:
         env = kwargs.pop('env_variables', os.environ.copy())
@@ -75,24 +148,91 @@ def execute(*cmd, **kwargs):
         kwargs['env_variables'] = env
     if kwargs.get('run_as_root') and 'root_helper' not in kwargs:
         kwargs['root_helper'] = _get_root_helper()
-    result = processutils.execute(*cmd, **kwargs)
-    LOG.debug('Execution completed, command line is "%s"',
-              ' '.join(map(str, cmd)))
-    LOG.debug('Command stdout is: "%s"' % result[0])
-    LOG.debug('Command stderr is: "%s"' % result[1])
+    start = time.time()
+    try:
+        result = processutils.execute(*cmd, **kwargs)
+    except processutils.ProcessExecutionError as e:
+        record_command(cmd, time.time() - start, e.exit_code)
+        raise
+    duration = time.time() - start
+    record_command(cmd, duration, 0)
+    # NOTE: the adapter processes its arguments before the level check,
+    # so check explicitly to keep this path cheap when debug is off.
+    if LOG.isEnabledFor(std_logging.DEBUG):
+        limit = CONF.execute_log_output_limit
+        cmdline = _LazyCommandLine(cmd)
+        LOG.debug('Execution completed in %(duration).3fs, command line '
+                  'is "%(cmd)s"',
+                  {'duration': duration, 'cmd': cmdline},
+                  fields={'duration': duration,
+                          'cmd': lambda: six.text_type(cmdline)})
+        LOG.debug('Command stdout is: "%s"', _LazyTruncated(result[0], limit))
+        LOG.debug('Command stderr is: "%s"', _LazyTruncated(result[1], limit))
     return result
 
 
 def trycmd(*args, **kwargs):
-    """Convenience wrapper around oslo's trycmd() method."""
-    if kwargs.get('run_as_root') and 'root_helper' not in kwargs:
-        kwargs['root_helper'] = _get_root_helper()
-    return processutils.trycmd(*args, **kwargs)
+    """Convenience wrapper around oslo's trycmd() method.
+
+    Runs through :func:`execute` so the command is instrumented the same
+    way. Returns (stdout, stderr); stderr holds the error on failure.
+
+    :param discard_warnings: True | False. Defaults to False. If set to
+                             True, then for succeeding commands, stderr
+                             is cleared.
+    """
+    discard_warnings = kwargs.pop('discard_warnings', False)
+    try:
+        out, err = execute(*args, **kwargs)
+        failed = False
+    except processutils.ProcessExecutionError as exn:
+        out, err = '', six.text_type(exn)
+        failed = True
+
+    if not failed and discard_warnings and err:
+        # Handle commands that output to stderr but otherwise succeed
+        err = ''
+
+    return out, err
+
+
+# The most recently parsed private keys, keyed by a digest of the key
+# material so the key itself is not used as a dict key.
+_PKEY_CACHE = collections.OrderedDict()
+_PKEY_CACHE_SIZE = 32
+
+
+def _load_private_key(key_contents):
+    """Parse a private key, reusing a previously parsed key if possible."""
+    digest = hashlib.sha256(key_contents.encode('utf-8')
+                            if isinstance(key_contents, six.text_type)
+                            else key_contents).hexdigest()
+    pkey = _PKEY_CACHE.pop(digest, None)
+    if pkey is not None:
+        _PKEY_CACHE[digest] = pkey
+        return pkey
+
+    data = six.moves.StringIO(key_contents)
+    if "BEGIN RSA PRIVATE" in key_contents:
+        pkey = paramiko.RSAKey.from_private_key(data)
+    elif "BEGIN DSA PRIVATE" in key_contents:
+        pkey = paramiko.DSSKey.from_private_key(data)
+    else:
+        # Can't include the key contents - secure material.
+        raise ValueError(_("Invalid private key"))
+    _PKEY_CACHE[digest] = pkey
+    while len(_PKEY_CACHE) > _PKEY_CACHE_SIZE:
+        _PKEY_CACHE.popitem(last=False)
+    return pkey
 
 
 def ssh_connect(connection):
     """Method to connect to a remote system using ssh protocol.
 
+    Callers running several commands against the same host should prefer
+    :func:`iot.common.ssh_utils.get_pool` or
+    :func:`iot.common.ssh_utils.execute_many`, which reuse connections.
+
     :param connection: a dict of connection parameters.
     :returns: paramiko.SSHClient -- an active ssh connection.
     :raises: SSHConnectFailed
@@ -103,14 +243,7 @@ def ssh_connect(connection):
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         key_contents = connection.get('key_contents')
         if key_contents:
-            data = six.moves.StringIO(key_contents)
-            if "BEGIN RSA PRIVATE" in key_contents:
-                pkey = paramiko.RSAKey.from_private_key(data)
-            elif "BEGIN DSA PRIVATE" in key_contents:
-                pkey = paramiko.DSSKey.from_private_key(data)
-            else:
-                # Can't include the key contents - secure material.
-                raise ValueError(_("Invalid private key"))
+            pkey = _load_private_key(key_contents)
         else:
             pkey = None
         ssh.connect(connection.get('host'),
@@ -121,10 +254,10 @@ def ssh_connect(connection):
                     key_filename=connection.get('key_filename'),
                     timeout=connection.get('timeout', 10))
 
-        # send TCP keepalive packets every 20 seconds
-        ssh.get_transport().set_keepalive(20)
+        # send TCP keepalive packets every ssh_keepalive_interval seconds
+        ssh.get_transport().set_keepalive(CONF.ssh_keepalive_interval)
     except Exception as e:
-        LOG.debug("SSH connect failed: %s" % e)
+        LOG.debug("SSH connect failed: %s", e)
         raise exception.SSHConnectFailed(host=connection.get('host'))
 
     return ssh
@@ -300,7 +433,7 @@ def read_cached_file(filename, cache_info, reload_func=None):
     """
     mtime = os.path.getmtime(filename)
     if not cache_info or mtime != cache_info.get('mtime'):
-        LOG.debug("Reloading cached file %s" % filename)
+        LOG.debug("Reloading cached file %s", filename)
         with open(filename) as fap:
             cache_info['data'] = fap.read()
         cache_info['mtime'] = mtime
@@ -11,7 +11,10 @@
 #    limitations under the License.
 
 """API for interfacing with IoT Backend."""
+import copy
+
 from oslo.config import cfg
+import six
 
 from iot.common import rpc_service
 from iot import objects
@@ -45,3 +48,57 @@ class API(rpc_service.API):
 
     def device_show(self, device_uuid):
         return self._call('device_show', device_uuid=device_uuid)
+
+    # Asynchronous operations
+
+    def _submit_job(self, method, resource_uuid, **kwargs):
+        """Create a job for method and cast it to a conductor.
+
+        :returns: the :class:`iot.objects.Job` tracking the operation.
+        """
+        job = objects.Job(self._context,
+                          action=method,
+                          resource_uuid=resource_uuid,
+                          project_id=self._context.tenant,
+                          user_id=self._context.user,
+                          status=objects.Job.PENDING)
+        job.create()
+        # The job outlives the request, so it is cast without the
+        # request's deadline: a conductor would otherwise drop it once the
+        # client stopped waiting, leaving the job PENDING for good.
+        ctxt = copy.copy(self._context)
+        ctxt.deadline = None
+        try:
+            self._cast_in_context(ctxt, method, job_uuid=job.uuid, **kwargs)
+        except Exception as e:
+            job.status = objects.Job.FAILED
+            job.status_reason = six.text_type(e)
+            job.save()
+            raise
+        return job
+
+    def device_create_async(self, name, device_uuid, device):
+        return self._submit_job('device_create', device_uuid, name=name,
+                                device_uuid=device_uuid, device=device)
+
+    def device_delete_async(self, device_uuid):
+        return self._submit_job('device_delete', device_uuid,
+                                device_uuid=device_uuid)
+
+    # Object indirection
+
+    def object_class_action(self, context, objname, objmethod, objver,
+                            args, kwargs):
+        return self._call_in_context(context, 'object_class_action',
+                                     objname=objname, objmethod=objmethod,
+                                     objver=objver, args=args,
+                                     kwargs=kwargs)
+
+    def object_action(self, context, objinst, objmethod, args, kwargs):
+        return self._call_in_context(context, 'object_action',
+                                     objinst=objinst, objmethod=objmethod,
+                                     args=args, kwargs=kwargs)
+
+    def object_batch_action(self, context, actions):
+        return self._call_in_context(context, 'object_batch_action',
+                                     actions=actions)
@@ -22,6 +22,14 @@ SERVICE_OPTS = [
     cfg.StrOpt('host',
                default='localhost',
                help='The location of the conductor rpc queue'),
+    cfg.FloatOpt('job_status_flush_interval',
+                 default=1.0,
+                 help='Seconds job status changes are buffered before they '
+                      'are written to the database in one transaction.'),
+    cfg.IntOpt('job_status_batch_size',
+               default=100,
+               help='Number of buffered job status changes that triggers '
+                    'an immediate write to the database.'),
 ]
 
 opt_group = cfg.OptGroup(
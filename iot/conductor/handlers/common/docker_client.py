@@ -16,6 +16,7 @@ from docker import client
 from docker import tls
 from oslo.config import cfg
 
+from iot.common import context
 from magnum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -45,6 +46,17 @@ class DockerHTTPClient(client.Client):
             tls=ssl_config
         )
 
+    def _set_request_timeout(self, kwargs):
+        """Cap each API call at the time left to the current request."""
+        kwargs = super(DockerHTTPClient, self)._set_request_timeout(kwargs)
+        remaining = context.time_remaining()
+        if remaining is not None:
+            context.check_deadline('docker API call')
+            timeout = kwargs.get('timeout')
+            kwargs['timeout'] = (remaining if timeout is None
+                                 else min(timeout, remaining))
+        return kwargs
+
     def list_instances(self, inspect=False):
         res = []
         for container in self.containers(all=True):
@@ -0,0 +1,132 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Tracking of asynchronous jobs run by the conductor.
+
+Status changes are buffered in memory and written to the database in a
+single transaction every ``job_status_flush_interval`` seconds, or as soon
+as ``job_status_batch_size`` of them are pending. Successive changes to
+the same job in between two writes are coalesced.
+"""
+
+import collections
+import functools
+import threading
+
+from oslo.config import cfg
+from oslo.utils import excutils
+import six
+
+from iot import objects
+from iot.openstack.common._i18n import _LE
+from iot.openstack.common import log as logging
+from iot.openstack.common import loopingcall
+
+cfg.CONF.import_opt('job_status_flush_interval', 'iot.conductor.config',
+                    group='conductor')
+cfg.CONF.import_opt('job_status_batch_size', 'iot.conductor.config',
+                    group='conductor')
+
+LOG = logging.getLogger(__name__)
+
+
+class JobStatusBuffer(object):
+    """Collect job status changes and persist them in batches."""
+
+    def __init__(self, interval=None, batch_size=None):
+        self.interval = (cfg.CONF.conductor.job_status_flush_interval
+                         if interval is None else interval)
+        self.batch_size = (cfg.CONF.conductor.job_status_batch_size
+                           if batch_size is None else batch_size)
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def update(self, context, job_uuid, status, reason=None):
+        """Record a status change, to be written with the next batch."""
+        with self._lock:
+            self._pending.pop(job_uuid, None)
+            self._pending[job_uuid] = (context, {'status': status,
+                                                 'status_reason': reason})
+            full = len(self._pending) >= self.batch_size
+        if full or not self.interval:
+            self.flush()
+        else:
+            self._start_timer()
+
+    def _start_timer(self):
+        if self._timer is None:
+            self._timer = loopingcall.FixedIntervalLoopingCall(self.flush)
+            self._timer.start(interval=self.interval,
+                              initial_delay=self.interval,
+                              anchored=True, name='job_status_flush')
+
+    def flush(self):
+        """Write all pending status changes in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, collections.OrderedDict()
+        if not pending:
+            return
+        context = next(six.itervalues(pending))[0]
+        updates = collections.OrderedDict(
+            (job_uuid, values)
+            for job_uuid, (_ctxt, values) in six.iteritems(pending))
+        try:
+            objects.Job.update_statuses(context, updates)
+        except Exception:
+            LOG.exception(_LE('Failed to record the status of %d jobs, '
+                              'retrying with the next batch'), len(updates))
+            with self._lock:
+                # Keep any newer change made while we were writing.
+                for job_uuid, item in six.iteritems(pending):
+                    self._pending.setdefault(job_uuid, item)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self.flush()
+
+
+STATUS_BUFFER = JobStatusBuffer()
+
+
+def tracked(fn):
+    """Decorator for conductor handler methods that may run as a job.
+
+    The caller passes the uuid of a job created beforehand as the
+    ``job_uuid`` keyword argument, typically along with an RPC cast. The
+    job is marked RUNNING, then SUCCEEDED or FAILED depending on whether
+    the method raised. Without ``job_uuid`` the method is called as is.
+
+    Exceptions are always raised again once the job is marked FAILED, so
+    a synchronous caller gets the error. For a cast, oslo.messaging
+    logs it.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, ctxt, *args, **kwargs):
+        job_uuid = kwargs.pop('job_uuid', None)
+        if job_uuid is None:
+            return fn(self, ctxt, *args, **kwargs)
+        STATUS_BUFFER.update(ctxt, job_uuid, objects.Job.RUNNING)
+        try:
+            result = fn(self, ctxt, *args, **kwargs)
+        except Exception as e:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_LE('Job %(job)s (%(action)s) failed: %(error)s'),
+                          {'job': job_uuid, 'action': fn.__name__,
+                           'error': e})
+                STATUS_BUFFER.update(ctxt, job_uuid, objects.Job.FAILED,
+                                     six.text_type(e))
+        STATUS_BUFFER.update(ctxt, job_uuid, objects.Job.SUCCEEDED)
+        return result
+    return wrapper
@@ -12,10 +12,12 @@
 
 """Magnum Kubernetes RPC handler."""
 
+import contextlib
 import tempfile
 
+from iot.common import parallel_utils
+from iot.common import utils
 from magnum.openstack.common import log as logging
-from magnum.openstack.common import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -42,6 +44,43 @@ def _k8s_create_with_data(master_address, resource_data):
         return _k8s_create_with_path(master_address, f.name)
 
 
+@contextlib.contextmanager
+def _k8s_manifest_paths(resources):
+    """Yield a manifest path for each resource, writing data to temp files."""
+    files = []
+    try:
+        paths = []
+        for resource in resources:
+            if resource.manifest is not None:
+                f = tempfile.NamedTemporaryFile()
+                files.append(f)
+                f.write(resource.manifest)
+                f.flush()
+                paths.append(f.name)
+            else:
+                paths.append(resource.manifest_url)
+        yield paths
+    finally:
+        for f in files:
+            f.close()
+
+
+def _k8s_create_many(master_address, resources):
+    """Create several resources with concurrent kubectl invocations.
+
+    :returns: a list of booleans, True where the resource was created.
+    """
+    with _k8s_manifest_paths(resources) as paths:
+        commands = [('kubectl', 'create', '-s', master_address, '-f', path)
+                    for path in paths]
+        results = parallel_utils.execute_parallel(commands)
+    for resource, result in zip(resources, results):
+        if not result.succeeded or result.stderr:
+            LOG.error("Couldn't create resource with contents %s due to "
+                      "error %s" % (resource, result.stderr or result.error))
+    return [r.succeeded and not r.stderr for r in results]
+
+
 def _k8s_update(master_address, resource):
     data = resource.manifest
     definition_url = resource.manifest_url
@@ -77,7 +116,7 @@ class KubeClient(object):
         super(KubeClient, self).__init__()
 
     def service_create(self, master_address, service):
-        LOG.debug("service_create with contents %s" % service)
+        LOG.debug("service_create with contents %s", service)
         try:
             out, err = _k8s_create(master_address, service)
 
@@ -89,8 +128,12 @@ class KubeClient(object):
             return False
         return True
 
+    def service_create_many(self, master_address, services):
+        LOG.debug("service_create_many for %d services", len(services))
+        return _k8s_create_many(master_address, services)
+
     def service_update(self, master_address, service):
-        LOG.debug("service_update with contents %s" % service)
+        LOG.debug("service_update with contents %s", service)
         try:
             out, err = _k8s_update(master_address, service)
 
@@ -114,7 +157,7 @@ class KubeClient(object):
             return None
 
     def service_delete(self, master_address, name):
-        LOG.debug("service_delete %s" % name)
+        LOG.debug("service_delete %s", name)
         try:
             out, err = utils.trycmd('kubectl', 'delete', 'service', name,
                                     '-s', master_address)
@@ -127,7 +170,7 @@ class KubeClient(object):
         return True
 
     def service_get(self, master_address, uuid):
-        LOG.debug("service_get %s" % uuid)
+        LOG.debug("service_get %s", uuid)
         try:
             out = utils.execute('kubectl', 'get', 'service', uuid,
                                 '-s', master_address)
@@ -138,7 +181,7 @@ class KubeClient(object):
             return None
 
     def service_show(self, master_address, uuid):
-        LOG.debug("service_show %s" % uuid)
+        LOG.debug("service_show %s", uuid)
         try:
             out = utils.execute('kubectl', 'describe', 'service', uuid,
                                 '-s', master_address)
@@ -151,7 +194,7 @@ class KubeClient(object):
 
     # Pod Operations
     def pod_create(self, master_address, pod):
-        LOG.debug("pod_create contents %s" % pod)
+        LOG.debug("pod_create contents %s", pod)
         try:
             out, err = _k8s_create(master_address, pod)
 
@@ -163,8 +206,12 @@ class KubeClient(object):
             return False
         return True
 
+    def pod_create_many(self, master_address, pods):
+        LOG.debug("pod_create_many for %d pods", len(pods))
+        return _k8s_create_many(master_address, pods)
+
     def pod_update(self, master_address, pod):
-        LOG.debug("pod_update contents %s" % pod)
+        LOG.debug("pod_update contents %s", pod)
         try:
             out, err = _k8s_update(master_address, pod)
 
@@ -187,7 +234,7 @@ class KubeClient(object):
             return None
 
     def pod_delete(self, master_address, name):
-        LOG.debug("pod_delete %s" % name)
+        LOG.debug("pod_delete %s", name)
         try:
             out, err = utils.trycmd('kubectl', 'delete', 'pod', name,
                                     '-s', master_address,)
@@ -199,7 +246,7 @@ class KubeClient(object):
         return True
 
     def pod_get(self, master_address, uuid):
-        LOG.debug("pod_get %s" % uuid)
+        LOG.debug("pod_get %s", uuid)
         try:
             out = utils.execute('kubectl', 'get', 'pod', uuid,
                                 '-s', master_address)
@@ -210,7 +257,7 @@ class KubeClient(object):
             return None
 
     def pod_show(self, master_address, uuid):
-        LOG.debug("pod_show %s" % uuid)
+        LOG.debug("pod_show %s", uuid)
         try:
             out = utils.execute('kubectl', 'describe', 'pod', uuid,
                                 '-s', master_address)
@@ -222,7 +269,7 @@ class KubeClient(object):
 
     # Replication Controller Operations
     def rc_create(self, master_address, rc):
-        LOG.debug("rc_create contents %s" % rc)
+        LOG.debug("rc_create contents %s", rc)
         try:
             out, err = _k8s_create(master_address, rc)
 
@@ -234,8 +281,12 @@ class KubeClient(object):
             return False
         return True
 
+    def rc_create_many(self, master_address, rcs):
+        LOG.debug("rc_create_many for %d rcs", len(rcs))
+        return _k8s_create_many(master_address, rcs)
+
     def rc_update(self, master_address, rc):
-        LOG.debug("rc_update contents %s" % rc)
+        LOG.debug("rc_update contents %s", rc)
         try:
             out, err = _k8s_update(master_address, rc)
 
@@ -248,7 +299,7 @@ class KubeClient(object):
         return True
 
     def rc_delete(self, master_address, name):
-        LOG.debug("rc_delete %s" % name)
+        LOG.debug("rc_delete %s", name)
         try:
             out, err = utils.trycmd('kubectl', 'delete', 'rc', name,
                                     '-s', master_address)
@@ -16,6 +16,8 @@ from docker import errors
 from oslo.config import cfg
 
 from iot.common import docker_utils
+from iot.conductor.handlers.common import jobs
+from iot import objects
 from iot.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -32,15 +34,19 @@ class Handler(object):
 
     # Device operations
 
+    @jobs.tracked
     def device_create(self, ctxt, name, device_uuid, device):
-        LOG.debug('Creating device name %s'
-                  % (name))
+        LOG.debug('Creating device name %s', name)
+        device.create()
+        return device
 
     def device_list(self, ctxt):
         LOG.debug("device_list")
 
+    @jobs.tracked
     def device_delete(self, ctxt, device_uuid):
-        LOG.debug("device_delete %s" % device_uuid)
+        LOG.debug("device_delete %s", device_uuid)
+        objects.Device.get_by_uuid(ctxt, device_uuid).destroy()
 
     def device_show(self, ctxt, device_uuid):
-        LOG.debug("device_show %s" % device_uuid)
+        LOG.debug("device_show %s", device_uuid)
@@ -0,0 +1,79 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""IoT object indirection RPC handler.
+
+Runs remotable object methods on behalf of services that set
+IoTObject.indirection_api to a conductor API client.
+"""
+
+import six
+
+from iot.objects import base as objects_base
+from iot.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Handler(object):
+
+    def object_class_action(self, ctxt, objname, objmethod, objver,
+                            args, kwargs):
+        """Perform a classmethod action on an object class."""
+        objclass = objects_base.IoTObject.obj_class_from_name(objname,
+                                                              objver)
+        return getattr(objclass, objmethod)(ctxt, *args, **kwargs)
+
+    def object_action(self, ctxt, objinst, objmethod, args, kwargs):
+        """Perform an action on an object.
+
+        :returns: a tuple of the fields that changed, in primitive form,
+                  and the result of the method.
+        """
+        oldobj = objinst.obj_clone()
+        result = getattr(objinst, objmethod)(ctxt, *args, **kwargs)
+        updates = dict()
+        for name in objinst.fields:
+            if not objinst.obj_attr_is_set(name):
+                continue
+            if (not oldobj.obj_attr_is_set(name) or
+                    oldobj[name] != objinst[name]):
+                updates[name] = objinst._attr_to_primitive(name)
+        updates['obj_what_changed'] = list(objinst.obj_what_changed())
+        return updates, result
+
+    def object_batch_action(self, ctxt, actions):
+        """Perform a list of object and classmethod actions in order.
+
+        Each action is either ['object', objinst, objmethod, args, kwargs]
+        or ['class', objname, objmethod, objver, args, kwargs].
+
+        :returns: one reply per action, [True, updates, result] if it
+                  succeeded and [False, error class name, error message,
+                  error module] if it raised.
+        """
+        replies = []
+        for action in actions:
+            try:
+                if action[0] == 'object':
+                    updates, result = self.object_action(ctxt, *action[1:])
+                else:
+                    updates = None
+                    result = self.object_class_action(ctxt, *action[1:])
+            except Exception as e:
+                LOG.debug('Batched object action %(method)s failed: '
+                          '%(error)s', {'method': action[2], 'error': e})
+                replies.append([False, e.__class__.__name__,
+                                six.text_type(e), e.__class__.__module__])
+            else:
+                replies.append([True, updates, result])
+        return replies
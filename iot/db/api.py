@@ -39,6 +39,25 @@ class Connection(object):
     def __init__(self):
         """Constructor."""
 
+    @abc.abstractmethod
+    def begin_request(self, context):
+        """Share a session and transaction between the calls of a request.
+
+        Does nothing unless request sessions are enabled. The calls made
+        while context is the current request context use the session.
+
+        :param context: The request context.
+        """
+
+    @abc.abstractmethod
+    def end_request(self, context, failed=False):
+        """End the session begun by begin_request, if any.
+
+        :param context: The request context.
+        :param failed: Roll back the changes of the request rather than
+                       committing them.
+        """
+
     @abc.abstractmethod
     def get_device_list(self, columns=None, filters=None, limit=None,
                      marker=None, sort_key=None, sort_dir=None):
@@ -60,6 +79,27 @@ class Connection(object):
         :returns: A list of tuples of the specified columns.
         """
 
+    @abc.abstractmethod
+    def get_deviceinfo_list(self, columns=None, filters=None, limit=None,
+                            marker=None, sort_key=None, sort_dir=None):
+        """Get specific columns for matching devices.
+
+        Return a list of the specified columns for all devices that match
+        the specified filters.
+
+        :param columns: List of column names to return.
+                        Defaults to 'id' column when columns == None.
+        :param filters: Filters to apply. Defaults to None.
+
+        :param limit: Maximum number of devices to return.
+        :param marker: the last item of the previous page; we return the next
+                       result set.
+        :param sort_key: Attribute by which results should be sorted.
+        :param sort_dir: direction in which results should be sorted.
+                         (asc, desc)
+        :returns: A list of tuples of the specified columns.
+        """
+
     @abc.abstractmethod
     def create_device(self, values):
         """Create a new device.
@@ -102,3 +142,39 @@ class Connection(object):
 
         :param device_id: The id or uuid of a device.
         """
+
+    @abc.abstractmethod
+    def create_job(self, values):
+        """Create a new job.
+
+        :param values: A dict containing several items used to identify
+                       and track the job. For example:
+
+                       ::
+
+                        {
+                         'uuid': utils.generate_uuid(),
+                         'action': 'device_create',
+                         'resource_uuid': device_uuid,
+                         'status': 'PENDING',
+                        }
+        :returns: A job.
+        """
+
+    @abc.abstractmethod
+    def get_job_by_uuid(self, job_uuid):
+        """Return a job.
+
+        :param job_uuid: The uuid of a job.
+        :returns: A job.
+        """
+
+    @abc.abstractmethod
+    def update_jobs(self, updates):
+        """Update several jobs in a single transaction.
+
+        Jobs that no longer exist are skipped.
+
+        :param updates: A dict mapping job uuids to a dict of the values
+                        to update for that job.
+        """
@@ -0,0 +1,116 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""
+Database statements run on behalf of a single request.
+
+The storage backend records every statement in the QueryStats of the
+current request context. The API and the conductor report them once the
+request is done, and a statement repeated ``repeated_query_threshold``
+times within one request is flagged as a likely N+1 query pattern.
+"""
+
+import collections
+import logging as std_logging
+
+from oslo.config import cfg
+
+from iot.common import metrics
+from iot.openstack.common._i18n import _LW
+from iot.openstack.common import log as logging
+
+QUERY_STATS_OPTS = [
+    cfg.IntOpt('repeated_query_threshold',
+               default=10,
+               help='Number of times the same statement may run within a '
+                    'single request before it is logged as a likely N+1 '
+                    'query pattern. 0 disables the check.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(QUERY_STATS_OPTS, group='database')
+
+LOG = logging.getLogger(__name__)
+
+QUERIES = metrics.histogram('iot_db_queries_per_request',
+                            'Database statements run for a single request',
+                            buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+QUERY_TIME = metrics.histogram('iot_db_time_per_request_seconds',
+                               'Time spent in the database for a single '
+                               'request')
+REPEATED = metrics.counter('iot_db_repeated_queries_total',
+                           'Statements repeated often enough within a '
+                           'request to be flagged as N+1 queries')
+
+
+class QueryStats(object):
+    """Count, time and rows of the statements run for one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+        self.statements = collections.Counter()
+
+    def record(self, statement, duration, rows=None):
+        """Account a statement.
+
+        :param rows: rows the statement returned or changed, if known.
+        :returns: how many times the statement has run for the request.
+        """
+        self.count += 1
+        self.time += duration
+        if rows is not None and rows > 0:
+            self.rows += rows
+        self.statements[statement] += 1
+        return self.statements[statement]
+
+
+def get(ctxt):
+    """Return the QueryStats of a request context, creating them."""
+    stats = getattr(ctxt, 'query_stats', None)
+    if stats is None:
+        stats = ctxt.query_stats = QueryStats()
+    return stats
+
+
+def record(ctxt, statement, duration, rows=None):
+    """Account a statement to a request, flagging N+1 patterns."""
+    runs = get(ctxt).record(statement, duration, rows)
+    threshold = CONF.database.repeated_query_threshold
+    if threshold and runs == threshold:
+        REPEATED.inc()
+        LOG.warn(_LW('Statement ran %(runs)d times for request '
+                     '%(request)s, likely an N+1 query pattern: '
+                     '%(statement)s'),
+                 {'runs': runs, 'request': ctxt.request_id,
+                  'statement': statement})
+
+
+def report(ctxt, what):
+    """Record and log the statements run for a finished request.
+
+    :param what: the request, e.g. its method and path, for the log.
+    """
+    stats = getattr(ctxt, 'query_stats', None)
+    if stats is None:
+        QUERIES.observe(0)
+        return
+    QUERIES.observe(stats.count)
+    QUERY_TIME.observe(stats.time)
+    if LOG.isEnabledFor(std_logging.DEBUG):
+        LOG.debug('%(what)s ran %(count)d statements in %(time).3fs '
+                  'returning %(rows)d rows',
+                  {'what': what, 'count': stats.count, 'time': stats.time,
+                   'rows': stats.rows},
+                  fields={'db_statements': stats.count,
+                          'db_time': stats.time, 'db_rows': stats.rows})
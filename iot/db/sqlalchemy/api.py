@@ -12,32 +12,158 @@
 
 """SQLAlchemy storage backend."""
 
+import time
+
 from oslo.config import cfg
 from oslo.db import exception as db_exc
 from oslo.db.sqlalchemy import session as db_session
 from oslo.db.sqlalchemy import utils as db_utils
 from oslo.utils import timeutils
+from sqlalchemy import event
 from sqlalchemy.orm.exc import NoResultFound
 
+from iot.common import context
 from iot.common import exception
+from iot.common import metrics
+from iot.common import tracing
 from iot.common import utils
 from iot.db import api
+from iot.db import query_stats
 from iot.db.sqlalchemy import models
 from iot.openstack.common._i18n import _
+from iot.openstack.common._i18n import _LW
 from iot.openstack.common import log
 
+SLOW_QUERY_OPTS = [
+    cfg.FloatOpt('slow_query_threshold',
+                 default=0.5,
+                 help='Seconds after which a statement is logged as slow. '
+                      '0 disables the slow query log.'),
+    cfg.BoolOpt('slow_query_explain',
+                default=True,
+                help='Log the query plan of slow SELECT statements.'),
+    cfg.BoolOpt('request_session',
+                default=False,
+                help='Run the database calls of an API request in one '
+                     'session and transaction, sharing a connection and '
+                     'the loaded rows. Changes are committed when the '
+                     'request succeeds or sends an RPC message, and rolled '
+                     'back when it fails.'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(SLOW_QUERY_OPTS, group='database')
 
 LOG = log.getLogger(__name__)
 
 
 _FACADE = None
 
+QUERY_TIME = metrics.histogram('iot_db_query_seconds',
+                               'Time spent running database statements',
+                               ('operation',))
+
+_OPERATIONS = frozenset(['SELECT', 'INSERT', 'UPDATE', 'DELETE'])
+
+_EXPLAIN = {'mysql': 'EXPLAIN ',
+            'postgresql': 'EXPLAIN ',
+            'sqlite': 'EXPLAIN QUERY PLAN '}
+
+
+def _enforce_deadline(conn, cursor, statement, parameters, exc_context,
+                      executemany):
+    """Refuse statements past the request deadline, bound the others.
+
+    On MySQL, read-only statements are given an optimizer hint so the
+    server itself stops them once the request deadline has passed.
+    """
+    remaining = context.time_remaining()
+    if remaining is None:
+        return statement, parameters
+    context.check_deadline('database query')
+    if (conn.dialect.name == 'mysql' and
+            statement.lstrip()[:6].upper() == 'SELECT'):
+        statement = statement.lstrip()
+        statement = 'SELECT /*+ MAX_EXECUTION_TIME(%d) */%s' % (
+            max(1, int(remaining * 1000)), statement[6:])
+    return statement, parameters
+
+
+def _query_started(conn, cursor, statement, parameters, exc_context,
+                   executemany):
+    conn.info['iot_query_start'] = time.time()
+
+
+def _query_finished(conn, cursor, statement, parameters, exc_context,
+                    executemany):
+    start = conn.info.pop('iot_query_start', None)
+    if start is None:
+        return
+    operation = statement.lstrip()[:6].upper()
+    if operation not in _OPERATIONS:
+        operation = 'OTHER'
+    end = time.time()
+    duration = end - start
+    QUERY_TIME.labels(operation).observe(duration)
+    tracing.record_span('db.query', start, end, operation=operation,
+                        statement=statement[:200])
+    ctxt = context.get_current()
+    if ctxt is not None:
+        rowcount = getattr(cursor, 'rowcount', -1)
+        query_stats.record(ctxt, statement, duration,
+                           rowcount if rowcount >= 0 else None)
+    threshold = CONF.database.slow_query_threshold
+    if threshold and duration >= threshold:
+        _log_slow_query(conn, statement, parameters, duration,
+                        operation == 'SELECT' and not executemany)
+
+
+def _explain(conn, statement, parameters):
+    """Return the query plan of a statement, or None."""
+    prefix = _EXPLAIN.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    # A cursor of its own, the results of the statement have not been
+    # read yet. Using the DB-API directly keeps this out of the cursor
+    # events.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return '\n'.join(' | '.join(str(c) for c in row)
+                         for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement, parameters, duration, explain):
+    plan = None
+    if explain and CONF.database.slow_query_explain:
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception:
+            LOG.debug('Could not explain slow statement', exc_info=True)
+    ctxt = context.get_current()
+    LOG.warn(_LW('Slow statement took %(duration).3fs for request '
+                 '%(request)s: %(statement)s%(plan)s'),
+             {'duration': duration,
+              'request': getattr(ctxt, 'request_id', None),
+              'statement': statement,
+              'plan': '\nQuery plan:\n%s' % plan if plan else ''})
+
+
+def _listen(engine):
+    """Bound, time and account the statements run by engine."""
+    event.listen(engine, 'before_cursor_execute', _enforce_deadline,
+                 retval=True)
+    event.listen(engine, 'before_cursor_execute', _query_started)
+    event.listen(engine, 'after_cursor_execute', _query_finished)
+
 
 def _create_facade_lazily():
     global _FACADE
     if _FACADE is None:
         _FACADE = db_session.EngineFacade.from_config(CONF)
+        _listen(_FACADE.get_engine())
     return _FACADE
 
 
@@ -47,10 +173,54 @@ def get_engine():
 
 
 def get_session(**kwargs):
+    """Return the session of the current request, or a new one.
+
+    Sessions with specific options are never shared.
+    """
+    if not kwargs:
+        request_session = getattr(context.get_current(), 'db_session', None)
+        if request_session is not None:
+            return request_session.session
     facade = _create_facade_lazily()
     return facade.get_session(**kwargs)
 
 
+class _RequestSession(object):
+    """The session and transaction shared by the calls of a request.
+
+    The methods of Connection begin their transactions as subtransactions
+    of the one of the request, so nothing is committed before commit()
+    or end().
+    """
+
+    def __init__(self, session):
+        self.session = session
+        session.begin(subtransactions=True)
+
+    def commit(self):
+        """Commit the changes made so far and begin a new transaction."""
+        try:
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        self.session.begin(subtransactions=True)
+
+    def end(self, failed=False):
+        """Commit the request unless it failed, and close the session."""
+        try:
+            if not failed:
+                if self.session.is_active:
+                    self.session.commit()
+                else:
+                    LOG.warn(_LW('Rolling back the changes of request %s, '
+                                 'one of its database calls failed'),
+                             getattr(context.get_current(), 'request_id',
+                                     None))
+        finally:
+            self.session.close()
+
+
 def get_backend():
     """The backend is this module itself."""
     return Connection()
@@ -103,6 +273,19 @@ class Connection(api.Connection):
     def __init__(self):
         pass
 
+    def begin_request(self, context):
+        if (not CONF.database.request_session or
+                getattr(context, 'db_session', None) is not None):
+            return
+        context.db_session = _RequestSession(get_session())
+
+    def end_request(self, context, failed=False):
+        request_session = getattr(context, 'db_session', None)
+        if request_session is None:
+            return
+        context.db_session = None
+        request_session.end(failed)
+
     def _add_devices_filters(self, query, filters):
         if filters is None:
             filters = []
@@ -164,7 +347,7 @@ class Connection(api.Connection):
 
     def destroy_device(self, device_id):
         session = get_session()
-        with session.begin():
+        with session.begin(subtransactions=True):
             query = model_query(models.Device, session=session)
             query = add_identity_filter(query, device_id)
             count = query.delete()
@@ -180,7 +363,7 @@ class Connection(api.Connection):
 
     def _do_update_device(self, device_id, values):
         session = get_session()
-        with session.begin():
+        with session.begin(subtransactions=True):
             query = model_query(models.Device, session=session)
             query = add_identity_filter(query, device_id)
             try:
@@ -193,3 +376,32 @@ class Connection(api.Connection):
 
             ref.update(values)
         return ref
+
+    def create_job(self, values):
+        # ensure defaults are present for new jobs
+        if not values.get('uuid'):
+            values['uuid'] = utils.generate_uuid()
+
+        job = models.Job()
+        job.update(values)
+        try:
+            job.save()
+        except db_exc.DBDuplicateEntry:
+            raise exception.JobAlreadyExists(uuid=values['uuid'])
+        return job
+
+    def get_job_by_uuid(self, job_uuid):
+        query = model_query(models.Job).filter_by(uuid=job_uuid)
+        try:
+            return query.one()
+        except NoResultFound:
+            raise exception.JobNotFound(job=job_uuid)
+
+    def update_jobs(self, updates):
+        session = get_session()
+        with session.begin(subtransactions=True):
+            for job_uuid, values in updates.items():
+                values = dict(values, updated_at=timeutils.utcnow())
+                query = model_query(models.Job, session=session)
+                query.filter_by(uuid=job_uuid).update(
+                    values, synchronize_session=False)
@@ -25,6 +25,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Integer
 from sqlalchemy import schema
 from sqlalchemy import String
+from sqlalchemy import Text
 from sqlalchemy.types import TypeDecorator, TEXT
 
 from iot.common import paths
@@ -121,3 +122,21 @@ class Device(Base):
     uuid = Column(String(36))
     name = Column(String(255))
     desc = Column(String(255))
+
+
+class Job(Base):
+    """Represents an asynchronous operation on a resource."""
+
+    __tablename__ = 'job'
+    __table_args__ = (
+        schema.UniqueConstraint('uuid', name='uniq_job0uuid'),
+        table_args()
+        )
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String(36))
+    project_id = Column(String(255))
+    user_id = Column(String(255))
+    action = Column(String(255))
+    resource_uuid = Column(String(36))
+    status = Column(String(20))
+    status_reason = Column(Text)
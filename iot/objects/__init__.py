@@ -12,27 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from magnum.objects import bay
-from magnum.objects import baymodel
-from magnum.objects import container
-from magnum.objects import node
-from magnum.objects import pod
-from magnum.objects import replicationcontroller as rc
-from magnum.objects import service
+from iot.objects import device
+from iot.objects import job
 
 
-Container = container.Container
-Bay = bay.Bay
-BayModel = baymodel.BayModel
-Node = node.Node
-Pod = pod.Pod
-ReplicationController = rc.ReplicationController
-Service = service.Service
+Device = device.Device
+DeviceList = device.DeviceList
+Job = job.Job
 
-__all__ = (Bay,
-           BayModel,
-           Container,
-           Node,
-           Pod,
-           ReplicationController,
-           Service)
+__all__ = (Device,
+           DeviceList,
+           Job)
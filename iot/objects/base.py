@@ -14,19 +14,23 @@
 
 """IoT common internal object model"""
 
+import base64
 import collections
 import copy
+import threading
 
+import msgpack
 from oslo import messaging
+from oslo.utils import importutils
 from oslo_context import context
 import six
 
 from iot.common import exception
+from iot.common import rpc
 from iot.objects import utils as obj_utils
 from iot.openstack.common._i18n import _
 from iot.openstack.common._i18n import _LE
 from iot.openstack.common import log as logging
-from iot.openstack.common import versionutils
 
 
 LOG = logging.getLogger('object')
@@ -36,6 +40,10 @@ class NotSpecifiedSentinel:
     pass
 
 
+# Marks a field slot that has not been set.
+_UNSET = object()
+
+
 def get_attrname(name):
     """Return the mangled name of the attribute's underlying storage."""
     return '_%s' % name
@@ -49,18 +57,26 @@ def make_class_properties(cls):
         for name, field in supercls.fields.items():
             if name not in cls.fields:
                 cls.fields[name] = field
+    # Each field owns one bit of the changed-fields mask.
+    cls._obj_field_bits = dict((name, 1 << index) for index, name in
+                               enumerate(sorted(cls.fields)))
     for name, typefn in cls.fields.iteritems():
 
-        def getter(self, name=name):
-            attrname = get_attrname(name)
-            if not hasattr(self, attrname):
+        def getter(self, name=name, attrname=get_attrname(name)):
+            try:
+                return getattr(self, attrname)
+            except AttributeError:
                 self.obj_load_attr(name)
-            return getattr(self, attrname)
+                return getattr(self, attrname)
 
-        def setter(self, value, name=name, typefn=typefn):
-            self._changed_fields.add(name)
+        def setter(self, value, name=name, attrname=get_attrname(name),
+                   typefn=typefn, bit=cls._obj_field_bits[name]):
+            try:
+                self._obj_changed |= bit
+            except AttributeError:
+                self._obj_changed = bit
             try:
-                return setattr(self, get_attrname(name), typefn(value))
+                return setattr(self, attrname, typefn(value))
             except Exception:
                 attr = "%s.%s" % (self.obj_name(), name)
                 LOG.exception(_LE('Error setting %(attr)s'),
@@ -70,19 +86,151 @@ def make_class_properties(cls):
         setattr(cls, name, property(getter, setter))
 
 
+def _field_converter(objclass, name, handler=None):
+    """Return a function converting a raw value for field name.
+
+    Values whose type the field's type function would return unchanged
+    are stored as they are; anything else goes through the type function.
+    """
+    typefn = objclass.fields[name]
+    exact = obj_utils.passthrough_types(typefn)
+
+    def convert(obj, value):
+        if handler is not None:
+            value = handler(obj, value)
+        if type(value) in exact:
+            return value
+        return typefn(value)
+    return convert
+
+
+def _unbound(cls, attr):
+    fn = getattr(cls, attr, None)
+    if fn is None:
+        return None
+    return six.get_unbound_function(fn)
+
+
+def make_class_serializers(cls):
+    """Generate the functions that (de)hydrate and copy cls instances.
+
+    The per-field handler lookups, type functions and slot names are
+    resolved once here, so serializing an object is a loop over a tuple
+    and a few dict operations.
+    """
+    dumpers = []
+    loaders = []
+    copiers = []
+    for name in sorted(cls.fields):
+        attrname = get_attrname(name)
+        dumpers.append((name, attrname,
+                        _unbound(cls, '_attr_%s_to_primitive' % name)))
+        loaders.append((name, attrname, _field_converter(
+            cls, name, _unbound(cls, '_attr_%s_from_primitive' % name))))
+        copiers.append((attrname,
+                        obj_utils.is_immutable(cls.fields[name])))
+    cls._obj_dumpers = dumpers = tuple(dumpers)
+    cls._obj_loaders = loaders = tuple(loaders)
+    copiers = tuple(copiers)
+
+    def dump_fields(obj):
+        data = {}
+        for name, attrname, handler in dumpers:
+            value = getattr(obj, attrname, _UNSET)
+            if value is _UNSET:
+                continue
+            data[name] = value if handler is None else handler(obj)
+        return data
+
+    def load_fields(obj, data):
+        for name, attrname, convert in loaders:
+            if name in data:
+                setattr(obj, attrname, convert(obj, data[name]))
+
+    def copy_fields(obj, nobj, memo):
+        for attrname, immutable in copiers:
+            value = getattr(obj, attrname, _UNSET)
+            if value is _UNSET:
+                continue
+            if not immutable:
+                value = copy.deepcopy(value, memo)
+            setattr(nobj, attrname, value)
+
+    cls._obj_dump_fields = staticmethod(dump_fields)
+    cls._obj_load_fields = staticmethod(load_fields)
+    cls._obj_copy_fields = staticmethod(copy_fields)
+
+
+class _ObjVersion(object):
+    """Class-level VERSION that a single instance may override.
+
+    Objects hydrated from an older peer remember the version they were
+    sent with, without giving every instance a __dict__ to hold it.
+    """
+
+    def __init__(self, version):
+        self.version = version
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self.version
+        try:
+            return obj._obj_version
+        except AttributeError:
+            return self.version
+
+    def __set__(self, obj, value):
+        obj._obj_version = value
+
+
+def _obj_slots(bases, dict_):
+    """Return the __slots__ for a class about to be created.
+
+    Field values are stored in one slot per field instead of an instance
+    __dict__; slots already provided by a base class are not repeated.
+    """
+    slots = dict_.get('__slots__', ())
+    if isinstance(slots, six.string_types):
+        slots = (slots,)
+    inherited = set()
+    fields = set(dict_.get('fields', ()))
+    for base in bases:
+        fields.update(getattr(base, 'fields', ()))
+        for klass in base.__mro__:
+            inherited.update(klass.__dict__.get('__slots__', ()))
+    inherited.update(slots)
+    return tuple(slots) + tuple(get_attrname(name) for name in sorted(fields)
+                                if get_attrname(name) not in inherited)
+
+
 class IoTObjectMetaclass(type):
     """Metaclass that allows tracking of object classes."""
 
     indirection_api = None
 
+    def __new__(mcs, name, bases, dict_):
+        dict_ = dict(dict_)
+        dict_['__slots__'] = _obj_slots(bases, dict_)
+        if isinstance(dict_.get('VERSION'), six.string_types):
+            dict_['VERSION'] = _ObjVersion(dict_['VERSION'])
+        return super(IoTObjectMetaclass, mcs).__new__(mcs, name, bases,
+                                                      dict_)
+
     def __init__(cls, names, bases, dict_):
         if not hasattr(cls, '_obj_classes'):
             # This will be set in the 'IoTObject' class.
             cls._obj_classes = collections.defaultdict(list)
+            # objname -> [((major, minor), objclass)] in registration order
+            cls._obj_class_versions = collections.defaultdict(list)
+            # (objname, objver) -> objclass, see obj_class_from_name()
+            cls._obj_class_index = {}
+            make_class_properties(cls)
+            make_class_serializers(cls)
         else:
             # Add the subclass to IoTObject._obj_classes
             make_class_properties(cls)
-            cls._obj_classes[cls.obj_name()].append(cls)
+            make_class_serializers(cls)
+            cls._obj_register()
 
 
 # These are decorators that mark an object's method as remotable.
@@ -94,6 +242,9 @@ class IoTObjectMetaclass(type):
 def remotable_classmethod(fn):
     """Decorator for remotable classmethods."""
     def wrapper(cls, context, *args, **kwargs):
+        batch = ObjectBatch.current()
+        if batch is not None:
+            return batch.queue_class_action(context, cls, fn, args, kwargs)
         if IoTObject.indirection_api:
             result = IoTObject.indirection_api.object_class_action(
                 context, cls.obj_name(), fn.__name__, cls.VERSION,
@@ -124,34 +275,236 @@ def remotable(fn):
         if ctxt is None:
             raise exception.OrphanedObjectError(method=fn.__name__,
                                                 objtype=self.obj_name())
+        batch = ObjectBatch.current()
+        if batch is not None:
+            return batch.queue_action(ctxt, self, fn, args, kwargs)
         if IoTObject.indirection_api:
             updates, result = IoTObject.indirection_api.object_action(
                 ctxt, self, fn.__name__, args, kwargs)
-            for key, value in updates.iteritems():
-                if key in self.fields:
-                    self[key] = self._attr_from_primitive(key, value)
-            self._changed_fields = set(updates.get('obj_what_changed', []))
+            self._obj_apply_updates(updates)
             return result
         else:
             return fn(self, ctxt, *args, **kwargs)
     return wrapper
 
 
+class BatchCall(object):
+    """The outcome of a remotable call queued in an ObjectBatch."""
+
+    def __init__(self, method, objinst=None):
+        self.method = method
+        self.objinst = objinst
+        self.done = False
+        self.error = None
+        self._result = None
+
+    def set_result(self, result):
+        self._result = result
+        self.done = True
+
+    def set_error(self, error):
+        self.error = error
+        self.done = True
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def result(self):
+        """Return the result of the call, or raise the error it failed with.
+
+        :raises: ObjectActionError if the batch has not been sent yet.
+        """
+        if not self.done:
+            raise exception.ObjectActionError(
+                action=self.method, reason=_('the batch was not sent'))
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+
+def _batch_error(call, reply):
+    """Rebuild the exception a batched call raised on the conductor.
+
+    Like for a plain RPC call, exceptions from the modules in
+    rpc.get_allowed_exmods() and builtin ones keep their class. Others
+    become ObjectActionError.
+    """
+    name, message = reply[1], reply[2]
+    module = reply[3] if len(reply) > 3 else None
+    if module in rpc.get_allowed_exmods() + [six.moves.builtins.__name__]:
+        try:
+            cls = importutils.import_class('%s.%s' % (module, name))
+            if issubclass(cls, Exception):
+                return cls(message)
+        except Exception:
+            pass
+    return exception.ObjectActionError(action=call.method,
+                                       reason='%s: %s' % (name, message))
+
+
+class ObjectBatch(object):
+    """Send the remotable calls made inside a with block in one RPC.
+
+    While a batch is active in the current thread, remotable methods and
+    classmethods do not call the indirection API. They queue the call and
+    return a :class:`BatchCall` instead. The queue is sent as a single
+    object_batch_action message when the block exits, or whenever
+    ``max_size`` calls are queued; results and updates to the objects are
+    then applied in the order the calls were made. A failed call does not
+    affect the others: its error is kept on its BatchCall and raised by
+    ``BatchCall.result()``.
+
+    Example::
+
+        with objects_base.ObjectBatch() as batch:
+            for device in devices:
+                device.save()
+        failed = [call for call in batch.calls if call.failed]
+
+    Without an indirection API the calls run immediately, there being no
+    round trips to save, but still return BatchCall objects.
+
+    :param max_size: send the queue once it holds this many calls.
+                     None means only send it when the block exits.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.calls = []
+        self._queue = []
+
+    @classmethod
+    def current(cls):
+        """Return the innermost active batch of this thread, or None."""
+        stack = getattr(cls._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def __enter__(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        self._local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._local.stack.pop()
+        if exc_type is None:
+            self.flush()
+            return
+        # Do not run queued calls past an error in the block.
+        for _ctxt, call, _action in self._queue:
+            call.set_error(exception.ObjectActionError(
+                action=call.method, reason=_('the batch was aborted')))
+        self._queue = []
+
+    def _run_now(self, call, fn, *args, **kwargs):
+        try:
+            call.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            call.set_error(e)
+        return call
+
+    def _queue_call(self, ctxt, call, action):
+        self.calls.append(call)
+        self._queue.append((ctxt, call, action))
+        if self.max_size and len(self._queue) >= self.max_size:
+            self.flush()
+        return call
+
+    def queue_action(self, ctxt, objinst, fn, args, kwargs):
+        call = BatchCall(fn.__name__, objinst)
+        if not IoTObject.indirection_api:
+            self.calls.append(call)
+            return self._run_now(call, fn, objinst, ctxt, *args, **kwargs)
+        return self._queue_call(ctxt, call, ['object', objinst, fn.__name__,
+                                             list(args), kwargs])
+
+    def queue_class_action(self, ctxt, objclass, fn, args, kwargs):
+        call = BatchCall(fn.__name__)
+        if not IoTObject.indirection_api:
+            self.calls.append(call)
+            self._run_now(call, fn, objclass, ctxt, *args, **kwargs)
+            if isinstance(call._result, IoTObject):
+                call._result._context = ctxt
+            return call
+        return self._queue_call(ctxt, call,
+                                ['class', objclass.obj_name(), fn.__name__,
+                                 objclass.VERSION, list(args), kwargs])
+
+    def flush(self):
+        """Send the queued calls and apply their outcome, in order.
+
+        Consecutive calls made with the same context share one message.
+        """
+        queue, self._queue = self._queue, []
+        start = 0
+        while start < len(queue):
+            ctxt = queue[start][0]
+            end = start + 1
+            while end < len(queue) and queue[end][0] is ctxt:
+                end += 1
+            self._send(ctxt, queue[start:end])
+            start = end
+
+    def _send(self, ctxt, queued):
+        actions = [action for _ctxt, _call, action in queued]
+        try:
+            replies = IoTObject.indirection_api.object_batch_action(ctxt,
+                                                                    actions)
+        except Exception as e:
+            for _ctxt, call, _action in queued:
+                call.set_error(e)
+            return
+        for (_ctxt, call, _action), reply in zip(queued, replies):
+            if not reply[0]:
+                call.set_error(_batch_error(call, reply))
+                continue
+            updates, result = reply[1], reply[2]
+            if call.objinst is not None:
+                call.objinst._obj_apply_updates(updates)
+            call.set_result(result)
+        for _ctxt, call, _action in queued[len(replies):]:
+            call.set_error(exception.ObjectActionError(
+                action=call.method, reason=_('no reply was received')))
+
+
 # Object versioning rules
 #
 # Each service has its set of objects, each with a version attached. When
 # a client attempts to call an object method, the server checks to see if
 # the version of that object matches (in a compatible way) its object
 # implementation. If so, cool, and if not, fail.
-def check_object_version(server, client):
+# Parsed form of every valid version string seen so far
+_PARSED_VERSIONS = {}
+_PARSED_VERSIONS_MAX = 1024
+
+
+def parse_version(version):
+    """Return an object version string as a (major, minor) tuple of ints.
+
+    :raises: IncompatibleObjectVersion if the version is malformed.
+    """
     try:
-        client_major, _client_minor = client.split('.')
-        server_major, _server_minor = server.split('.')
-        client_minor = int(_client_minor)
-        server_minor = int(_server_minor)
-    except ValueError:
+        return _PARSED_VERSIONS[version]
+    except (KeyError, TypeError):
+        pass
+    try:
+        major, minor = version.split('.')
+        parsed = (int(major), int(minor))
+    except (AttributeError, ValueError):
         raise exception.IncompatibleObjectVersion(
             _('Invalid version string'))
+    if len(_PARSED_VERSIONS) >= _PARSED_VERSIONS_MAX:
+        _PARSED_VERSIONS.clear()
+    _PARSED_VERSIONS[version] = parsed
+    return parsed
+
+
+def check_object_version(server, client):
+    client_major, client_minor = parse_version(client)
+    server_major, server_minor = parse_version(server)
 
     if client_major != server_major:
         raise exception.IncompatibleObjectVersion(
@@ -172,6 +525,12 @@ class IoTObject(object):
     as appropriate.
     """
 
+    # Instances keep their state in slots: one per field (created by the
+    # metaclass), plus the context, the changed-fields bitmask and the
+    # version the object was received with. Both of the latter are only
+    # allocated when first set.
+    __slots__ = ('_context', '_obj_changed', '_obj_version')
+
     # Version of this object (see rules above check_object_version())
     VERSION = '1.0'
 
@@ -194,10 +553,35 @@ class IoTObject(object):
     _attr_updated_at_to_primitive = obj_utils.dt_serializer('updated_at')
 
     def __init__(self, context, **kwargs):
-        self._changed_fields = set()
         self._context = context
         self.update(kwargs)
 
+    @property
+    def _changed_fields(self):
+        try:
+            mask = self._obj_changed
+        except AttributeError:
+            return set()
+        if not mask:
+            return set()
+        return set(name for name, bit in self._obj_field_bits.items()
+                   if mask & bit)
+
+    @_changed_fields.setter
+    def _changed_fields(self, names):
+        bits = self._obj_field_bits
+        mask = 0
+        for name in names:
+            mask |= bits.get(name, 0)
+        self._obj_changed = mask
+
+    def _obj_apply_updates(self, updates):
+        """Apply the field updates returned by a remote object action."""
+        for key, value in updates.iteritems():
+            if key in self.fields:
+                self[key] = self._attr_from_primitive(key, value)
+        self._changed_fields = set(updates.get('obj_what_changed', []))
+
     @classmethod
     def obj_name(cls):
         """Get canonical object name.
@@ -206,27 +590,48 @@ class IoTObject(object):
         """
         return cls.__name__
 
+    @classmethod
+    def _obj_register(cls):
+        """Add this class to the registry of remotable objects."""
+        objname = cls.obj_name()
+        cls._obj_classes[objname].append(cls)
+        cls._obj_class_versions[objname].append((parse_version(cls.VERSION),
+                                                 cls))
+        # The new class may be a better match for versions already looked
+        # up under this name.
+        for key in list(cls._obj_class_index):
+            if key[0] == objname:
+                del cls._obj_class_index[key]
+
     @classmethod
     def obj_class_from_name(cls, objname, objver):
         """Returns a class from the registry based on a name and version."""
+        try:
+            return cls._obj_class_index[(objname, objver)]
+        except KeyError:
+            pass
+        objclass = cls._obj_find_class(objname, objver)
+        cls._obj_class_index[(objname, objver)] = objclass
+        return objclass
+
+    @classmethod
+    def _obj_find_class(cls, objname, objver):
         if objname not in cls._obj_classes:
             LOG.error(_LE('Unable to instantiate unregistered object type '
                           '%(objtype)s'), dict(objtype=objname))
             raise exception.UnsupportedObjectError(objtype=objname)
 
+        requested = parse_version(objver)
         latest = None
         compatible_match = None
-        for objclass in cls._obj_classes[objname]:
-            if objclass.VERSION == objver:
+        for version, objclass in cls._obj_class_versions[objname]:
+            if version == requested:
                 return objclass
 
-            version_bits = tuple([int(x) for x in objclass.VERSION.split(".")])
-            if latest is None:
-                latest = version_bits
-            elif latest < version_bits:
-                latest = version_bits
+            if latest is None or latest < version:
+                latest = version
 
-            if versionutils.is_compatible(objver, objclass.VERSION):
+            if version[0] == requested[0] and version >= requested:
                 compatible_match = objclass
 
         if compatible_match:
@@ -251,15 +656,14 @@ class IoTObject(object):
 
     @classmethod
     def _obj_from_primitive(cls, context, objver, primitive):
-        self = cls(context)
-        self.VERSION = objver
-        objdata = primitive['iot_object.data']
-        changes = primitive.get('iot_object.changes', [])
-        for name in self.fields:
-            if name in objdata:
-                setattr(self, name,
-                        self._attr_from_primitive(name, objdata[name]))
-        self._changed_fields = set([x for x in changes if x in self.fields])
+        self = cls.__new__(cls)
+        self._context = context
+        if objver != cls.VERSION:
+            self.VERSION = objver
+        cls._obj_load_fields(self, primitive['iot_object.data'])
+        changes = primitive.get('iot_object.changes')
+        if changes:
+            self._changed_fields = changes
         return self
 
     @classmethod
@@ -280,17 +684,20 @@ class IoTObject(object):
     def __deepcopy__(self, memo):
         """Efficiently make a deep copy of this object."""
 
-        nobj = self.__class__(self._context)
-        for name in self.fields:
-            if self.obj_attr_is_set(name):
-                nval = copy.deepcopy(getattr(self, name), memo)
-                setattr(nobj, name, nval)
-        nobj._changed_fields = set(self._changed_fields)
+        cls = self.__class__
+        nobj = cls.__new__(cls)
+        nobj._context = self._context
+        cls._obj_copy_fields(self, nobj, memo)
+        for attrname in ('_obj_changed', '_obj_version'):
+            try:
+                setattr(nobj, attrname, getattr(self, attrname))
+            except AttributeError:
+                pass
         return nobj
 
     def obj_clone(self):
         """Create a copy."""
-        return copy.deepcopy(self)
+        return self.__deepcopy__({})
 
     def _attr_to_primitive(self, attribute):
         """Attribute serialization dispatcher.
@@ -310,16 +717,13 @@ class IoTObject(object):
 
         This calls self._attr_to_primitive() for each item in fields.
         """
-        primitive = dict()
-        for name in self.fields:
-            if hasattr(self, get_attrname(name)):
-                primitive[name] = self._attr_to_primitive(name)
         obj = {'iot_object.name': self.obj_name(),
                'iot_object.namespace': 'iot',
                'iot_object.version': self.VERSION,
-               'iot_object.data': primitive}
-        if self.obj_what_changed():
-            obj['iot_object.changes'] = list(self.obj_what_changed())
+               'iot_object.data': self._obj_dump_fields(self)}
+        changes = self.obj_what_changed()
+        if changes:
+            obj['iot_object.changes'] = list(changes)
         return obj
 
     def obj_load_attr(self, attrname):
@@ -357,9 +761,13 @@ class IoTObject(object):
         Note that this is NOT "revert to previous values"
         """
         if fields:
-            self._changed_fields -= set(fields)
+            bits = self._obj_field_bits
+            mask = 0
+            for name in fields:
+                mask |= bits.get(name, 0)
+            self._obj_changed = getattr(self, '_obj_changed', 0) & ~mask
         else:
-            self._changed_fields.clear()
+            self._obj_changed = 0
 
     def obj_attr_is_set(self, attrname):
         """Test object to see if attrname is present.
@@ -439,6 +847,115 @@ class IoTObject(object):
                 if hasattr(self, k))
 
 
+def _new_objects(objclass, context, count, version=None):
+    new = objclass.__new__
+    objects = [new(objclass) for _i in range(count)]
+    for obj in objects:
+        obj._context = context
+        if version is not None and version != objclass.VERSION:
+            obj.VERSION = version
+    return objects
+
+
+def objects_from_rows(objclass, context, columns, rows):
+    """Build objects from database rows in bulk.
+
+    This is the vectorized counterpart of setting every field of a new
+    object one at a time: values are written straight to the field slots,
+    type coercion is skipped when the database already returned the right
+    type, and the objects start out with no changed fields.
+
+    :param objclass: the IoTObject subclass to instantiate.
+    :param context: Security context for the new objects.
+    :param columns: field names, in the order of the values in each row.
+    :param rows: an iterable of row tuples.
+    :returns: a list of objclass objects.
+    """
+    rows = list(rows)
+    objects = _new_objects(objclass, context, len(rows))
+    loaders = [(get_attrname(name), _field_converter(objclass, name))
+               for name in columns]
+    for obj, row in zip(objects, rows):
+        for (attrname, convert), value in zip(loaders, row):
+            setattr(obj, attrname, convert(obj, value))
+    return objects
+
+
+def _objects_to_columns(objects):
+    """Serialize objects of a single class as one column-oriented payload.
+
+    Returns None if the objects do not all share the same class and
+    version, in which case they have to be sent one by one.
+    """
+    objclass = type(objects[0])
+    version = objects[0].VERSION
+    for obj in objects:
+        if type(obj) is not objclass or obj.VERSION != version:
+            return None
+    names = []
+    columns = []
+    missing = {}
+    for name, attrname, handler in objclass._obj_dumpers:
+        column = []
+        unset = []
+        for index, obj in enumerate(objects):
+            if not hasattr(obj, attrname):
+                unset.append(index)
+                column.append(None)
+            elif handler is not None:
+                column.append(handler(obj))
+            else:
+                column.append(getattr(obj, attrname))
+        if len(unset) == len(objects):
+            continue
+        if unset:
+            missing[name] = unset
+        names.append(name)
+        columns.append(column)
+    payload = {'iot_object.name': objclass.obj_name(),
+               'iot_object.namespace': 'iot',
+               'iot_object.version': version,
+               'iot_object.fields': names,
+               'iot_object.columns': columns,
+               'iot_object.count': len(objects)}
+    if missing:
+        payload['iot_object.missing'] = missing
+    changes = [[index, list(obj.obj_what_changed())]
+               for index, obj in enumerate(objects)
+               if getattr(obj, '_obj_changed', 0)]
+    if changes:
+        payload['iot_object.changes'] = changes
+    return payload
+
+
+def _objects_from_columns(payload, context):
+    """Inverse of _objects_to_columns()."""
+    if payload['iot_object.namespace'] != 'iot':
+        raise exception.UnsupportedObjectError(
+            objtype='%s.%s' % (payload['iot_object.namespace'],
+                               payload['iot_object.name']))
+    objver = payload['iot_object.version']
+    objclass = IoTObject.obj_class_from_name(payload['iot_object.name'],
+                                             objver)
+    objects = _new_objects(objclass, context, payload['iot_object.count'],
+                           objver)
+    missing = payload.get('iot_object.missing', {})
+    loaders = dict((name, (attrname, convert))
+                   for name, attrname, convert in objclass._obj_loaders)
+    for name, column in zip(payload['iot_object.fields'],
+                            payload['iot_object.columns']):
+        if name not in loaders:
+            continue
+        attrname, convert = loaders[name]
+        unset = set(missing.get(name, ()))
+        for index, (obj, value) in enumerate(zip(objects, column)):
+            if index not in unset:
+                setattr(obj, attrname, convert(obj, value))
+    for index, changes in payload.get('iot_object.changes', ()):
+        objects[index]._changed_fields = changes
+    return objects
+
+
 class ObjectListBase(object):
     """Mixin class for lists of objects.
 
@@ -447,6 +964,9 @@ class ObjectListBase(object):
     which is the list store, and behaves like a list itself. It supports
     serialization of the list of objects automatically.
     """
+    # Keep subclasses that also derive from IoTObject free of a __dict__.
+    __slots__ = ()
+
     fields = {
         'objects': list,
         }
@@ -456,6 +976,12 @@ class ObjectListBase(object):
     # requested of the list object.
     child_versions = {}
 
+    # Set to True to send the contents over RPC as a single column-oriented
+    # payload, rather than as a list of per-object primitives, whenever all
+    # of them share the same class and version. Both forms are accepted
+    # when deserializing.
+    obj_columnar = False
+
     def __iter__(self):
         """List iterator interface."""
         return iter(self.objects)
@@ -487,10 +1013,16 @@ class ObjectListBase(object):
 
     def _attr_objects_to_primitive(self):
         """Serialization of object list."""
+        if self.obj_columnar and self.objects:
+            payload = _objects_to_columns(self.objects)
+            if payload is not None:
+                return payload
         return [x.obj_to_primitive() for x in self.objects]
 
     def _attr_objects_from_primitive(self, value):
         """Deserialization of object list."""
+        if isinstance(value, dict):
+            return _objects_from_columns(value, self._context)
         objects = []
         for entity in value:
             obj = IoTObject.obj_from_primitive(entity,
@@ -501,12 +1033,45 @@ class ObjectListBase(object):
     def obj_make_compatible(self, primitive, target_version):
         primitives = primitive['objects']
         child_target_version = self.child_versions.get(target_version, '1.0')
+        if isinstance(primitives, dict):
+            primitive['objects'] = self._make_columns_compatible(
+                primitives, child_target_version)
+            return
         for index, item in enumerate(self.objects):
             self.objects[index].obj_make_compatible(
                 primitives[index]['iot_object.data'],
                 child_target_version)
             primitives[index]['iot_object.version'] = child_target_version
 
+    def _make_columns_compatible(self, payload, child_target_version):
+        names = payload['iot_object.fields']
+        missing = payload.get('iot_object.missing', {})
+        rows = []
+        for index, item in enumerate(self.objects):
+            data = dict((name, column[index])
+                        for name, column in zip(names,
+                                                payload['iot_object.columns'])
+                        if index not in missing.get(name, ()))
+            item.obj_make_compatible(data, child_target_version)
+            rows.append(data)
+        names = sorted(set().union(*rows))
+        missing = {}
+        for name in names:
+            unset = [index for index, data in enumerate(rows)
+                     if name not in data]
+            if unset:
+                missing[name] = unset
+        payload = dict(payload)
+        payload['iot_object.version'] = child_target_version
+        payload['iot_object.fields'] = names
+        payload['iot_object.columns'] = [[data.get(name) for data in rows]
+                                         for name in names]
+        if missing:
+            payload['iot_object.missing'] = missing
+        else:
+            payload.pop('iot_object.missing', None)
+        return payload
+
     def obj_what_changed(self):
         changes = set(self._changed_fields)
         for child in self.objects:
@@ -515,6 +1080,133 @@ class ObjectListBase(object):
         return changes
 
 
+# msgpack extension type code of a packed IoTObject
+_EXT_OBJECT = 1
+
+# Key of the single-item dict that carries a packed entity over RPC
+PACKED_KEY = 'iot_object.packed'
+
+# Peers, e.g. RPC topics, known to understand the packed format because
+# they have replied in it.
+_packing_peers = set()
+
+
+def _contains_objects(entity):
+    if isinstance(entity, IoTObject):
+        return True
+    if isinstance(entity, (tuple, list, set)):
+        return any(_contains_objects(value) for value in entity)
+    if isinstance(entity, dict):
+        return any(_contains_objects(value)
+                   for value in six.itervalues(entity))
+    return False
+
+
+def _is_objects(value):
+    """Whether value is an object or a non-empty list of objects."""
+    if isinstance(value, IoTObject):
+        return True
+    return (isinstance(value, list) and bool(value) and
+            all(isinstance(item, IoTObject) for item in value))
+
+
+def pack_entity(entity):
+    """Encode an entity containing IoTObjects in the compact format.
+
+    The result is a msgpack document of two items: a class table with one
+    [name, version, field names] entry per distinct object class, and the
+    entity itself in which every object is an extension record holding
+    its class index, a bitmask of the fields that are set, their values in
+    class table order and a bitmask of the changed fields. Fields holding
+    objects, such as the contents of an ObjectList, hold their records.
+
+    :returns: a dict with the base64-encoded document under PACKED_KEY.
+    """
+    class_ids = {}
+    classes = []
+
+    def encode(obj):
+        if isinstance(obj, set):
+            return list(obj)
+        if not isinstance(obj, IoTObject):
+            raise TypeError('%r cannot be packed' % obj)
+        cls = obj.__class__
+        key = (cls, obj.VERSION)
+        class_id = class_ids.get(key)
+        if class_id is None:
+            class_id = class_ids[key] = len(classes)
+            classes.append([cls.obj_name(), obj.VERSION,
+                            [name for name, _a, _h in cls._obj_dumpers]])
+        setmask = 0
+        values = []
+        for bit, (_name, attrname, handler) in enumerate(cls._obj_dumpers):
+            value = getattr(obj, attrname, _UNSET)
+            if value is _UNSET:
+                continue
+            setmask |= 1 << bit
+            if handler is None or _is_objects(value):
+                values.append(value)
+            else:
+                values.append(handler(obj))
+        changed = 0
+        changes = obj.obj_what_changed()
+        if changes:
+            for bit, (name, _a, _h) in enumerate(cls._obj_dumpers):
+                if name in changes:
+                    changed |= 1 << bit
+        record = msgpack.packb([class_id, setmask, values, changed],
+                               default=encode, use_bin_type=True)
+        return msgpack.ExtType(_EXT_OBJECT, record)
+
+    body = msgpack.packb(entity, default=encode, use_bin_type=True)
+    packed = msgpack.packb([classes, body], use_bin_type=True)
+    return {PACKED_KEY: base64.b64encode(packed).decode('ascii')}
+
+
+def unpack_entity(primitive, context=None):
+    """Decode an entity produced by pack_entity()."""
+    classes, body = msgpack.unpackb(base64.b64decode(primitive[PACKED_KEY]),
+                                    raw=False)
+    resolved = []
+    for objname, objver, names in classes:
+        objclass = IoTObject.obj_class_from_name(objname, objver)
+        loaders = dict((name, (attrname, convert))
+                       for name, attrname, convert in objclass._obj_loaders)
+        resolved.append((objclass, objver,
+                         [(name,) + loaders[name] if name in loaders
+                          else None for name in names]))
+
+    def decode(code, data):
+        if code != _EXT_OBJECT:
+            return msgpack.ExtType(code, data)
+        class_id, setmask, values, changed = msgpack.unpackb(
+            data, ext_hook=decode, raw=False)
+        objclass, objver, fields = resolved[class_id]
+        obj = objclass.__new__(objclass)
+        obj._context = context
+        if objver != objclass.VERSION:
+            obj.VERSION = objver
+        values = iter(values)
+        changes = []
+        for bit, field in enumerate(fields):
+            if not setmask & (1 << bit):
+                continue
+            value = next(values)
+            if field is None:
+                continue
+            name, attrname, convert = field
+            if not _is_objects(value):
+                value = convert(obj, value)
+            setattr(obj, attrname, value)
+            if changed & (1 << bit):
+                changes.append(name)
+        if changes:
+            obj._changed_fields = changes
+        return obj
+
+    return msgpack.unpackb(body, ext_hook=decode, raw=False)
+
+
 class IoTObjectSerializer(messaging.NoOpSerializer):
     """A IoTObject-aware Serializer.
 
@@ -522,8 +1214,36 @@ class IoTObjectSerializer(messaging.NoOpSerializer):
     ability to serialize and deserialize IoTObject entities. Any service
     that needs to accept or return IoTObjects as arguments or result values
     should pass this to its RpcProxy and RpcDispatcher objects.
+
+    Entities containing objects are sent in the compact format of
+    pack_entity() when the peer understands it (see accepts_packed()),
+    and in the dict format otherwise. Both formats are always accepted
+    when deserializing.
+
+    :param packed: whether this service may send the compact format.
+    :param peer: what requests are sent to, e.g. the RPC topic. Requests
+                 to it are only packed once it has replied in the compact
+                 format, so a peer that has not been upgraded is never
+                 sent something it cannot read.
     """
 
+    def __init__(self, packed=False, peer=None):
+        self.packed = packed
+        self.peer = peer
+
+    def accepts_packed(self, context):
+        """Whether to pack an entity sent with context.
+
+        Replies are packed when the request said the caller accepts the
+        compact format. Requests are packed when the peer has shown it
+        understands it.
+        """
+        accepts = getattr(context, 'accepts_packed_objects', None)
+        if accepts is not None:
+            return accepts
+        return self.packed and (self.peer is None or
+                                self.peer in _packing_peers)
+
     def _process_iterable(self, context, action_fn, values):
         """Process an iterable, taking an action on each value.
 
@@ -539,6 +1259,13 @@ class IoTObjectSerializer(messaging.NoOpSerializer):
         return iterable([action_fn(context, value) for value in values])
 
     def serialize_entity(self, context, entity):
+        if self.accepts_packed(context) and _contains_objects(entity):
+            try:
+                return pack_entity(entity)
+            except TypeError:
+                # Something in there has no compact form, send it the
+                # old way.
+                pass
         if isinstance(entity, (tuple, list, set)):
             entity = self._process_iterable(context, self.serialize_entity,
                                             entity)
@@ -550,6 +1277,10 @@ class IoTObjectSerializer(messaging.NoOpSerializer):
     def deserialize_entity(self, context, entity):
         if isinstance(entity, dict) and 'iot_object.name' in entity:
             entity = IoTObject.obj_from_primitive(entity, context=context)
+        elif isinstance(entity, dict) and PACKED_KEY in entity:
+            if self.peer is not None:
+                _packing_peers.add(self.peer)
+            entity = unpack_entity(entity, context=context)
         elif isinstance(entity, (tuple, list, set)):
             entity = self._process_iterable(context, self.deserialize_entity,
                                             entity)
@@ -28,10 +28,15 @@ class Device(base.IoTObject):
         'image_id': obj_utils.str_or_none,
     }
 
+    # Fields backed by a column of the device table, loaded in bulk by
+    # DeviceList. image_id is not stored in the database.
+    db_columns = ('id', 'uuid', 'name', 'project_id', 'user_id',
+                  'created_at', 'updated_at')
+
     @staticmethod
     def _from_db_object(device, db_device):
         """Converts a database entity to a formal object."""
-        for field in device.fields:
+        for field in Device.db_columns:
             device[field] = db_device[field]
 
         device.obj_reset_changes()
@@ -90,14 +95,11 @@ class Device(base.IoTObject):
         :param marker: pagination marker for large data sets.
         :param sort_key: column to sort results by.
         :param sort_dir: direction to sort. "asc" or "desc".
-        :returns: a list of :class:`Device` object.
+        :returns: a :class:`DeviceList` of :class:`Device` objects.
 
         """
-        db_devices = cls.dbapi.get_device_list(limit=limit,
-                                         marker=marker,
-                                         sort_key=sort_key,
-                                         sort_dir=sort_dir)
-        return Device._from_db_object_list(db_devices, cls, context)
+        return DeviceList.get_all(context, limit=limit, marker=marker,
+                                  sort_key=sort_key, sort_dir=sort_dir)
 
     @base.remotable
     def create(self, context=None):
@@ -168,3 +170,51 @@ class Device(base.IoTObject):
             if (hasattr(self, base.get_attrname(field)) and
                     self[field] != current[field]):
                 self[field] = current[field]
+
+
+class DeviceList(base.ObjectListBase, base.IoTObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    dbapi = dbapi.get_instance()
+
+    fields = {
+        'objects': list,
+    }
+
+    child_versions = {
+        '1.0': '1.0',
+    }
+
+    obj_columnar = True
+
+    @classmethod
+    def _from_db_rows(cls, context, columns, rows):
+        """Converts rows of column values to a list of Device objects."""
+        device_list = cls(context)
+        device_list.objects = base.objects_from_rows(Device, context,
+                                                     columns, rows)
+        device_list.obj_reset_changes()
+        return device_list
+
+    @base.remotable_classmethod
+    def get_all(cls, context, limit=None, marker=None,
+                sort_key=None, sort_dir=None):
+        """Return a list of all devices.
+
+        The rows are fetched as plain column tuples and converted in bulk.
+
+        :param context: Security context.
+        :param limit: maximum number of resources to return in a single result.
+        :param marker: pagination marker for large data sets.
+        :param sort_key: column to sort results by.
+        :param sort_dir: direction to sort. "asc" or "desc".
+        :returns: a :class:`DeviceList` object.
+        """
+        columns = Device.db_columns
+        rows = cls.dbapi.get_deviceinfo_list(columns=columns,
+                                             limit=limit,
+                                             marker=marker,
+                                             sort_key=sort_key,
+                                             sort_dir=sort_dir)
+        return cls._from_db_rows(context, columns, rows)
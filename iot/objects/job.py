@@ -0,0 +1,106 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from iot.db import api as dbapi
+from iot.objects import base
+from iot.objects import utils as obj_utils
+
+
+class Job(base.IoTObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    # Job status values
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+
+    dbapi = dbapi.get_instance()
+
+    fields = {
+        'id': int,
+        'uuid': obj_utils.str_or_none,
+        'project_id': obj_utils.str_or_none,
+        'user_id': obj_utils.str_or_none,
+        'action': obj_utils.str_or_none,
+        'resource_uuid': obj_utils.str_or_none,
+        'status': obj_utils.str_or_none,
+        'status_reason': obj_utils.str_or_none,
+    }
+
+    @staticmethod
+    def _from_db_object(job, db_job):
+        """Converts a database entity to a formal object."""
+        for field in job.fields:
+            job[field] = db_job[field]
+
+        job.obj_reset_changes()
+        return job
+
+    @base.remotable_classmethod
+    def get_by_uuid(cls, context, uuid):
+        """Find a job based on uuid and return a :class:`Job` object.
+
+        :param uuid: the uuid of a job.
+        :param context: Security context
+        :returns: a :class:`Job` object.
+        """
+        db_job = cls.dbapi.get_job_by_uuid(uuid)
+        job = Job._from_db_object(cls(context), db_job)
+        return job
+
+    @base.remotable_classmethod
+    def update_statuses(cls, context, updates):
+        """Record the status of several jobs at once.
+
+        :param context: Security context.
+        :param updates: a dict mapping job uuids to a dict with the new
+                        'status' and, optionally, 'status_reason'.
+        """
+        cls.dbapi.update_jobs(updates)
+
+    @base.remotable
+    def create(self, context=None):
+        """Create a Job record in the DB.
+
+        :param context: Security context. NOTE: This should only
+                        be used internally by the indirection_api.
+                        Unfortunately, RPC requires context as the first
+                        argument, even though we don't use it.
+                        A context should be set when instantiating the
+                        object, e.g.: Job(context)
+
+        """
+        values = self.obj_get_changes()
+        db_job = self.dbapi.create_job(values)
+        self._from_db_object(self, db_job)
+
+    @base.remotable
+    def save(self, context=None):
+        """Save updates to this Job.
+
+        :param context: Security context. NOTE: This should only
+                        be used internally by the indirection_api.
+                        Unfortunately, RPC requires context as the first
+                        argument, even though we don't use it.
+                        A context should be set when instantiating the
+                        object, e.g.: Job(context)
+        """
+        updates = self.obj_get_changes()
+        self.dbapi.update_jobs({self.uuid: updates})
+
+        self.obj_reset_changes()
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
@@ -88,6 +88,34 @@ def list_or_none(val):
             return []
 
 
+_PASSTHROUGH_TYPES = {
+    int: frozenset([int]),
+    int_or_none: frozenset([int, type(None)]),
+    str_or_none: frozenset([six.text_type, type(None)]),
+}
+
+
+def passthrough_types(typefn):
+    """Return the set of value types that typefn would return unchanged.
+
+    Values of these exact types can be stored without calling typefn,
+    e.g. when hydrating objects from database rows in bulk.
+    """
+    return _PASSTHROUGH_TYPES.get(typefn, frozenset())
+
+
+_IMMUTABLE_TYPEFNS = frozenset([int, int_or_none, str_or_none,
+                                datetime_or_none, datetime_or_str_or_none])
+
+
+def is_immutable(typefn):
+    """Whether every value produced by typefn is immutable.
+
+    Such values can be shared between an object and its copies.
+    """
+    return typefn in _IMMUTABLE_TYPEFNS
+
+
 def ip_or_none(version):
     """Return a version-specific IP address validator."""
     def validator(val, version=version):
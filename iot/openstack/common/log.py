@@ -27,6 +27,7 @@ It also allows setting of formatting information through conf.
 
 """
 
+import atexit
 import copy
 import inspect
 import itertools
@@ -36,7 +37,9 @@ import logging.handlers
 import os
 import socket
 import sys
+import time
 import traceback
+import weakref
 
 from oslo.config import cfg
 from oslo_serialization import jsonutils
@@ -49,6 +52,16 @@ _PY26 = sys.version_info[0:2] == (2, 6)
 from magnum.openstack.common._i18n import _
 from magnum.openstack.common import local
 
+# The writer thread of AsyncHandler must be a native thread even when
+# eventlet has monkey patched the process: writing a log file blocks,
+# and would block every green thread of the process with it.
+_patcher = importutils.try_import('eventlet.patcher')
+if _patcher is not None:
+    _threading = _patcher.original('threading')
+    _queue = _patcher.original(moves.queue.__name__)
+else:
+    import threading as _threading
+    _queue = moves.queue
 
 _DEFAULT_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
@@ -118,7 +131,24 @@ logging_cli_opts = [
 generic_log_opts = [
     cfg.BoolOpt('use_stderr',
                 default=True,
-                help='Log output to standard error.')
+                help='Log output to standard error.'),
+    cfg.BoolOpt('log_async',
+                default=False,
+                help='Hand log records to a background thread that formats '
+                     'and writes them, so logging never blocks the caller.'),
+    cfg.IntOpt('log_async_queue_size',
+               default=10000,
+               help='Maximum number of log records waiting to be written '
+                    'when log_async is enabled.'),
+    cfg.IntOpt('log_async_batch_size',
+               default=100,
+               help='Maximum number of log records written in one batch '
+                    'when log_async is enabled.'),
+    cfg.StrOpt('log_async_drop_policy',
+               default='drop_new',
+               choices=('drop_new', 'drop_oldest'),
+               help='What to do with a log record when the queue is full: '
+                    'drop it or drop the oldest queued record.'),
 ]
 
 DEFAULT_LOG_LEVELS = ['amqp=WARN', 'amqplib=WARN', 'boto=WARN',
@@ -167,6 +197,17 @@ log_opts = [
                default='[instance: %(uuid)s] ',
                help='The format for an instance UUID that is passed with the '
                     'log message.'),
+    cfg.BoolOpt('log_json',
+                default=False,
+                help='Write log records as JSON documents, with the request '
+                     'context and the structured fields of the record as '
+                     'keys.'),
+    cfg.ListOpt('log_sample_rates',
+                default=[],
+                help='List of logger=N pairs. Below WARNING level, records '
+                     'of each message logged directly through the logger '
+                     'are limited to N per second; the number left out is '
+                     'reported with the next record let through.'),
 ]
 
 CONF = cfg.CONF
@@ -209,11 +250,48 @@ except AttributeError:  # NOTE(jkoelker) NullHandler added in Python 2.7
 def _dictify_context(context):
     if context is None:
         return None
-    if not isinstance(context, dict) and getattr(context, 'to_dict', None):
-        context = context.to_dict()
+    if not isinstance(context, dict):
+        # Contexts may cache the values they contribute to log records.
+        to_dict = (getattr(context, 'to_log_dict', None) or
+                   getattr(context, 'to_dict', None))
+        if to_dict is not None:
+            context = to_dict()
     return context
 
 
+def _resolve_fields(fields):
+    """Return the structured fields of a record with lazy values computed.
+
+    Field values that are callables are only called here, when the record
+    is actually formatted.
+    """
+    return dict((key, value() if callable(value) else value)
+                for key, value in fields.items())
+
+
+def _render_fields(record):
+    parts = []
+    fields = record.__dict__.get('fields')
+    if fields:
+        parts.extend('%s=%s' % item
+                     for item in sorted(_resolve_fields(fields).items()))
+    suppressed = record.__dict__.get('suppressed')
+    if suppressed:
+        parts.append('(%d similar records suppressed)' % suppressed)
+    return ' '.join(parts)
+
+
+# Bumped by reset_format_cache() to make ContextFormatters reload the
+# format strings from CONF.
+_format_generation = 0
+
+
+def reset_format_cache():
+    """Make formatters pick up changed format options, e.g. on SIGHUP."""
+    global _format_generation
+    _format_generation += 1
+
+
 def _get_binary_name():
     return os.path.basename(inspect.stack()[-1][1])
 
@@ -340,6 +418,12 @@ class ContextAdapter(BaseLoggerAdapter):
 
         extra.setdefault('user_identity', kwargs.pop('user_identity', None))
 
+        # Structured key/value fields, values may be callables so that
+        # they are only computed if the record is formatted.
+        fields = kwargs.pop('fields', None)
+        if fields:
+            extra['fields'] = fields
+
         extra['project'] = self.project
         extra['version'] = self.version
         extra['extra'] = extra.copy()
@@ -384,7 +468,16 @@ class JSONFormatter(logging.Formatter):
                    'traceback': None}
 
         if hasattr(record, 'extra'):
-            message['extra'] = record.extra
+            extra = dict(record.extra)
+            extra.pop('fields', None)
+            message['extra'] = extra
+
+        fields = record.__dict__.get('fields')
+        if fields:
+            message['fields'] = _resolve_fields(fields)
+
+        if record.__dict__.get('suppressed'):
+            message['suppressed'] = record.suppressed
 
         if record.exc_info:
             message['traceback'] = self.formatException(record.exc_info)
@@ -392,6 +485,209 @@ class JSONFormatter(logging.Formatter):
         return jsonutils.dumps(message)
 
 
+class AsyncHandler(logging.Handler):
+    """Write log records from a background thread.
+
+    emit() only puts the record on a bounded queue; a writer thread takes
+    the records off in batches and passes them to the target handlers,
+    which do the formatting and the blocking I/O. The request context is
+    captured when the record is queued, since the writer thread cannot
+    see it.
+
+    When the queue is full the record is dropped, or the oldest queued
+    record is dropped in its place, depending on the drop policy. The
+    caller never waits: with eventlet that would stall every green thread.
+    The number of dropped records is logged once there is room.
+
+    Note that the message arguments are formatted by the writer thread,
+    so they should not be mutated after being logged. The target handlers
+    are only called from the writer thread, and their locks are replaced
+    with native ones since green locks cannot be taken there.
+    """
+
+    _STOP = object()
+
+    def __init__(self, handlers, queue_size=10000, batch_size=100,
+                 drop_policy='drop_new'):
+        logging.Handler.__init__(self)
+        self.handlers = list(handlers)
+        for handler in self.handlers:
+            handler.lock = _threading.RLock()
+        self.batch_size = max(1, batch_size)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._queue = _queue.Queue(maxsize=queue_size)
+        self._writer = _threading.Thread(target=self._run,
+                                         name='log-writer')
+        self._writer.daemon = True
+        self._writer.start()
+        _async_handlers.add(self)
+
+    def createLock(self):
+        # emit() does not need the handler lock, the queue has its own.
+        self.lock = None
+
+    def emit(self, record):
+        if '_context' not in record.__dict__:
+            record._context = getattr(local.store, 'context', None)
+        try:
+            self._queue.put_nowait(record)
+            return
+        except _queue.Full:
+            pass
+        if self.drop_policy == 'drop_oldest':
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except _queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+            except _queue.Full:
+                pass
+        self.dropped += 1
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except _queue.Empty:
+                break
+        return batch
+
+    def _write(self, records):
+        for handler in self.handlers:
+            handler.acquire()
+            try:
+                for record in records:
+                    if record.levelno < handler.level:
+                        continue
+                    try:
+                        handler.emit(record)
+                    except Exception:
+                        handler.handleError(record)
+            finally:
+                handler.release()
+
+    def _report_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            '%d log records were dropped, the log queue was full',
+            (dropped,), None)
+        self._write([record])
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            taken = len(batch)
+            stop = batch[-1] is self._STOP
+            if stop:
+                batch.pop()
+            if self.dropped:
+                self._report_dropped()
+            if batch:
+                self._write(batch)
+            for _i in range(taken):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self, timeout=5):
+        """Wait up to timeout seconds for queued records to be written."""
+        end = time.time() + timeout
+        # Records taken off the queue are only done once written.
+        while self._queue.unfinished_tasks and time.time() < end:
+            time.sleep(0.01)
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        _async_handlers.discard(self)
+        if self._writer.is_alive():
+            self._queue.put(self._STOP)
+            self._writer.join(5)
+        for handler in self.handlers:
+            handler.flush()
+            handler.close()
+        logging.Handler.close(self)
+
+
+# The AsyncHandlers not closed yet. They are closed at exit so the records
+# still queued get written, by a single exit handler however many times
+# logging is set up.
+_async_handlers = weakref.WeakSet()
+
+
+def _close_async_handlers():
+    for handler in list(_async_handlers):
+        handler.close()
+
+
+atexit.register(_close_async_handlers)
+
+
+class RateSampler(logging.Filter):
+    """Limit how often each message is logged below WARNING level.
+
+    Every message template gets a token bucket refilled at rate records
+    per second. Records finding the bucket empty are dropped before any
+    formatting happens; the number dropped is attached to the next record
+    of that message let through as its ``suppressed`` attribute.
+    """
+
+    # Templates are literals in the code, this only guards against
+    # messages formatted before being logged.
+    max_messages = 1000
+
+    def __init__(self, rate):
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = record.created
+        bucket = self._buckets.get(record.msg)
+        if bucket is None:
+            if len(self._buckets) >= self.max_messages:
+                self._buckets.clear()
+            bucket = self._buckets[record.msg] = [self.burst, now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+def _setup_sampling(sample_rates):
+    for pair in sample_rates:
+        name, _sep, rate = pair.partition('=')
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = None
+        if not name or rate is None or rate <= 0:
+            # Do not prevent the service from starting over it.
+            logging.getLogger(__name__).warning(
+                'Ignoring log_sample_rates entry %r, expected logger=N '
+                'with N a positive number', pair)
+            continue
+        logger = logging.getLogger(name)
+        for old in [f for f in logger.filters if isinstance(f, RateSampler)]:
+            logger.removeFilter(old)
+        logger.addFilter(RateSampler(rate))
+
+
 def _create_logging_excepthook(product_name):
     def logging_excepthook(exc_type, value, tb):
         extra = {'exc_info': (exc_type, value, tb)}
@@ -490,7 +786,10 @@ class RFCSysLogHandler(logging.handlers.SysLogHandler):
 
 def _setup_logging_from_conf(project, version):
     log_root = getLogger(None).logger
-    for handler in log_root.handlers:
+    for handler in list(log_root.handlers):
+        if isinstance(handler, AsyncHandler):
+            # Stops its writer thread.
+            handler.close()
         log_root.removeHandler(handler)
 
     logpath = _get_log_file_path()
@@ -523,6 +822,8 @@ def _setup_logging_from_conf(project, version):
                                                    datefmt=datefmt))
             log_root.info('Deprecated: log_format is now deprecated and will '
                           'be removed in the next release')
+        elif CONF.log_json:
+            handler.setFormatter(JSONFormatter(datefmt=datefmt))
         else:
             handler.setFormatter(ContextFormatter(project=project,
                                                   version=version,
@@ -546,6 +847,8 @@ def _setup_logging_from_conf(project, version):
         else:
             logger.setLevel(level_name)
 
+    _setup_sampling(CONF.log_sample_rates)
+
     if CONF.use_syslog:
         try:
             facility = _find_facility_from_conf()
@@ -562,6 +865,16 @@ def _setup_logging_from_conf(project, version):
             log_root.error('Unable to add syslog handler. Verify that syslog '
                            'is running.')
 
+    if CONF.log_async:
+        handlers = list(log_root.handlers)
+        for handler in handlers:
+            log_root.removeHandler(handler)
+        log_root.addHandler(AsyncHandler(
+            handlers,
+            queue_size=CONF.log_async_queue_size,
+            batch_size=CONF.log_async_batch_size,
+            drop_policy=CONF.log_async_drop_policy))
+
 
 _loggers = {}
 
@@ -625,9 +938,37 @@ class ContextFormatter(logging.Formatter):
 
         self.project = kwargs.pop('project', 'unknown')
         self.version = kwargs.pop('version', 'unknown')
+        self._generation = None
+        self._styles = None
 
         logging.Formatter.__init__(self, *args, **kwargs)
 
+    def _load_formats(self):
+        """Build the format for each (has context, is debug) combination.
+
+        The format options are read from CONF once, not for every record,
+        until reset_format_cache() is called.
+        """
+        suffix = CONF.logging_debug_format_suffix
+        styles = {}
+        for has_context in (True, False):
+            if has_context:
+                fmt = CONF.logging_context_format_string
+            else:
+                fmt = CONF.logging_default_format_string
+            for debug in (True, False):
+                if debug and suffix:
+                    key_fmt = fmt + " " + suffix
+                else:
+                    key_fmt = fmt
+                if sys.version_info < (3, 2):
+                    styles[has_context, debug] = (key_fmt, None)
+                else:
+                    style = logging.PercentStyle(key_fmt)
+                    styles[has_context, debug] = (style._fmt, style)
+        self._styles = styles
+        self._generation = _format_generation
+
     def format(self, record):
         """Uses contextstring if request_id is set, otherwise default."""
 
@@ -641,12 +982,14 @@ class ContextFormatter(logging.Formatter):
         record.project = self.project
         record.version = self.version
 
-        # store request info
-        context = getattr(local.store, 'context', None)
+        # store request info, AsyncHandler captured it when the record
+        # was queued on the thread that logged it
+        if '_context' in record.__dict__:
+            context = record._context
+        else:
+            context = getattr(local.store, 'context', None)
         if context:
-            d = _dictify_context(context)
-            for k, v in d.items():
-                setattr(record, k, v)
+            record.__dict__.update(_dictify_context(context))
 
         # NOTE(sdague): default the fancier formatting params
         # to an empty string so we don't throw an exception if
@@ -655,23 +998,24 @@ class ContextFormatter(logging.Formatter):
             if key not in record.__dict__:
                 record.__dict__[key] = ''
 
-        if record.__dict__.get('request_id'):
-            fmt = CONF.logging_context_format_string
-        else:
-            fmt = CONF.logging_default_format_string
-
-        if (record.levelno == logging.DEBUG and
-                CONF.logging_debug_format_suffix):
-            fmt += " " + CONF.logging_debug_format_suffix
-
-        if sys.version_info < (3, 2):
-            self._fmt = fmt
-        else:
-            self._style = logging.PercentStyle(fmt)
-            self._fmt = self._style._fmt
+        if self._generation != _format_generation:
+            self._load_formats()
+        self._fmt, style = self._styles[
+            bool(record.__dict__.get('request_id')),
+            record.levelno == logging.DEBUG]
+        if style is not None:
+            self._style = style
         # Cache this on the record, Logger will respect our formatted copy
         if record.exc_info:
             record.exc_text = self.formatException(record.exc_info, record)
+        if 'fields' in record.__dict__ or 'suppressed' in record.__dict__:
+            # Append the fields to the message of a copy, the record may
+            # go to other handlers too.
+            record = copy.copy(record)
+            rendered = _render_fields(record)
+            if record.args:
+                rendered = rendered.replace('%', '%%')
+            record.msg = '%s %s' % (record.msg, rendered)
         return logging.Formatter.format(self, record)
 
     def formatException(self, exc_info, record=None):
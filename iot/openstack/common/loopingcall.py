@@ -15,12 +15,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import sys
 import time
 
 from eventlet import event
 from eventlet import greenthread
 
+from iot.common import metrics
 from magnum.openstack.common._i18n import _LE, _LW
 from magnum.openstack.common import log as logging
 
@@ -31,6 +33,44 @@ LOG = logging.getLogger(__name__)
 #              during unittests.
 _ts = lambda: time.time()
 
+# Anchored looping calls must not be thrown off by changes of the wall
+# clock. Python 2 has no monotonic clock of its own.
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    try:
+        from monotonic import monotonic as _monotonic
+    except ImportError:
+        _monotonic = _ts
+
+RUN_TIME = metrics.histogram('iot_looping_call_run_seconds',
+                             'Run time of each call of a looping call',
+                             ('name',))
+LATENESS = metrics.histogram('iot_looping_call_lateness_seconds',
+                             'How long after it was due a looping call ran',
+                             ('name',))
+COALESCED = metrics.counter('iot_looping_call_coalesced_total',
+                            'Runs of anchored looping calls skipped because '
+                            'the previous run overran',
+                            ('name',))
+
+
+def _func_name(f):
+    """Return the name metrics of a looping call of f are labelled with.
+
+    It must not vary between instances or runs, so callables without a
+    name of their own are named after their class, never their repr().
+    """
+    while isinstance(f, functools.partial):
+        f = f.func
+    owner = getattr(f, '__self__', None)
+    name = getattr(f, '__name__', None)
+    if name is None:
+        return f.__class__.__name__
+    if owner is not None:
+        return '%s.%s' % (owner.__class__.__name__, name)
+    return name
+
 
 class LoopingCallDone(Exception):
     """Exception to break out and stop a LoopingCallBase.
@@ -65,28 +105,75 @@ class LoopingCallBase(object):
 
 
 class FixedIntervalLoopingCall(LoopingCallBase):
-    """A fixed interval looping call."""
+    """A fixed interval looping call.
+
+    By default the interval is counted from the start of one run to the
+    start of the next, and a run that outlasts the interval delays all
+    later runs.
+
+    Started with ``anchored=True`` the runs are due at fixed multiples of
+    the interval from the first run, on a monotonic clock, so they do not
+    drift. When a run overruns, the runs it missed are coalesced into one
+    run straight away, and the loop then continues on the original
+    schedule.
+
+    The run time of each call and its lateness, how long after it was due
+    it started, are recorded in the iot_looping_call_* histograms of the
+    metrics registry under the name of the looping call.
+    """
+
+    def start(self, interval, initial_delay=None, anchored=False,
+              name=None):
+        """Start calling the function every interval seconds.
 
-    def start(self, interval, initial_delay=None):
+        :param anchored: keep to a fixed schedule and coalesce missed runs.
+        :param name: the name the timings are recorded under, by default
+                     the name of the function.
+        """
         self._running = True
         done = event.Event()
+        self.name = name or _func_name(self.f)
+        run_time = RUN_TIME.labels(self.name)
+        lateness = LATENESS.labels(self.name)
+        clock = _monotonic if anchored else _ts
 
         def _inner():
             if initial_delay:
                 greenthread.sleep(initial_delay)
 
             try:
+                due = clock()
                 while self._running:
-                    start = _ts()
+                    start = clock()
+                    lateness.observe(max(0.0, start - due))
                     self.f(*self.args, **self.kw)
-                    end = _ts()
+                    end = clock()
+                    run_time.observe(end - start)
                     if not self._running:
                         break
+                    if anchored:
+                        due += interval
+                        if end > due:
+                            # Run once for all the runs missed, on the
+                            # last of them, then keep to the schedule.
+                            missed = int((end - due) // interval)
+                            due += missed * interval
+                            if missed:
+                                COALESCED.labels(self.name).inc(missed)
+                            LOG.warn(_LW('task %(func_name)s run outlasted '
+                                         'interval by %(delay).2f sec, '
+                                         'coalescing %(missed)d runs'),
+                                     {'func_name': self.name,
+                                      'delay': end - start - interval,
+                                      'missed': missed + 1})
+                        greenthread.sleep(max(0, due - clock()))
+                        continue
                     delay = end - start - interval
                     if delay > 0:
                         LOG.warn(_LW('task %(func_name)s run outlasted '
                                      'interval by %(delay).2f sec'),
                                  {'func_name': repr(self.f), 'delay': delay})
+                    due = start + interval
                     greenthread.sleep(-delay if delay < 0 else 0)
             except LoopingCallDone as e:
                 self.stop()
@@ -12,6 +12,7 @@
 #    under the License.
 
 import copy
+import heapq
 import random
 import time
 
@@ -20,6 +21,7 @@ import six
 
 from magnum.openstack.common._i18n import _, _LE, _LI
 from magnum.openstack.common import log as logging
+from magnum.openstack.common import threadgroup
 
 
 periodic_opts = [
@@ -27,6 +29,11 @@ periodic_opts = [
                 default=True,
                 help='Some periodic tasks can be run in a separate process. '
                      'Should we run them here?'),
+    cfg.IntOpt('periodic_task_workers',
+               default=4,
+               help='Number of periodic tasks that may run concurrently in '
+                    'green threads. 0 runs them one after another in the '
+                    'caller.'),
 ]
 
 CONF = cfg.CONF
@@ -170,43 +177,153 @@ def _nearest_boundary(last_run, spacing):
     return current_time - offset + jitter
 
 
+class _TaskStats(object):
+    """Run counts and timings of a periodic task."""
+
+    __slots__ = ('runs', 'failures', 'skipped', 'last_duration',
+                 'max_duration', 'total_duration', 'last_lateness',
+                 'max_lateness')
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def record(self, duration, lateness, failed):
+        self.runs += 1
+        if failed:
+            self.failures += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
 @six.add_metaclass(_PeriodicTasksMeta)
 class PeriodicTasks(object):
-    def __init__(self):
+    """Run the periodic tasks of a class when they are due.
+
+    The tasks are kept in a heap ordered by their next run time, so a tick
+    only looks at the tasks that are due. Due tasks are started in a
+    bounded pool of green threads, so a slow task does not hold up the
+    others. A task still running when it is due again is skipped rather
+    than run twice at the same time.
+
+    :param thread_group: the ThreadGroup to run tasks in. By default one
+                         of ``periodic_task_workers`` threads is created,
+                         and stopped by stop_periodic_tasks(); if that is
+                         0 tasks run in the caller.
+    """
+
+    def __init__(self, thread_group=None):
         super(PeriodicTasks, self).__init__()
+        self._periodic_owns_thread_group = False
+        if thread_group is None and CONF.periodic_task_workers > 0:
+            thread_group = threadgroup.ThreadGroup(
+                CONF.periodic_task_workers)
+            self._periodic_owns_thread_group = True
+        self._periodic_thread_group = thread_group
         self._periodic_last_run = {}
+        self._periodic_running = set()
+        self._periodic_stats = {}
+        self._periodic_schedule = []
+        now = time.time()
         for name, task in self._periodic_tasks:
-            self._periodic_last_run[name] = task._periodic_last_run
+            last_run = task._periodic_last_run
+            self._periodic_last_run[name] = last_run
+            self._periodic_stats[name] = _TaskStats()
+            if last_run is None:
+                due = now
+            else:
+                due = last_run + self._periodic_spacing[name]
+            heapq.heappush(self._periodic_schedule, (due, name, task))
+
+    def stop_periodic_tasks(self, graceful=False):
+        """Stop the tasks running in the thread group created for them.
+
+        A thread group passed to the constructor is left to its owner.
+
+        :param graceful: wait for the running tasks instead of killing
+                         them.
+        """
+        if self._periodic_owns_thread_group:
+            self._periodic_thread_group.stop(graceful)
+
+    def periodic_task_stats(self):
+        """Return {task name: run counts and timings} for all tasks.
+
+        Durations and lateness, how long after it was due a task started,
+        are in seconds.
+        """
+        return dict((name, stats.to_dict())
+                    for name, stats in self._periodic_stats.items())
+
+    def _run_periodic_task(self, context, task_name, task, lateness,
+                           raise_on_error=False):
+        full_task_name = '.'.join([self.__class__.__name__, task_name])
+        LOG.debug("Running periodic task %(full_task_name)s",
+                  {"full_task_name": full_task_name})
+        start = time.time()
+        failed = False
+        try:
+            task(self, context)
+        except Exception as e:
+            failed = True
+            if raise_on_error:
+                raise
+            LOG.exception(_LE("Error during %(full_task_name)s: %(e)s"),
+                          {"full_task_name": full_task_name, "e": e})
+        finally:
+            self._periodic_running.discard(task_name)
+            self._periodic_stats[task_name].record(time.time() - start,
+                                                   lateness, failed)
 
     def run_periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
-        idle_for = DEFAULT_INTERVAL
-        for task_name, task in self._periodic_tasks:
-            full_task_name = '.'.join([self.__class__.__name__, task_name])
-
+        """Tasks to be run at a periodic interval.
+
+        :param raise_on_error: run the tasks in the caller, one after
+                               another, and raise the first error.
+        :returns: the number of seconds until the next task is due.
+        """
+        pool = None if raise_on_error else self._periodic_thread_group
+        schedule = self._periodic_schedule
+        now = time.time()
+        while schedule and schedule[0][0] <= now:
+            if pool is not None and not pool.pool.free():
+                # Every worker is busy, the due tasks stay due.
+                return min(DEFAULT_INTERVAL, 1.0)
+            due, task_name, task = heapq.heappop(schedule)
             spacing = self._periodic_spacing[task_name]
-            last_run = self._periodic_last_run[task_name]
-
-            # Check if due, if not skip
-            idle_for = min(idle_for, spacing)
-            if last_run is not None:
-                delta = last_run + spacing - time.time()
-                if delta > 0:
-                    idle_for = min(idle_for, delta)
-                    continue
-
-            LOG.debug("Running periodic task %(full_task_name)s",
-                      {"full_task_name": full_task_name})
-            self._periodic_last_run[task_name] = _nearest_boundary(
-                last_run, spacing)
-
-            try:
-                task(self, context)
-            except Exception as e:
-                if raise_on_error:
-                    raise
-                LOG.exception(_LE("Error during %(full_task_name)s: %(e)s"),
-                              {"full_task_name": full_task_name, "e": e})
-            time.sleep(0)
-
-        return idle_for
+            if task_name in self._periodic_running:
+                self._periodic_stats[task_name].skipped += 1
+                LOG.debug("Skipping periodic task %(task)s, its previous "
+                          "run has not finished", {"task": task_name})
+                heapq.heappush(schedule, (now + spacing, task_name, task))
+                continue
+
+            last_run = _nearest_boundary(self._periodic_last_run[task_name],
+                                         spacing)
+            self._periodic_last_run[task_name] = last_run
+            heapq.heappush(schedule, (last_run + spacing, task_name, task))
+
+            if pool is None:
+                self._run_periodic_task(context, task_name, task,
+                                        now - due, raise_on_error)
+                time.sleep(0)
+            else:
+                self._periodic_running.add(task_name)
+                pool.add_thread(self._run_periodic_task, context,
+                                task_name, task, now - due)
+
+        if not schedule:
+            return DEFAULT_INTERVAL
+        return min(DEFAULT_INTERVAL, max(0, schedule[0][0] - time.time()))
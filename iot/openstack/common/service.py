@@ -37,9 +37,11 @@ import eventlet
 from eventlet import event
 from oslo.config import cfg
 
+from iot.common import metrics
+from iot.openstack.common import log as logging
+from iot.openstack.common import periodic_task
 from magnum.openstack.common import eventlet_backdoor
 from magnum.openstack.common._i18n import _LE, _LI, _LW
-from magnum.openstack.common import log as logging
 from magnum.openstack.common import systemd
 from magnum.openstack.common import threadgroup
 
@@ -140,6 +142,7 @@ class Launcher(object):
 
         """
         cfg.CONF.reload_config_files()
+        logging.reset_format_cache()
         self.services.restart()
 
 
@@ -288,6 +291,9 @@ class ProcessLauncher(object):
         # Reseed random number generator
         random.seed()
 
+        # Share the metrics of this worker with its siblings
+        metrics.setup()
+
         launcher = Launcher()
         launcher.launch_service(service)
         return launcher
@@ -435,6 +441,8 @@ class Service(object):
         pass
 
     def stop(self):
+        if isinstance(self, periodic_task.PeriodicTasks):
+            self.stop_periodic_tasks()
         self.tg.stop()
         self.tg.wait()
         # Signal that service cleanup is done:
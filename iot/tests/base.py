@@ -10,9 +10,29 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+
+import mock
 from oslotest import base
 
+from iot.objects import base as objects_base
+
 
 class TestCase(base.BaseTestCase):
 
-    """Test case base class for all unit tests.""" 
+    """Test case base class for all unit tests."""
+
+    def use_object_registry(self):
+        """Register the object classes the test defines apart.
+
+        Classes defined after this call go in a registry of their own,
+        thrown away with the test, instead of the one of IoTObject.
+        """
+        for attrname, value in (
+                ('_obj_classes', collections.defaultdict(list)),
+                ('_obj_class_versions', collections.defaultdict(list)),
+                ('_obj_class_index', {})):
+            patcher = mock.patch.object(objects_base.IoTObject, attrname,
+                                        value)
+            patcher.start()
+            self.addCleanup(patcher.stop) 
@@ -0,0 +1,41 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks.
+
+These are slow and are skipped unless IOT_BENCHMARKS is set in the
+environment, e.g.::
+
+    IOT_BENCHMARKS=1 python -m testtools.run iot.tests.benchmarks.test_objects
+"""
+
+import os
+
+from testtools import content
+
+from iot.tests import base
+
+
+class BenchmarkTestCase(base.TestCase):
+
+    """Base class for benchmarks, skipped unless IOT_BENCHMARKS is set."""
+
+    def setUp(self):
+        super(BenchmarkTestCase, self).setUp()
+        if not os.environ.get('IOT_BENCHMARKS'):
+            self.skipTest('set IOT_BENCHMARKS=1 to run benchmarks')
+
+    def report(self, name, **values):
+        """Attach measurements to the test result."""
+        line = ' '.join('%s=%s' % item for item in sorted(values.items()))
+        self.addDetail(name, content.text_content(line))
+
@@ -0,0 +1,80 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import time
+
+from iot.api.middleware import auth_token
+from iot.tests import benchmarks
+
+REQUESTS = int(os.environ.get('IOT_BENCHMARK_AUTH_REQUESTS', 2000))
+TOKENS = int(os.environ.get('IOT_BENCHMARK_AUTH_TOKENS', 20))
+# Round trip to keystone to validate a token, in seconds.
+KEYSTONE_LATENCY = float(os.environ.get('IOT_BENCHMARK_KEYSTONE_LATENCY',
+                                        0.005))
+
+TOKEN_INFO = {'token': {'expires_at': '2099-01-01T00:00:00.000000Z'}}
+
+
+def _app(env, start_response):
+    start_response('200 OK', [])
+    return []
+
+
+def _start_response(status, headers, exc_info=None):
+    pass
+
+
+class _SimulatedKeystone(auth_token.AuthTokenMiddleware):
+    """AuthTokenMiddleware validating tokens against a fake keystone."""
+
+    def __init__(self, cached):
+        self._app = _app
+        self.public_api_routes = []
+        self._token_cache = (auth_token.TokenCache(10000, 300, 10)
+                             if cached else None)
+        self.validations = 0
+
+    def _authenticate(self, env, start_response):
+        self.validations += 1
+        time.sleep(KEYSTONE_LATENCY)
+        env.update({'HTTP_X_IDENTITY_STATUS': 'Confirmed',
+                    'HTTP_X_PROJECT_ID': 'project',
+                    'HTTP_X_USER_ID': 'user',
+                    'HTTP_X_ROLES': 'member',
+                    'keystone.token_info': TOKEN_INFO})
+        return self._app(env, start_response)
+
+
+class AuthOverheadBenchmark(benchmarks.BenchmarkTestCase):
+
+    def _run(self, app):
+        tokens = ['token-%d' % i for i in range(TOKENS)]
+        start = time.time()
+        for i in range(REQUESTS):
+            env = {'PATH_INFO': '/v1/devices',
+                   'HTTP_X_AUTH_TOKEN': tokens[i % TOKENS]}
+            app(env, _start_response)
+        return (time.time() - start) / REQUESTS
+
+    def test_auth_overhead(self):
+        baseline = self._run(_app)
+        uncached = _SimulatedKeystone(cached=False)
+        cached = _SimulatedKeystone(cached=True)
+        uncached_time = self._run(uncached)
+        cached_time = self._run(cached)
+        self.assertEqual(TOKENS, cached.validations)
+        self.report('auth_overhead_us',
+                    uncached='%.1f' % ((uncached_time - baseline) * 1e6),
+                    cached='%.1f' % ((cached_time - baseline) * 1e6),
+                    keystone_calls_uncached=uncached.validations,
+                    keystone_calls_cached=cached.validations)
@@ -0,0 +1,63 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+import os
+import time
+
+from iot.common import context
+from iot.openstack.common import log
+from iot.tests import benchmarks
+
+RECORDS = int(os.environ.get('IOT_BENCHMARK_LOG_RECORDS', 100000))
+
+
+class _NullStream(object):
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class LoggingThroughputBenchmark(benchmarks.BenchmarkTestCase):
+
+    def setUp(self):
+        super(LoggingThroughputBenchmark, self).setUp()
+        handler = logging.StreamHandler(_NullStream())
+        handler.setFormatter(log.ContextFormatter(project='iot',
+                                                  version='bench'))
+        self.logger = log.getLogger('iot.benchmark')
+        self.logger.logger.addHandler(handler)
+        self.logger.logger.setLevel(logging.DEBUG)
+        self.logger.logger.propagate = False
+        self.addCleanup(self.logger.logger.removeHandler, handler)
+        self.addCleanup(setattr, log.local.store, 'context', None)
+
+    def _records_per_second(self):
+        start = time.time()
+        for i in range(RECORDS):
+            self.logger.debug('Device %(uuid)s polled in %(ms)d ms',
+                              {'uuid': 'a-b-c-d', 'ms': i})
+        return RECORDS / (time.time() - start)
+
+    def test_throughput(self):
+        log.local.store.context = None
+        without_context = self._records_per_second()
+        log.local.store.context = context.RequestContext(
+            auth_token='token', user='user', tenant='project',
+            request_id='req-0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c')
+        with_context = self._records_per_second()
+        self.report('log_records_per_second',
+                    without_context='%.0f' % without_context,
+                    with_context='%.0f' % with_context)
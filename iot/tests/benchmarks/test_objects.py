@@ -0,0 +1,147 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import gc
+import os
+import sys
+import timeit
+
+from iot.objects import base as objects_base
+from iot.objects import utils as obj_utils
+from iot.tests import benchmarks
+
+OBJECT_COUNT = int(os.environ.get('IOT_BENCHMARK_OBJECTS', 1000000))
+ITERATIONS = int(os.environ.get('IOT_BENCHMARK_ITERATIONS', 100000))
+
+
+def _bench_classes():
+    """Define the benchmarked object classes.
+
+    Call it from a test using its own object registry, see
+    use_object_registry().
+    """
+
+    class _BenchDevice(objects_base.IoTObject):
+        VERSION = '1.0'
+
+        fields = {
+            'id': int,
+            'uuid': obj_utils.str_or_none,
+            'name': obj_utils.str_or_none,
+            'project_id': obj_utils.str_or_none,
+            'user_id': obj_utils.str_or_none,
+            }
+
+    class _BenchDeviceList(objects_base.ObjectListBase,
+                           objects_base.IoTObject):
+        VERSION = '1.0'
+
+        fields = {
+            'objects': list,
+            }
+
+        obj_columnar = True
+
+    return _BenchDevice, _BenchDeviceList
+
+
+class _DictDevice(object):
+    """The pre-__slots__ instance layout, for comparison."""
+
+    def __init__(self, context, **kwargs):
+        self._changed_fields = set()
+        self._context = context
+        for name, value in kwargs.items():
+            self._changed_fields.add(name)
+            setattr(self, '_%s' % name, value)
+
+
+def _instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+        size += sys.getsizeof(obj.__dict__.get('_changed_fields', ()))
+    return size
+
+
+class ObjectMemoryBenchmark(benchmarks.BenchmarkTestCase):
+
+    values = dict(id=1, uuid='0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c',
+                  name='device', project_id='project', user_id='user')
+
+    def setUp(self):
+        super(ObjectMemoryBenchmark, self).setUp()
+        self.use_object_registry()
+        self.device_class = _bench_classes()[0]
+
+    def _measure(self, cls):
+        gc.collect()
+        objs = [cls(None, **self.values) for _i in range(OBJECT_COUNT)]
+        total = sum(_instance_size(obj) for obj in objs)
+        return objs, total
+
+    def test_memory(self):
+        objs, slotted = self._measure(self.device_class)
+        self.assertFalse(hasattr(objs[0], '__dict__'))
+        del objs
+        objs, legacy = self._measure(_DictDevice)
+        del objs
+        self.report('object_memory', objects=OBJECT_COUNT,
+                    slots_bytes=slotted, dict_bytes=legacy,
+                    slots_per_object=slotted // OBJECT_COUNT,
+                    dict_per_object=legacy // OBJECT_COUNT)
+        self.assertLess(slotted * 2, legacy)
+
+
+class ObjectRoundTripBenchmark(benchmarks.BenchmarkTestCase):
+
+    def setUp(self):
+        super(ObjectRoundTripBenchmark, self).setUp()
+        self.use_object_registry()
+        device_class, list_class = _bench_classes()
+        self.device = device_class(
+            None, id=1, uuid='0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c',
+            name='device', project_id='project', user_id='user')
+        self.device.obj_reset_changes()
+        self.devices = list_class(None)
+        self.devices.objects = [self.device.obj_clone()
+                                for _i in range(1000)]
+        self.devices.obj_reset_changes()
+
+    def _run(self, name, fn, number=ITERATIONS):
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        self.report(name, iterations=number,
+                    usec_per_call='%.3f' % (seconds * 1e6 / number))
+
+    def test_to_primitive(self):
+        self._run('to_primitive', self.device.obj_to_primitive)
+
+    def test_from_primitive(self):
+        primitive = self.device.obj_to_primitive()
+        self._run('from_primitive',
+                  lambda: objects_base.IoTObject.obj_from_primitive(
+                      primitive))
+
+    def test_round_trip(self):
+        from_primitive = objects_base.IoTObject.obj_from_primitive
+        self._run('round_trip',
+                  lambda: from_primitive(self.device.obj_to_primitive()))
+
+    def test_clone(self):
+        self._run('clone', self.device.obj_clone)
+
+    def test_list_round_trip(self):
+        from_primitive = objects_base.IoTObject.obj_from_primitive
+        number = max(1, ITERATIONS // 1000)
+        self._run('list_round_trip_1000',
+                  lambda: from_primitive(self.devices.obj_to_primitive()),
+                  number=number)
@@ -0,0 +1,113 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+import time
+
+import mock
+
+from iot.api.middleware import admission
+from iot.tests import base
+
+
+class AdmissionControllerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(AdmissionControllerTestCase, self).setUp()
+        self.controller = admission.AdmissionController(
+            max_inflight=1, max_queued=2, max_wait=10)
+        self.results = []
+
+    def _queue(self, name, priority):
+        """Acquire in a thread, returning once the request is queued."""
+        queued = len(self.controller._queue)
+
+        def acquire():
+            reason = self.controller.acquire(priority)
+            self.results.append((name, reason))
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        deadline = time.time() + 5
+        while (len(self.controller._queue) == queued and
+               time.time() < deadline):
+            time.sleep(0.001)
+        self.assertEqual(queued + 1, len(self.controller._queue))
+        return thread
+
+    def test_reads_are_admitted_before_writes(self):
+        self.assertIsNone(self.controller.acquire(admission.PRIORITY_READ))
+        write = self._queue('write', admission.PRIORITY_WRITE)
+        read = self._queue('read', admission.PRIORITY_READ)
+        self.controller.release()
+        read.join(5)
+        self.assertEqual([('read', None)], self.results)
+        self.controller.release()
+        write.join(5)
+        self.assertEqual([('read', None), ('write', None)], self.results)
+        self.controller.release()
+        self.assertEqual(0, self.controller.inflight)
+
+    def test_full_queue_evicts_lower_priority(self):
+        self.assertIsNone(self.controller.acquire(admission.PRIORITY_READ))
+        bulk = self._queue('bulk', admission.PRIORITY_BULK)
+        self._queue('write', admission.PRIORITY_WRITE)
+        self._queue('read', admission.PRIORITY_READ)
+        bulk.join(5)
+        self.assertEqual([('bulk', 'evicted')], self.results)
+        self.assertEqual(2, self.controller.stats()['queue_depth'])
+        self.assertEqual(
+            'queue_full',
+            self.controller.acquire(admission.PRIORITY_WRITE))
+        for _i in range(3):
+            self.controller.release()
+
+    def test_waiters_that_gave_up_leave_the_queue(self):
+        self.controller.max_wait = 0.001
+        self.controller.max_queued = 100
+        self.assertIsNone(self.controller.acquire(admission.PRIORITY_READ))
+        for _i in range(50):
+            self.assertEqual(
+                'timeout',
+                self.controller.acquire(admission.PRIORITY_WRITE))
+        self.assertEqual(0, self.controller._queued)
+        self.assertTrue(len(self.controller._queue) <= 1)
+        self.controller.release()
+        self.assertEqual([], self.controller._queue)
+        self.assertEqual(0, self.controller._dead)
+
+
+class ReleasingIteratorTestCase(base.TestCase):
+
+    def test_disconnect_releases_the_slot(self):
+        app_iter = mock.MagicMock()
+        app_iter.__iter__.return_value = iter(['a', 'b'])
+        release = mock.Mock()
+        body = admission._ReleasingIterator(app_iter, release)
+        # The server stops reading and closes the response when the
+        # client goes away.
+        next(iter(body))
+        body.close()
+        app_iter.close.assert_called_once_with()
+        release.assert_called_once_with()
+        body.close()
+        release.assert_called_once_with()
+
+    def test_release_when_closing_the_response_fails(self):
+        app_iter = mock.Mock()
+        app_iter.close.side_effect = IOError()
+        release = mock.Mock()
+        body = admission._ReleasingIterator(app_iter, release)
+        self.assertRaises(IOError, body.close)
+        release.assert_called_once_with()
@@ -0,0 +1,127 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from iot.api.middleware import auth_token
+from iot.tests import base
+
+REJECTION = b'{"error": {"code": 401, "title": "Unauthorized"}}'
+
+
+def _app(env, start_response):
+    start_response('200 OK', [('Content-Length', '0')])
+    return []
+
+
+class _RejectingKeystone(auth_token.AuthTokenMiddleware):
+    """AuthTokenMiddleware whose keystone rejects every token."""
+
+    def __init__(self):
+        self._app = _app
+        self.public_api_routes = []
+        self._token_cache = auth_token.TokenCache(10, 300, 10)
+        self.validations = 0
+
+    def _authenticate(self, env, start_response):
+        self.validations += 1
+        start_response('401 Unauthorized',
+                       [('Content-Type', 'application/json'),
+                        ('Content-Length', str(len(REJECTION))),
+                        ('WWW-Authenticate',
+                         "Keystone uri='http://keystone'")])
+        return [REJECTION]
+
+
+class _AcceptingKeystone(auth_token.AuthTokenMiddleware):
+    """AuthTokenMiddleware whose keystone accepts every token."""
+
+    def __init__(self):
+        self._app = self._record
+        self.public_api_routes = []
+        self._token_cache = auth_token.TokenCache(10, 300, 10)
+        self.validations = 0
+        self.env = None
+
+    def _record(self, env, start_response):
+        self.env = dict(env)
+        return _app(env, start_response)
+
+    def _authenticate(self, env, start_response):
+        # Like auth_token: drop what the client sent, then set the
+        # headers of the validated tokens.
+        self.validations += 1
+        service_token = env.get('HTTP_X_SERVICE_TOKEN')
+        auth_token._strip_identity(env)
+        env.update({'HTTP_X_IDENTITY_STATUS': 'Confirmed',
+                    'HTTP_X_USER_ID': 'user',
+                    'HTTP_X_PROJECT_ID': 'project',
+                    'HTTP_X_ROLES': 'member'})
+        if service_token:
+            env.update({'HTTP_X_SERVICE_IDENTITY_STATUS': 'Confirmed',
+                        'HTTP_X_SERVICE_ROLES': 'service'})
+        return self._app(env, start_response)
+
+
+def _request(app, token, **headers):
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = headers
+
+    env = {'PATH_INFO': '/v1/devices', 'HTTP_X_AUTH_TOKEN': token}
+    env.update(headers)
+    response['body'] = b''.join(app(env, start_response))
+    return response
+
+
+class TokenCacheTestCase(base.TestCase):
+
+    FORGED = {'HTTP_X_ROLES': 'admin',
+              'HTTP_X_SERVICE_IDENTITY_STATUS': 'Confirmed',
+              'HTTP_X_SERVICE_ROLES': 'admin',
+              'HTTP_X_SERVICE_USER_ID': 'admin',
+              'HTTP_X_SERVICE_PROJECT_ID': 'admin'}
+
+    def test_forged_headers_are_stripped_on_a_cache_hit(self):
+        app = _AcceptingKeystone()
+        _request(app, 'token')
+        _request(app, 'token', **self.FORGED)
+        self.assertEqual(1, app.validations)
+        self.assertEqual('member', app.env['HTTP_X_ROLES'])
+        self.assertEqual('Confirmed', app.env['HTTP_X_IDENTITY_STATUS'])
+        self.assertEqual([], [key for key in app.env
+                              if key.startswith('HTTP_X_SERVICE_')])
+
+    def test_service_tokens_are_always_validated(self):
+        app = _AcceptingKeystone()
+        _request(app, 'token')
+        _request(app, 'token', HTTP_X_SERVICE_TOKEN='service-token')
+        self.assertEqual(2, app.validations)
+        self.assertEqual('Confirmed',
+                         app.env['HTTP_X_SERVICE_IDENTITY_STATUS'])
+        # Nor is their service identity replayed for the user token.
+        _request(app, 'token', **self.FORGED)
+        self.assertEqual(2, app.validations)
+        self.assertNotIn('HTTP_X_SERVICE_IDENTITY_STATUS', app.env)
+
+
+class NegativeTokenCacheTestCase(base.TestCase):
+
+    def test_rejection_is_replayed_whole(self):
+        app = _RejectingKeystone()
+        first = _request(app, 'bad-token')
+        second = _request(app, 'bad-token')
+        self.assertEqual(1, app.validations)
+        self.assertEqual('401 Unauthorized', second['status'])
+        self.assertEqual(first, second)
+        length = dict(second['headers'])['Content-Length']
+        self.assertEqual(len(second['body']), int(length))
@@ -0,0 +1,190 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+from oslo.config import cfg
+
+from iot.common import clients
+from iot.common import iot_keystoneclient
+from iot.tests import base
+
+_AUTH_URL = 'http://keystone:5000/v2.0'
+
+
+class _Context(object):
+
+    def __init__(self, auth_token='token-a', tenant='tenant-a',
+                 trust_id=None, auth_url=_AUTH_URL):
+        self.auth_token = auth_token
+        self.tenant = tenant
+        self.trust_id = trust_id
+        self.auth_url = auth_url
+
+
+def _auth_ref(fresh=True):
+    auth_ref = mock.Mock()
+    auth_ref.will_expire_soon.return_value = not fresh
+    return auth_ref
+
+
+def _new_client():
+    client = mock.Mock()
+    client.auth_ref = _auth_ref()
+    return client, client.auth_ref
+
+
+class _CacheTestCase(base.TestCase):
+
+    def setUp(self):
+        super(_CacheTestCase, self).setUp()
+        self.cache = iot_keystoneclient.ClientCache()
+        patcher = mock.patch.object(iot_keystoneclient, 'CLIENT_CACHE',
+                                    self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value)
+        self.addCleanup(cfg.CONF.clear_override, name)
+
+
+class ClientCacheTestCase(_CacheTestCase):
+
+    def test_client_shared(self):
+        create = mock.Mock(side_effect=_new_client)
+        client = self.cache.get(('token', 'a'), create)
+        self.assertIs(client, self.cache.get(('token', 'a'), create))
+        self.assertEqual(1, create.call_count)
+
+    def test_expiring_client_replaced(self):
+        stale = mock.Mock(), _auth_ref(fresh=False)
+        self.cache.get(('token', 'a'), lambda: stale)
+        client = self.cache.get(('token', 'a'), _new_client)
+        self.assertIsNot(stale[0], client)
+        self.assertIs(client, self.cache.get(('token', 'a'), _new_client))
+
+    def test_unparsable_expiry_not_trusted(self):
+        auth_ref = _auth_ref()
+        auth_ref.will_expire_soon.side_effect = ValueError()
+        self.cache.get(('token', 'a'), lambda: (mock.Mock(), auth_ref))
+        create = mock.Mock(side_effect=_new_client)
+        self.cache.get(('token', 'a'), create)
+        self.assertTrue(create.called)
+
+    def test_least_recently_used_evicted(self):
+        self._override('client_cache_size', 2)
+        first = self.cache.get(('token', 'a'), _new_client)
+        second = self.cache.get(('token', 'b'), _new_client)
+        self.cache.get(('token', 'a'), _new_client)
+        self.cache.get(('token', 'c'), _new_client)
+        self.assertIs(first, self.cache.get(('token', 'a'), _new_client))
+        self.assertIsNot(second,
+                         self.cache.get(('token', 'b'), _new_client))
+
+    def test_sharing_disabled(self):
+        self._override('client_cache_size', 0)
+        client = self.cache.get(('token', 'a'), _new_client)
+        self.assertIsNot(client, self.cache.get(('token', 'a'),
+                                                _new_client))
+
+    def test_token_key(self):
+        self.assertIsNone(iot_keystoneclient.token_key(None))
+        self.assertEqual(iot_keystoneclient.token_key(b'token-a'),
+                         iot_keystoneclient.token_key(u'token-a'))
+        self.assertNotEqual(iot_keystoneclient.token_key('token-a'),
+                            iot_keystoneclient.token_key('token-b'))
+        self.assertNotIn('token-a',
+                         iot_keystoneclient.token_key('token-a'))
+
+
+class KeystoneClientKeyTestCase(_CacheTestCase):
+
+    def setUp(self):
+        super(KeystoneClientKeyTestCase, self).setUp()
+        patcher = mock.patch.object(iot_keystoneclient.KeystoneClientV3,
+                                    '_v3_client_create',
+                                    side_effect=_new_client)
+        self.create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, **kwargs):
+        return iot_keystoneclient.KeystoneClientV3(
+            _Context(**kwargs)).client
+
+    def test_same_credentials_share_a_client(self):
+        self.assertIs(self._client(), self._client())
+        self.assertEqual(1, self.create.call_count)
+
+    def test_tokens_never_share_a_client(self):
+        self.assertIsNot(self._client(auth_token='token-a'),
+                         self._client(auth_token='token-b'))
+
+    def test_projects_never_share_a_client(self):
+        self.assertIsNot(self._client(tenant='tenant-a'),
+                         self._client(tenant='tenant-b'))
+
+    def test_endpoints_never_share_a_client(self):
+        self.assertIsNot(
+            self._client(),
+            self._client(auth_url='http://other:5000/v2.0'))
+
+    def test_trusts_never_share_a_client(self):
+        self.assertIsNot(self._client(trust_id='trust-a'),
+                         self._client(trust_id='trust-b'))
+        self.assertIs(self._client(trust_id='trust-a'),
+                      self._client(trust_id='trust-a'))
+
+    def test_trust_and_token_never_share_a_client(self):
+        self.assertIsNot(self._client(trust_id='trust-a'), self._client())
+
+    def test_trust_client_scopes_the_context(self):
+        ctxt = _Context(trust_id='trust-a')
+        client = iot_keystoneclient.KeystoneClientV3(ctxt).client
+        self.assertEqual(client.auth_ref.auth_token, ctxt.auth_token)
+        self.assertEqual(client.auth_ref.project_id, ctxt.tenant)
+        # Sharing the client must still scope each context.
+        other = _Context(trust_id='trust-a')
+        iot_keystoneclient.KeystoneClientV3(other).client
+        self.assertEqual(client.auth_ref.auth_token, other.auth_token)
+
+
+class HeatClientKeyTestCase(_CacheTestCase):
+
+    def setUp(self):
+        super(HeatClientKeyTestCase, self).setUp()
+        for attrname, value in (
+                ('keystone', mock.Mock(return_value=mock.Mock(
+                    v3_endpoint='http://keystone:5000/v3',
+                    client=mock.Mock(auth_ref=_auth_ref())))),
+                ('_heat_client_init', mock.Mock(side_effect=mock.Mock))):
+            patcher = mock.patch.object(clients.OpenStackClients, attrname,
+                                        value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _heat(self, **kwargs):
+        return clients.OpenStackClients(_Context(**kwargs)).heat()
+
+    def test_same_credentials_share_a_client(self):
+        self.assertIs(self._heat(), self._heat())
+
+    def test_tokens_never_share_a_client(self):
+        self.assertIsNot(self._heat(auth_token='token-a'),
+                         self._heat(auth_token='token-b'))
+
+    def test_trusts_never_share_a_client(self):
+        self.assertIsNot(self._heat(trust_id='trust-a'),
+                         self._heat(trust_id='trust-b'))
+
+    def test_projects_never_share_a_client(self):
+        self.assertIsNot(self._heat(tenant='tenant-a'),
+                         self._heat(tenant='tenant-b'))
@@ -0,0 +1,172 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import itertools
+
+import mock
+
+from iot.common import context
+from iot.common import exception
+from iot.common import rpc_service
+from iot.common import utils
+from iot.conductor import api as conductor_api
+from iot.conductor.handlers.common import jobs
+from iot.conductor.handlers import driver
+from iot.db.sqlalchemy import models
+from iot import objects
+from iot.tests import base
+
+DEVICE_UUID = '0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c'
+
+
+class _FakeDBAPI(object):
+    """The device and job calls of the DB API, kept in memory."""
+
+    def __init__(self):
+        self.devices = {}
+        self.jobs = {}
+        self._ids = itertools.count(1)
+
+    def _row(self, model, values):
+        # Rows have the columns of the table, and only those.
+        row = dict((column.name, None) for column in model.__table__.columns)
+        row.update((key, value) for key, value in values.items()
+                   if key in row)
+        row['id'] = next(self._ids)
+        if not row.get('uuid'):
+            row['uuid'] = utils.generate_uuid()
+        return row
+
+    def create_device(self, values):
+        row = self._row(models.Device, values)
+        self.devices[row['uuid']] = row
+        return dict(row)
+
+    def get_device_by_uuid(self, device_uuid):
+        try:
+            return dict(self.devices[device_uuid])
+        except KeyError:
+            raise exception.DeviceNotFound(device=device_uuid)
+
+    def destroy_device(self, device_id):
+        if self.devices.pop(device_id, None) is None:
+            raise exception.DeviceNotFound(device=device_id)
+
+    def create_job(self, values):
+        row = self._row(models.Job, values)
+        self.jobs[row['uuid']] = row
+        return dict(row)
+
+    def get_job_by_uuid(self, job_uuid):
+        try:
+            return dict(self.jobs[job_uuid])
+        except KeyError:
+            raise exception.JobNotFound(job=job_uuid)
+
+    def update_jobs(self, updates):
+        for job_uuid, values in updates.items():
+            if job_uuid in self.jobs:
+                self.jobs[job_uuid].update(values)
+
+
+class DeviceJobTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DeviceJobTestCase, self).setUp()
+        self.dbapi = _FakeDBAPI()
+        for cls in (objects.Device, objects.Job):
+            patcher = mock.patch.object(cls, 'dbapi', self.dbapi)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Write every status change straight away.
+        patcher = mock.patch.object(jobs, 'STATUS_BUFFER',
+                                    jobs.JobStatusBuffer(interval=0,
+                                                         batch_size=1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.context = context.RequestContext(user='user',
+                                              tenant='project')
+        self.handler = driver.Handler()
+
+    def _submit(self, action):
+        job = objects.Job(self.context, action=action,
+                          resource_uuid=DEVICE_UUID,
+                          project_id='project', user_id='user',
+                          status=objects.Job.PENDING)
+        job.create()
+        return job.uuid
+
+    def _poll(self, job_uuid):
+        job = objects.Job.get_by_uuid(self.context, job_uuid)
+        self.assertTrue(job.finished)
+        return job
+
+    def _create_device(self):
+        device = objects.Device(self.context, uuid=DEVICE_UUID,
+                                name='device', project_id='project',
+                                user_id='user')
+        job_uuid = self._submit('device_create')
+        self.handler.device_create(self.context, 'device', DEVICE_UUID,
+                                   device, job_uuid=job_uuid)
+        return job_uuid
+
+    def test_create_writes_the_device(self):
+        job = self._poll(self._create_device())
+        self.assertEqual(objects.Job.SUCCEEDED, job.status)
+        device = objects.Device.get_by_uuid(self.context, DEVICE_UUID)
+        self.assertEqual('device', device.name)
+        self.assertEqual('project', device.project_id)
+
+    def test_delete_removes_the_device(self):
+        self._create_device()
+        job_uuid = self._submit('device_delete')
+        self.handler.device_delete(self.context, DEVICE_UUID,
+                                   job_uuid=job_uuid)
+        job = self._poll(job_uuid)
+        self.assertEqual(objects.Job.SUCCEEDED, job.status)
+        self.assertRaises(exception.DeviceNotFound,
+                          objects.Device.get_by_uuid, self.context,
+                          DEVICE_UUID)
+
+    def test_delete_of_a_missing_device_fails_the_job(self):
+        job_uuid = self._submit('device_delete')
+        self.assertRaises(exception.DeviceNotFound,
+                          self.handler.device_delete, self.context,
+                          DEVICE_UUID, job_uuid=job_uuid)
+        job = self._poll(job_uuid)
+        self.assertEqual(objects.Job.FAILED, job.status)
+        self.assertIn(DEVICE_UUID, job.status_reason)
+
+    def test_failure_is_raised_without_a_job(self):
+        self.assertRaises(exception.DeviceNotFound,
+                          self.handler.device_delete, self.context,
+                          DEVICE_UUID)
+        self.assertEqual({}, self.dbapi.jobs)
+
+    def test_job_cast_outlives_the_request_deadline(self):
+        self._create_device()
+        # The client has stopped waiting by the time the job is cast.
+        ctxt = context.RequestContext(user='user', tenant='project',
+                                      timeout=0)
+        api = conductor_api.API.__new__(conductor_api.API)
+        api._context = ctxt
+        api._client = mock.Mock()
+        job = api.device_delete_async(DEVICE_UUID)
+        cast_ctxt, method = api._client.cast.call_args[0]
+        self.assertEqual('device_delete', method)
+        self.assertIsNone(cast_ctxt.deadline)
+        self.assertTrue(ctxt.expired)
+        endpoint = rpc_service.DeadlineEndpoint(self.handler)
+        endpoint.device_delete(cast_ctxt,
+                               **api._client.cast.call_args[1])
+        self.assertEqual(objects.Job.SUCCEEDED,
+                         self._poll(job.uuid).status)
@@ -0,0 +1,76 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+import webob
+
+from iot.api import hooks
+from iot.common import context
+from iot.db import api as dbapi
+from iot.tests import base
+
+DEVICE_UUID = '0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c'
+
+
+class RouteTestCase(base.TestCase):
+
+    def test_versioned_path(self):
+        self.assertEqual('devices',
+                         hooks._route('/v1/devices/%s' % DEVICE_UUID))
+
+    def test_unversioned_path(self):
+        self.assertEqual('devices', hooks._route('/devices/%s' % DEVICE_UUID))
+        self.assertEqual('jobs', hooks._route('/jobs'))
+
+    def test_root_resources(self):
+        self.assertEqual('', hooks._route('/'))
+        self.assertEqual('v1', hooks._route('/v1/'))
+        self.assertEqual('metrics', hooks._route('/metrics'))
+
+    def test_unrouted_paths_share_a_label(self):
+        self.assertEqual('unknown', hooks._route('/%s' % DEVICE_UUID))
+        self.assertEqual('unknown', hooks._route('/v1/%s/x' % DEVICE_UUID))
+
+
+class DBSessionHookTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DBSessionHookTestCase, self).setUp()
+        patcher = mock.patch.object(dbapi, 'get_instance')
+        self.dbapi = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.context = context.RequestContext(user='user', tenant='project')
+
+    def _after(self, status):
+        state = mock.Mock()
+        state.request.context = self.context
+        state.response = webob.Response(status=status, body=b'{}')
+        hooks.DBSessionHook().after(state)
+        return state.response
+
+    def test_success_is_committed(self):
+        response = self._after(201)
+        self.dbapi.end_request.assert_called_once_with(self.context,
+                                                       failed=False)
+        self.assertEqual(201, response.status_int)
+
+    def test_failure_is_rolled_back(self):
+        self._after(404)
+        self.dbapi.end_request.assert_called_once_with(self.context,
+                                                       failed=True)
+
+    def test_failed_commit_fails_the_request(self):
+        self.dbapi.end_request.side_effect = Exception('deadlock')
+        response = self._after(201)
+        self.assertEqual(500, response.status_int)
+        self.assertEqual('Server', response.json['faultcode'])
+        self.assertNotIn('deadlock', response.json['faultstring'])
@@ -0,0 +1,71 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import mock
+
+from iot.common import parallel_utils
+from iot.conductor.handlers.common import kube_utils
+from iot.tests import base
+
+
+def _result(cmd, exit_code=0, stderr=b''):
+    result = parallel_utils.CommandResult(cmd)
+    result.exit_code = exit_code
+    result.stderr = stderr
+    return result
+
+
+class CreateManyTestCase(base.TestCase):
+
+    def setUp(self):
+        super(CreateManyTestCase, self).setUp()
+        patcher = mock.patch.object(parallel_utils, 'execute_parallel')
+        self.execute_parallel = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manifests = []
+
+        def execute_parallel(commands):
+            for cmd in commands:
+                path = cmd[-1]
+                if path.startswith('http'):
+                    self.manifests.append(path)
+                else:
+                    with open(path) as f:
+                        self.manifests.append(f.read())
+            return parallel_utils.CommandResults(
+                [_result(commands[0]),
+                 _result(commands[1], exit_code=1, stderr=b'error')])
+
+        self.execute_parallel.side_effect = execute_parallel
+
+    def test_pods_are_created_in_one_batch(self):
+        pods = [mock.Mock(manifest='pod manifest', manifest_url=None),
+                mock.Mock(manifest=None, manifest_url='http://pod.yaml')]
+        client = kube_utils.KubeClient()
+        self.assertEqual([True, False],
+                         client.pod_create_many('http://master', pods))
+        self.assertEqual(1, self.execute_parallel.call_count)
+        commands = self.execute_parallel.call_args[0][0]
+        self.assertEqual([('kubectl', 'create', '-s', 'http://master',
+                           '-f')] * 2,
+                         [cmd[:-1] for cmd in commands])
+        self.assertEqual(['pod manifest', 'http://pod.yaml'],
+                         self.manifests)
+
+    def test_services_are_created_in_one_batch(self):
+        services = [mock.Mock(manifest='service manifest',
+                              manifest_url=None)] * 2
+        client = kube_utils.KubeClient()
+        self.assertEqual([True, False],
+                         client.service_create_many('http://master',
+                                                    services))
+        self.assertEqual(1, self.execute_parallel.call_count)
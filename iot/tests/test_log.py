@@ -0,0 +1,142 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+
+import mock
+
+from iot.openstack.common import log
+from iot.tests import base
+
+
+class SamplingSetupTestCase(base.TestCase):
+
+    def _samplers(self, name):
+        return [f for f in logging.getLogger(name).filters
+                if isinstance(f, log.RateSampler)]
+
+    def _cleanup(self, name):
+        logger = logging.getLogger(name)
+        for sampler in self._samplers(name):
+            logger.removeFilter(sampler)
+
+    def test_malformed_entries_are_skipped(self):
+        self.addCleanup(self._cleanup, 'iot.tests.sampled')
+        log._setup_sampling(['iot.tests.bare', 'iot.tests.empty=',
+                             'iot.tests.text=abc', 'iot.tests.zero=0',
+                             '=5', 'iot.tests.sampled=2.5'])
+        for name in ('iot.tests.bare', 'iot.tests.empty', 'iot.tests.text',
+                     'iot.tests.zero'):
+            self.assertEqual([], self._samplers(name))
+        self.assertEqual([], self._samplers(None))
+        sampler, = self._samplers('iot.tests.sampled')
+        self.assertEqual(2.5, sampler.rate)
+
+    def test_setup_again_replaces_the_sampler(self):
+        self.addCleanup(self._cleanup, 'iot.tests.sampled')
+        log._setup_sampling(['iot.tests.sampled=1'])
+        log._setup_sampling(['iot.tests.sampled=3'])
+        sampler, = self._samplers('iot.tests.sampled')
+        self.assertEqual(3, sampler.rate)
+
+
+class _Handler(logging.Handler):
+    """Keeps the messages written, each once resume is set."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+        self.closed = False
+        self.writing = log._threading.Event()
+        self.resume = log._threading.Event()
+        self.resume.set()
+
+    def emit(self, record):
+        self.writing.set()
+        self.resume.wait(5)
+        self.messages.append(record.getMessage())
+
+    def close(self):
+        self.closed = True
+        logging.Handler.close(self)
+
+
+def _record(msg):
+    return logging.LogRecord('iot.tests', logging.INFO, __file__, 0, msg,
+                             None, None)
+
+
+class AsyncHandlerTestCase(base.TestCase):
+
+    def _handler(self, **kwargs):
+        target = _Handler()
+        handler = log.AsyncHandler([target], **kwargs)
+        self.addCleanup(handler.close)
+        return handler, target
+
+    def _overflow(self, drop_policy):
+        handler, target = self._handler(queue_size=2,
+                                        drop_policy=drop_policy)
+        # Hold the writer on the first record, then overfill the queue.
+        target.resume.clear()
+        handler.emit(_record('first'))
+        self.assertTrue(target.writing.wait(5))
+        for msg in ('second', 'third', 'fourth'):
+            handler.emit(_record(msg))
+        self.assertEqual(1, handler.dropped)
+        target.resume.set()
+        handler.flush()
+        self.assertEqual(0, handler._queue.unfinished_tasks)
+        handler.close()
+        return target.messages
+
+    def test_overflow_drops_new_records(self):
+        self.assertEqual(
+            ['first', '1 log records were dropped, the log queue was full',
+             'second', 'third'],
+            self._overflow('drop_new'))
+
+    def test_overflow_drops_oldest_records(self):
+        self.assertEqual(
+            ['first', '1 log records were dropped, the log queue was full',
+             'third', 'fourth'],
+            self._overflow('drop_oldest'))
+
+    def test_close_writes_queued_records(self):
+        handler, target = self._handler(batch_size=2)
+        msgs = ['record %d' % i for i in range(5)]
+        for msg in msgs:
+            handler.emit(_record(msg))
+        handler.close()
+        self.assertEqual(msgs, target.messages)
+        self.assertTrue(target.closed)
+        self.assertFalse(handler._writer.is_alive())
+
+    def test_flush_waits_for_queued_records(self):
+        handler, target = self._handler()
+        handler.emit(_record('first'))
+        handler.flush()
+        self.assertEqual(['first'], target.messages)
+
+    def test_closed_at_exit_once(self):
+        with mock.patch.object(log.atexit, 'register') as register:
+            handler, target = self._handler()
+            other, other_target = self._handler()
+        self.assertFalse(register.called)
+        handler.close()
+        self.assertNotIn(handler, log._async_handlers)
+        self.assertIn(other, log._async_handlers)
+        other.emit(_record('queued'))
+        log._close_async_handlers()
+        self.assertEqual(['queued'], other_target.messages)
+        self.assertTrue(other_target.closed)
+        self.assertNotIn(other, log._async_handlers)
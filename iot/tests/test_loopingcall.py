@@ -0,0 +1,152 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import functools
+
+import mock
+
+from iot.openstack.common import loopingcall
+from iot.tests import base
+
+
+class _Clock(object):
+    """A clock whose sleeps wake oversleep seconds late."""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 0.0
+        self.oversleep = oversleep
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.oversleep
+
+
+class _Task(object):
+    """Runs for the given durations, then stops the looping call."""
+
+    def __init__(self, clock, durations):
+        self.clock = clock
+        self.durations = list(durations)
+        self.starts = []
+
+    def __call__(self):
+        self.starts.append(self.clock())
+        self.clock.now += self.durations.pop(0)
+        if not self.durations:
+            raise loopingcall.LoopingCallDone()
+
+    def run(self):
+        pass
+
+
+def _function():
+    pass
+
+
+class FixedIntervalLoopingCallTestCase(base.TestCase):
+
+    def setUp(self):
+        super(FixedIntervalLoopingCallTestCase, self).setUp()
+        self.metrics = {}
+        for attrname in ('RUN_TIME', 'LATENESS', 'COALESCED'):
+            self.metrics[attrname] = self._patch(loopingcall, attrname)
+        self.log = self._patch(loopingcall, 'LOG')
+
+    def _patch(self, obj, attrname, **kwargs):
+        patcher = mock.patch.object(obj, attrname, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _run(self, durations, interval=10, anchored=True, oversleep=0.0,
+             **kwargs):
+        clock = _Clock(oversleep)
+        # The loop runs in the test's thread, sleeping on the fake clock.
+        greenthread = self._patch(loopingcall, 'greenthread')
+        greenthread.spawn_n.side_effect = lambda f: f()
+        greenthread.sleep.side_effect = clock.sleep
+        self._patch(loopingcall, '_monotonic', new=clock)
+        self._patch(loopingcall, '_ts', new=clock)
+        task = _Task(clock, durations)
+        timer = loopingcall.FixedIntervalLoopingCall(task)
+        self.assertTrue(timer.start(interval, anchored=anchored,
+                                    **kwargs).wait())
+        return task
+
+    def _observed(self, attrname):
+        metric = self.metrics[attrname].labels.return_value
+        return [c[0][0] for c in metric.observe.call_args_list]
+
+    def test_anchored_runs_do_not_drift(self):
+        task = self._run([0.5, 2, 0.1, 1, 0.5], oversleep=0.1)
+        # Late wake-ups are made up for, not accumulated.
+        self.assertEqual([0, 10.1, 20.1, 30.1, 40.1],
+                         [round(start, 6) for start in task.starts])
+        self.assertFalse(self.metrics['COALESCED'].labels.called)
+        self.assertFalse(self.log.warn.called)
+
+    def test_not_anchored_runs_drift(self):
+        task = self._run([0.5, 2, 0.1], anchored=False, oversleep=0.1)
+        self.assertEqual([0, 10.1, 20.2],
+                         [round(start, 6) for start in task.starts])
+
+    def test_anchored_overrun_is_coalesced(self):
+        task = self._run([1, 1, 25, 1, 1])
+        # The run due at 30 is skipped, the one due at 40 runs late.
+        self.assertEqual([0, 10, 20, 45, 50], task.starts)
+        self.assertEqual([0, 0, 0, 5, 0], self._observed('LATENESS'))
+        # The last run stopped the loop before its run time was recorded.
+        self.assertEqual([1, 1, 25, 1], self._observed('RUN_TIME'))
+        coalesced = self.metrics['COALESCED'].labels
+        coalesced.assert_called_once_with('_Task')
+        coalesced.return_value.inc.assert_called_once_with(1)
+        self.assertEqual(1, self.log.warn.call_count)
+        values = self.log.warn.call_args[0][1]
+        self.assertEqual({'func_name': '_Task', 'delay': 15, 'missed': 2},
+                         values)
+
+    def test_anchored_short_overrun_runs_at_once(self):
+        task = self._run([1, 12, 1, 1])
+        # Only the run due at 10 overran, the next one is merely late.
+        self.assertEqual([0, 10, 22, 30], task.starts)
+        self.assertFalse(self.metrics['COALESCED'].labels.called)
+        self.assertEqual(1, self.log.warn.call_args[0][1]['missed'])
+
+    def test_initial_delay(self):
+        task = self._run([1, 1], initial_delay=5)
+        self.assertEqual([5, 15], task.starts)
+
+    def test_metrics_named(self):
+        self._run([1], name='sync')
+        for attrname in ('RUN_TIME', 'LATENESS'):
+            self.metrics[attrname].labels.assert_called_once_with('sync')
+
+
+class FuncNameTestCase(base.TestCase):
+
+    def test_function(self):
+        self.assertEqual('_function', loopingcall._func_name(_function))
+
+    def test_bound_method(self):
+        self.assertEqual('_Task.run', loopingcall._func_name(
+            _Task(None, []).run))
+
+    def test_partial(self):
+        task = _Task(None, [])
+        self.assertEqual('_Task.run', loopingcall._func_name(
+            functools.partial(functools.partial(task.run), 1)))
+
+    def test_callable_named_after_its_class(self):
+        names = set(loopingcall._func_name(_Task(None, []))
+                    for _i in range(2))
+        self.assertEqual(set(['_Task']), names)
@@ -0,0 +1,198 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import base64
+import datetime
+
+import mock
+import msgpack
+
+from iot.common import context
+from iot.common import exception
+from iot import objects
+from iot.objects import base as objects_base
+from iot.objects import utils as obj_utils
+from iot.tests import base
+
+DB_DEVICE = {'id': 1,
+             'uuid': u'0ec2ff9b-2e36-4ab5-a1c6-fd1b6e2a8a5c',
+             'name': u'device',
+             'project_id': u'project',
+             'user_id': u'user',
+             'image_id': None,
+             'created_at': datetime.datetime(2015, 1, 1, 12, 0, 0),
+             'updated_at': None}
+
+
+class DeviceRowsTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DeviceRowsTestCase, self).setUp()
+        self.context = context.RequestContext(user='user', tenant='project')
+
+    def test_db_columns_cover_the_stored_fields(self):
+        self.assertEqual(set(objects.Device.fields) - set(['image_id']),
+                         set(objects.Device.db_columns))
+
+    def test_rows_match_db_objects(self):
+        columns = objects.Device.db_columns
+        row = tuple(DB_DEVICE[column] for column in columns)
+        from_row, = objects_base.objects_from_rows(objects.Device,
+                                                   self.context, columns,
+                                                   [row])
+        from_db = objects.Device._from_db_object(
+            objects.Device(self.context), DB_DEVICE)
+        for column in columns:
+            self.assertEqual(getattr(from_db, column),
+                             getattr(from_row, column), column)
+        self.assertEqual(set(), from_row.obj_what_changed())
+
+
+class ObjectBatchTestCase(base.TestCase):
+
+    def setUp(self):
+        super(ObjectBatchTestCase, self).setUp()
+        self.context = context.RequestContext(user='user', tenant='project')
+        patcher = mock.patch.object(objects_base.IoTObject,
+                                    'indirection_api')
+        self.indirection_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_devices(self, count):
+        with objects_base.ObjectBatch() as batch:
+            for _i in range(count):
+                objects.Device.get_by_uuid(self.context, DB_DEVICE['uuid'])
+        return batch.calls
+
+    def test_errors_keep_their_class(self):
+        self.indirection_api.object_batch_action.return_value = [
+            [False, 'DeviceNotFound', 'Device not found.',
+             exception.__name__],
+            [False, 'Unexpected', 'Oops.', 'iot.conductor.handlers.x']]
+        not_found, unexpected = self._get_devices(2)
+        self.assertRaises(exception.DeviceNotFound, not_found.result)
+        self.assertRaises(exception.ObjectActionError, unexpected.result)
+
+    def test_calls_without_a_reply_fail(self):
+        self.indirection_api.object_batch_action.return_value = [
+            [True, None, 'device']]
+        first, second = self._get_devices(2)
+        self.assertEqual('device', first.result())
+        self.assertTrue(second.failed)
+        self.assertRaises(exception.ObjectActionError, second.result)
+
+
+class PackedSerializerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(PackedSerializerTestCase, self).setUp()
+        self.context = context.RequestContext(user='user', tenant='project')
+        columns = objects.Device.db_columns
+        rows = [tuple(dict(DB_DEVICE, id=i, name=u'device-%d' % i)[column]
+                      for column in columns) for i in range(3)]
+        self.devices = objects.DeviceList._from_db_rows(self.context,
+                                                        columns, rows)
+
+    def test_round_trip(self):
+        serializer = objects_base.IoTObjectSerializer(packed=True)
+        primitive = serializer.serialize_entity(self.context, self.devices)
+        self.assertEqual([objects_base.PACKED_KEY], list(primitive))
+        result = serializer.deserialize_entity(self.context, primitive)
+        self.assertIsInstance(result, objects.DeviceList)
+        self.assertEqual(len(self.devices), len(result))
+        for expected, device in zip(self.devices, result):
+            self.assertIsInstance(device, objects.Device)
+            for column in objects.Device.db_columns:
+                self.assertEqual(getattr(expected, column),
+                                 getattr(device, column))
+            self.assertEqual(set(), device.obj_what_changed())
+
+    def test_list_members_are_packed_as_objects(self):
+        serializer = objects_base.IoTObjectSerializer(packed=True)
+        primitive = serializer.serialize_entity(self.context, self.devices)
+        classes, _body = msgpack.unpackb(
+            base64.b64decode(primitive[objects_base.PACKED_KEY]), raw=False)
+        self.assertEqual(['DeviceList', 'Device'],
+                         [objname for objname, _v, _f in classes])
+
+    def test_requests_are_packed_once_the_peer_replied_packed(self):
+        self.addCleanup(objects_base._packing_peers.discard, 'topic')
+        client = objects_base.IoTObjectSerializer(packed=True, peer='topic')
+        server = objects_base.IoTObjectSerializer(packed=True)
+        device = self.devices[0]
+        request = client.serialize_entity(self.context, device)
+        self.assertNotIn(objects_base.PACKED_KEY, request)
+        self.context.accepts_packed_objects = True
+        reply = server.serialize_entity(self.context, device)
+        del self.context.accepts_packed_objects
+        client.deserialize_entity(self.context, reply)
+        request = client.serialize_entity(self.context, device)
+        self.assertIn(objects_base.PACKED_KEY, request)
+
+
+class ObjectChangesTestCase(base.TestCase):
+
+    def setUp(self):
+        super(ObjectChangesTestCase, self).setUp()
+        self.use_object_registry()
+
+        class _Thing(objects_base.IoTObject):
+            fields = {
+                'id': int,
+                'name': obj_utils.str_or_none,
+                'size': int,
+                }
+
+        self.thing_class = _Thing
+
+    def test_fields_are_kept_in_slots(self):
+        thing = self.thing_class(None, id=1)
+        self.assertFalse(hasattr(thing, '__dict__'))
+        self.assertRaises(AttributeError, setattr, thing, 'other', 1)
+
+    def test_what_changed(self):
+        thing = self.thing_class(None, id=1, name='thing')
+        self.assertEqual(set(['id', 'name']), thing.obj_what_changed())
+        thing.obj_reset_changes()
+        self.assertEqual(set(), thing.obj_what_changed())
+        thing.size = 2
+        self.assertEqual(set(['size']), thing.obj_what_changed())
+
+    def test_nothing_changed_without_a_mask(self):
+        thing = self.thing_class.__new__(self.thing_class)
+        self.assertEqual(set(), thing.obj_what_changed())
+        thing.obj_reset_changes(['id'])
+        self.assertEqual(set(), thing.obj_what_changed())
+
+    def test_reset_some_changes(self):
+        thing = self.thing_class(None, id=1, name='thing', size=2)
+        thing.obj_reset_changes(['name', 'unknown'])
+        self.assertEqual(set(['id', 'size']), thing.obj_what_changed())
+        thing.obj_reset_changes(['id', 'size'])
+        self.assertEqual(set(), thing.obj_what_changed())
+
+    def test_changes_survive_copies(self):
+        thing = self.thing_class(None, id=1, name='thing')
+        thing.obj_reset_changes(['id'])
+        self.assertEqual(set(['name']), thing.obj_clone().obj_what_changed())
+        copy = objects_base.IoTObject.obj_from_primitive(
+            thing.obj_to_primitive())
+        self.assertIsInstance(copy, self.thing_class)
+        self.assertEqual(set(['name']), copy.obj_what_changed())
+
+    def test_attr_is_set(self):
+        thing = self.thing_class(None, id=1)
+        self.assertTrue(thing.obj_attr_is_set('id'))
+        self.assertFalse(thing.obj_attr_is_set('name'))
+        thing.name = None
+        self.assertTrue(thing.obj_attr_is_set('name'))
+        self.assertRaises(AttributeError, thing.obj_attr_is_set, 'other')
@@ -0,0 +1,86 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import eventlet
+from oslo_concurrency import processutils
+
+from iot.common import parallel_utils
+from iot.tests import base
+
+
+class BoundedOutputTestCase(base.TestCase):
+
+    def test_keeps_the_beginning_and_the_end(self):
+        output = parallel_utils.BoundedOutput(8)
+        for chunk in (b'abc', b'defgh', b'ijklmn'):
+            output.write(chunk)
+        self.assertTrue(output.truncated)
+        self.assertEqual(6, output.dropped)
+        self.assertEqual(b'abcd\n... [6 bytes truncated] ...\nklmn',
+                         output.getvalue())
+
+    def test_short_output_is_kept_whole(self):
+        output = parallel_utils.BoundedOutput(8)
+        output.write(b'abc')
+        self.assertFalse(output.truncated)
+        self.assertEqual(b'abc', output.getvalue())
+
+
+class ExecuteParallelTestCase(base.TestCase):
+
+    def test_results_are_in_the_order_of_the_commands(self):
+        results = parallel_utils.execute_parallel(
+            [('sh', '-c', 'sleep 0.2; echo first'), ('echo', 'second')],
+            max_workers=2)
+        self.assertEqual([b'first\n', b'second\n'],
+                         [result.stdout for result in results])
+        self.assertEqual([], results.failed)
+
+    def test_failures_are_collected(self):
+        results = parallel_utils.execute_parallel(
+            [('true',), ('sh', '-c', 'echo oops >&2; exit 3'),
+             ('/nonexistent/command',), ('true',)])
+        self.assertEqual(4, len(results))
+        self.assertEqual(2, len(results.succeeded))
+        failed = results.failed
+        self.assertEqual([results[1], results[2]], failed)
+        self.assertEqual(3, failed[0].exit_code)
+        self.assertEqual(b'oops\n', failed[0].stderr)
+        self.assertIsNotNone(failed[1].error)
+        self.assertRaises(processutils.ProcessExecutionError, results.check)
+
+    def test_input_is_written_to_the_command(self):
+        result = parallel_utils.run_command(('cat',), process_input=b'data')
+        self.assertTrue(result.succeeded)
+        self.assertEqual(b'data', result.stdout)
+
+
+class RunCommandTimeoutTestCase(base.TestCase):
+
+    def test_timed_out_command_is_killed(self):
+        result = parallel_utils.run_command(
+            ('sh', '-c', 'sleep 10 & sleep 10'), timeout=0.2)
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.succeeded)
+        self.assertIsNotNone(result.exit_code)
+        self.assertLess(result.duration, 5)
+
+    def test_timeout_of_the_caller_is_raised(self):
+        timer = eventlet.Timeout(0.2)
+        try:
+            parallel_utils.run_command(('sleep', '10'), timeout=5)
+        except eventlet.Timeout as e:
+            self.assertIs(timer, e)
+        else:
+            self.fail('the timeout of the caller was swallowed')
+        finally:
+            timer.cancel()
@@ -0,0 +1,135 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import mock
+
+from iot.openstack.common import periodic_task
+from iot.openstack.common import service
+from iot.tests import base
+
+
+class _ThreadGroup(object):
+    """A thread group running nothing until told to."""
+
+    def __init__(self):
+        self.pool = mock.Mock()
+        self.pool.free.return_value = True
+        self.threads = []
+
+    def add_thread(self, callback, *args):
+        self.threads.append((callback, args))
+
+    def run_all(self):
+        threads, self.threads = self.threads, []
+        for callback, args in threads:
+            callback(*args)
+
+
+class PeriodicTasksTestCase(base.TestCase):
+
+    def setUp(self):
+        super(PeriodicTasksTestCase, self).setUp()
+        patcher = mock.patch.object(periodic_task, 'time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time.time.return_value = 1000.0
+        # No jitter.
+        patcher = mock.patch.object(periodic_task, 'random')
+        patcher.start().random.return_value = 0.0
+        self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def _tasks(self, **tasks):
+        """Return a PeriodicTasks class, with a task per keyword."""
+        calls = self.calls
+        namespace = {}
+        for name, kwargs in tasks.items():
+
+            def task(self, context, name=name):
+                calls.append((name, periodic_task.time.time()))
+            task.__name__ = name
+            namespace[name] = periodic_task.periodic_task(**kwargs)(task)
+        return type('_Tasks', (periodic_task.PeriodicTasks,), namespace)
+
+    def _new(self, **tasks):
+        return self._tasks(**tasks)(thread_group=_ThreadGroup())
+
+    def _tick(self, tasks, now):
+        self.time.time.return_value = now
+        return tasks.run_periodic_tasks(None, raise_on_error=True)
+
+    def test_tasks_run_at_their_spacing(self):
+        tasks = self._new(task=dict(spacing=10))
+        self.assertEqual(10, self._tick(tasks, 1000.0))
+        self.assertEqual([], self.calls)
+        self.assertEqual(10, self._tick(tasks, 1010.0))
+        self.assertEqual(5, self._tick(tasks, 1015.0))
+        self._tick(tasks, 1020.0)
+        self.assertEqual([('task', 1010.0), ('task', 1020.0)], self.calls)
+
+    def test_run_immediately(self):
+        tasks = self._new(now=dict(spacing=10, run_immediately=True),
+                          later=dict(spacing=10))
+        self._tick(tasks, 1000.0)
+        self.assertEqual([('now', 1000.0)], self.calls)
+
+    def test_due_tasks_run_in_the_order_they_were_due(self):
+        tasks = self._new(slow=dict(spacing=5), fast=dict(spacing=3))
+        self._tick(tasks, 1006.0)
+        self.assertEqual(['fast', 'slow'],
+                         [name for name, _when in self.calls])
+        stats = tasks.periodic_task_stats()
+        self.assertEqual(3.0, stats['fast']['last_lateness'])
+        self.assertEqual(1.0, stats['slow']['last_lateness'])
+
+    def test_running_task_is_skipped(self):
+        group = _ThreadGroup()
+        tasks = self._tasks(task=dict(spacing=10))(thread_group=group)
+        tasks.run_periodic_tasks(None)
+        self.time.time.return_value = 1010.0
+        tasks.run_periodic_tasks(None)
+        self.assertEqual(1, len(group.threads))
+        self.time.time.return_value = 1020.0
+        tasks.run_periodic_tasks(None)
+        self.assertEqual(1, len(group.threads))
+        self.assertEqual(1, tasks.periodic_task_stats()['task']['skipped'])
+        group.run_all()
+        self.time.time.return_value = 1030.0
+        tasks.run_periodic_tasks(None)
+        self.assertEqual(1, len(group.threads))
+
+    def test_stop_stops_the_thread_group_created_for_the_tasks(self):
+        with mock.patch.object(periodic_task.threadgroup,
+                               'ThreadGroup') as thread_group:
+            tasks = self._tasks(task=dict(spacing=10))()
+            tasks.stop_periodic_tasks()
+        thread_group.return_value.stop.assert_called_once_with(False)
+
+    def test_stop_leaves_a_thread_group_passed_in(self):
+        group = mock.Mock()
+        tasks = self._tasks(task=dict(spacing=10))(thread_group=group)
+        tasks.stop_periodic_tasks()
+        self.assertFalse(group.stop.called)
+
+    def test_service_stop_stops_the_tasks(self):
+        tasks_class = self._tasks(task=dict(spacing=10))
+
+        class _Service(service.Service, tasks_class):
+            def __init__(self):
+                service.Service.__init__(self)
+                tasks_class.__init__(self)
+
+        with mock.patch.object(periodic_task.threadgroup,
+                               'ThreadGroup') as thread_group:
+            svc = _Service()
+        svc.stop()
+        thread_group.return_value.stop.assert_called_once_with(False)
@@ -0,0 +1,82 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import eventlet
+from eventlet import tpool
+
+from iot.common import profiler
+from iot.tests import base
+
+
+def _parked(event):
+    event.wait()
+
+
+def _green_parked():
+    eventlet.sleep(10)
+
+
+def _short_lived():
+    eventlet.sleep(0.001)
+
+
+class StackSamplerTestCase(base.TestCase):
+
+    def _stacks(self, sampler, name):
+        return [stack for stack in sampler.counts
+                if '%s (' % name in stack]
+
+    def test_samples_native_threads(self):
+        event = profiler._threading.Event()
+        thread = profiler._threading.Thread(target=_parked, args=(event,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(event.set)
+        sampler = profiler.StackSampler(0.001)
+        sampler.sample()
+        sampler.sample()
+        self.assertEqual(2, sampler.samples)
+        stacks = self._stacks(sampler, '_parked')
+        self.assertEqual(1, len(stacks))
+        self.assertEqual(2, sampler.counts[stacks[0]])
+        # Outermost frame first.
+        self.assertTrue(stacks[0].endswith(')'))
+        self.assertLess(stacks[0].index('run ('),
+                        stacks[0].index('_parked ('))
+
+    def test_samples_waiting_green_threads(self):
+        parked = eventlet.spawn(_green_parked)
+        self.addCleanup(parked.kill)
+        eventlet.sleep(0)
+        sampler = profiler.StackSampler(0.001, greenlets=True)
+        sampler.start_tracking()
+        try:
+            sampler.sample()
+        finally:
+            sampler.stop_tracking()
+        self.assertEqual(1, len(self._stacks(sampler, '_green_parked')))
+
+    def test_green_threads_come_and_go_while_sampling(self):
+        sampler = profiler.StackSampler(0.0001, greenlets=True)
+        sampler.start_tracking()
+        try:
+            sampling = eventlet.spawn(tpool.execute, sampler.run, 0.3)
+            while not sampling.dead:
+                pool = [eventlet.spawn(_short_lived) for _i in range(100)]
+                for thread in pool:
+                    thread.wait()
+            counts = sampling.wait()
+        finally:
+            sampler.stop_tracking()
+        self.assertTrue(sampler.samples > 1)
+        self.assertTrue(self._stacks(sampler, '_short_lived'))
+        self.assertIs(sampler.counts, counts)
@@ -0,0 +1,187 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import itertools
+import time
+
+import mock
+from oslo.config import cfg
+import sqlalchemy
+
+from iot.common import context
+from iot.common import exception
+from iot.db import query_stats
+from iot.db.sqlalchemy import api as sa_api
+from iot.tests import base
+
+_INSERT = 'INSERT INTO devices (name) VALUES (?)'
+_SELECT = 'SELECT name FROM devices WHERE name = ?'
+
+
+class _Dialect(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Connection(object):
+
+    def __init__(self, dialect):
+        self.dialect = _Dialect(dialect)
+
+
+class StatementsTestCase(base.TestCase):
+    """The statement events, on an in-memory sqlite database."""
+
+    def setUp(self):
+        super(StatementsTestCase, self).setUp()
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.engine.execute('CREATE TABLE devices (name VARCHAR(36))')
+        sa_api._listen(self.engine)
+        self.ctxt = context.RequestContext(request_id='req-1')
+        self._patch(context, 'get_current', return_value=self.ctxt)
+        # Every statement takes exactly one second.
+        self.clock = self._patch(sa_api, 'time')
+        self.clock.time.side_effect = itertools.count(1000.0)
+        self.log = self._patch(sa_api, 'LOG')
+        self.stats_log = self._patch(query_stats, 'LOG')
+
+    def _patch(self, obj, attrname, **kwargs):
+        patcher = mock.patch.object(obj, attrname, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value, group='database')
+        self.addCleanup(cfg.CONF.clear_override, name, group='database')
+
+    def test_statements_are_counted(self):
+        self.engine.execute(_INSERT, 'one')
+        self.engine.execute(_INSERT, 'two')
+        self.engine.execute(_SELECT, 'one').fetchall()
+        stats = self.ctxt.query_stats
+        self.assertEqual(3, stats.count)
+        self.assertEqual(3.0, stats.time)
+        # sqlite does not count the rows of a SELECT.
+        self.assertEqual(2, stats.rows)
+        self.assertEqual(2, stats.statements[_INSERT])
+        self.assertEqual(1, stats.statements[_SELECT])
+
+    def test_statements_without_request(self):
+        context.get_current.return_value = None
+        self.engine.execute(_INSERT, 'one')
+        self.assertIsNone(getattr(self.ctxt, 'query_stats', None))
+
+    def test_repeated_statement_flagged_once(self):
+        self._override('repeated_query_threshold', 2)
+        for name in ('one', 'two', 'three'):
+            self.engine.execute(_INSERT, name)
+        self.assertEqual(1, self.stats_log.warn.call_count)
+        values = self.stats_log.warn.call_args[0][1]
+        self.assertEqual(2, values['runs'])
+        self.assertEqual('req-1', values['request'])
+        self.assertEqual(_INSERT, values['statement'])
+
+    def test_slow_select_is_explained(self):
+        self.engine.execute(_SELECT, 'one').fetchall()
+        self.assertEqual(1, self.log.warn.call_count)
+        values = self.log.warn.call_args[0][1]
+        self.assertEqual(1.0, values['duration'])
+        self.assertEqual('req-1', values['request'])
+        self.assertEqual(_SELECT, values['statement'])
+        self.assertIn('Query plan:', values['plan'])
+        self.assertIn('devices', values['plan'])
+        # The plan is not run through the events.
+        self.assertEqual(1, self.ctxt.query_stats.count)
+
+    def test_slow_insert_is_not_explained(self):
+        self.engine.execute(_INSERT, 'one')
+        values = self.log.warn.call_args[0][1]
+        self.assertEqual('', values['plan'])
+
+    def test_explain_disabled(self):
+        self._override('slow_query_explain', False)
+        self.engine.execute(_SELECT, 'one').fetchall()
+        self.assertEqual('', self.log.warn.call_args[0][1]['plan'])
+
+    def test_slow_query_log_disabled(self):
+        self._override('slow_query_threshold', 0)
+        self.engine.execute(_SELECT, 'one').fetchall()
+        self.assertFalse(self.log.warn.called)
+
+    def test_fast_statement_not_logged(self):
+        self._override('slow_query_threshold', 2)
+        self.engine.execute(_SELECT, 'one').fetchall()
+        self.assertFalse(self.log.warn.called)
+
+    def test_statement_past_deadline_refused(self):
+        self.ctxt.deadline = time.time() - 1
+        self.assertRaises(exception.DeadlineExceeded,
+                          self.engine.execute, _INSERT, 'one')
+        self.assertIsNone(getattr(self.ctxt, 'query_stats', None))
+        self.ctxt.deadline = None
+        self.assertEqual(
+            [], self.engine.execute('SELECT name FROM devices').fetchall())
+
+    def test_statement_within_deadline_runs_unchanged(self):
+        self.ctxt.set_timeout(60)
+        self.engine.execute(_INSERT, 'one')
+        self.assertEqual(1, self.ctxt.query_stats.statements[_INSERT])
+
+
+class DeadlineHintTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DeadlineHintTestCase, self).setUp()
+        self.ctxt = context.RequestContext(request_id='req-1')
+        patcher = mock.patch.object(context, 'get_current',
+                                    return_value=self.ctxt)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enforce(self, statement, dialect='mysql'):
+        return sa_api._enforce_deadline(_Connection(dialect), None,
+                                        statement, ('one',), None, False)
+
+    def test_select_bounded_by_the_deadline(self):
+        self.ctxt.set_timeout(2)
+        statement, parameters = self._enforce(
+            '  select name from devices where name = %s')
+        prefix = 'SELECT /*+ MAX_EXECUTION_TIME('
+        self.assertTrue(statement.startswith(prefix))
+        hint, rest = statement[len(prefix):].split(') */', 1)
+        self.assertTrue(1000 < int(hint) <= 2000)
+        self.assertEqual(' name from devices where name = %s', rest)
+        self.assertEqual(('one',), parameters)
+
+    def test_hint_at_least_one_millisecond(self):
+        patcher = mock.patch.object(context, 'time_remaining',
+                                    return_value=0.0001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        statement, _params = self._enforce('SELECT 1')
+        self.assertEqual('SELECT /*+ MAX_EXECUTION_TIME(1) */ 1', statement)
+
+    def test_writes_not_hinted(self):
+        self.ctxt.set_timeout(2)
+        statement = 'UPDATE devices SET name = %s'
+        self.assertEqual((statement, ('one',)), self._enforce(statement))
+
+    def test_other_databases_not_hinted(self):
+        self.ctxt.set_timeout(2)
+        statement = 'SELECT name FROM devices'
+        self.assertEqual((statement, ('one',)),
+                         self._enforce(statement, 'sqlite'))
+
+    def test_no_deadline(self):
+        statement = 'SELECT name FROM devices'
+        self.assertEqual((statement, ('one',)), self._enforce(statement))
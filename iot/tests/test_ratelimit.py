@@ -0,0 +1,94 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+
+from iot.common import ratelimit
+from iot.tests import base
+
+NOW = 1420070400.0
+
+
+class _FakeMemcache(object):
+    """The compare-and-set calls of a memcache.Client, kept in memory."""
+
+    def __init__(self):
+        self.values = {}
+        self.versions = {}
+        self._seen = {}
+
+    def gets(self, key):
+        self._seen[key] = self.versions.get(key)
+        return self.values.get(key)
+
+    def add(self, key, value, ttl):
+        if key in self.values:
+            return False
+        self.values[key] = value
+        self.versions[key] = 1
+        return True
+
+    def cas(self, key, value, ttl):
+        if self._seen.get(key) != self.versions.get(key):
+            return False
+        self.values[key] = value
+        self.versions[key] += 1
+        return True
+
+
+class MemoryStoreTestCase(base.TestCase):
+
+    def test_burst_then_refill(self):
+        store = ratelimit.MemoryStore()
+        for _i in range(3):
+            self.assertEqual(0, store.consume('key', 2.0, 3, now=NOW))
+        self.assertAlmostEqual(0.5, store.consume('key', 2.0, 3, now=NOW))
+        self.assertEqual(0, store.consume('key', 2.0, 3, now=NOW + 0.5))
+
+    def test_keys_have_separate_buckets(self):
+        store = ratelimit.MemoryStore()
+        self.assertEqual(0, store.consume('a', 1.0, 1, now=NOW))
+        self.assertNotEqual(0, store.consume('a', 1.0, 1, now=NOW))
+        self.assertEqual(0, store.consume('b', 1.0, 1, now=NOW))
+
+
+class MemcachedStoreTestCase(base.TestCase):
+
+    def setUp(self):
+        super(MemcachedStoreTestCase, self).setUp()
+        self.client = _FakeMemcache()
+        patcher = mock.patch.object(ratelimit, 'memcache')
+        patcher.start().Client.return_value = self.client
+        self.addCleanup(patcher.stop)
+
+    def test_buckets_are_shared(self):
+        first = ratelimit.MemcachedStore()
+        second = ratelimit.MemcachedStore()
+        self.assertEqual(0, first.consume('key', 1.0, 2, now=NOW))
+        self.assertEqual(0, second.consume('key', 1.0, 2, now=NOW))
+        self.assertNotEqual(0, first.consume('key', 1.0, 2, now=NOW))
+        self.assertNotEqual(0, second.consume('key', 1.0, 2, now=NOW))
+
+    def test_lost_races_are_refused(self):
+        store = ratelimit.MemcachedStore()
+        self.assertEqual(0, store.consume('key', 1.0, 10, now=NOW))
+        # Another worker updates the bucket between every gets and cas.
+        self.client.cas = mock.Mock(return_value=False)
+        self.assertEqual(1.0, store.consume('key', 1.0, 10, now=NOW))
+        self.assertEqual(store.cas_retries, self.client.cas.call_count)
+
+    def test_unreachable_memcached_uses_local_buckets(self):
+        store = ratelimit.MemcachedStore()
+        self.client.add = mock.Mock(return_value=False)
+        self.assertEqual(0, store.consume('key', 1.0, 1, now=NOW))
+        self.assertNotEqual(0, store.consume('key', 1.0, 1, now=NOW))
+        self.assertEqual({}, self.client.values)
@@ -0,0 +1,41 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import mock
+from oslo.config import cfg
+
+from iot.openstack.common import log as logging
+from iot.openstack.common import service
+from iot.tests import base
+
+
+class LauncherTestCase(base.TestCase):
+
+    def setUp(self):
+        super(LauncherTestCase, self).setUp()
+        patcher = mock.patch.object(service.eventlet_backdoor,
+                                    'initialize_if_enabled',
+                                    return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(cfg.CONF, 'reload_config_files')
+        self.reload_config_files = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_restart(self):
+        launcher = service.Launcher()
+        launcher.services = mock.Mock()
+        generation = logging._format_generation
+        launcher.restart()
+        self.reload_config_files.assert_called_once_with()
+        self.assertEqual(generation + 1, logging._format_generation)
+        launcher.services.restart.assert_called_once_with()
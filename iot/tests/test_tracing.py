@@ -0,0 +1,142 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import threading
+
+import mock
+
+from iot.common import tracing
+from iot.tests import base
+
+_TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+_PARENT_ID = '00f067aa0ba902b7'
+
+
+class _Context(object):
+    trace = None
+
+
+class TraceContextTestCase(base.TestCase):
+
+    def test_header_round_trip(self):
+        header = '00-%s-%s-01' % (_TRACE_ID, _PARENT_ID)
+        trace = tracing.TraceContext.from_header(header)
+        self.assertEqual(_TRACE_ID, trace.trace_id)
+        self.assertEqual(_PARENT_ID, trace.span_id)
+        self.assertEqual(header, trace.to_header())
+
+    def test_header_without_span(self):
+        trace = tracing.TraceContext.from_header(
+            '00-%s-%s-01' % (_TRACE_ID, '0' * 16))
+        self.assertIsNone(trace.span_id)
+        self.assertEqual('00-%s-%s-01' % (_TRACE_ID, '0' * 16),
+                         trace.to_header())
+
+    def test_malformed_headers(self):
+        for header in (None, '', 'garbage', '00-%s-01' % _TRACE_ID,
+                       '00-%s-%s-01' % (_TRACE_ID[:-1], _PARENT_ID),
+                       '00-%s-%s-01' % ('x' * 32, _PARENT_ID),
+                       '00-%s-%s-01' % ('0' * 32, _PARENT_ID)):
+            self.assertIsNone(tracing.TraceContext.from_header(header))
+
+
+class SpanTestCase(base.TestCase):
+
+    def setUp(self):
+        super(SpanTestCase, self).setUp()
+        self.exported = []
+        exporter = mock.Mock()
+        exporter.export.side_effect = (
+            lambda data: self.exported.append(json.loads(data)))
+        patcher = mock.patch.object(tracing, '_get_exporter',
+                                    return_value=exporter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ctxt = _Context()
+        self.root = tracing.start_request(
+            self.ctxt, '00-%s-%s-01' % (_TRACE_ID, _PARENT_ID),
+            sample_rate=1.0)
+
+    def _exported(self, name):
+        spans = [data for data in self.exported if data['name'] == name]
+        self.assertEqual(1, len(spans))
+        return spans[0]
+
+    def test_request_joins_the_client_trace(self):
+        self.assertEqual(_TRACE_ID, self.root.trace_id)
+        self.assertEqual(_PARENT_ID, self.root.parent_id)
+        self.assertEqual('00-%s-%s-01' % (_TRACE_ID, self.root.span_id),
+                         self.ctxt.trace.to_header())
+
+    def test_untraced_request(self):
+        ctxt = _Context()
+        self.assertIsNone(tracing.start_request(ctxt, sample_rate=0))
+        with tracing.span('rpc.call', ctxt) as span:
+            self.assertIsNone(span)
+        self.assertIsNone(ctxt.trace)
+
+    def test_spans_nest(self):
+        with tracing.span('outer', self.ctxt) as outer:
+            self.assertEqual(self.root.span_id, outer.parent_id)
+            with tracing.span('inner', self.ctxt) as inner:
+                self.assertEqual(outer.span_id, inner.parent_id)
+                self.assertIn(inner.span_id, self.ctxt.trace.to_header())
+            self.assertIn(outer.span_id, self.ctxt.trace.to_header())
+            tracing.record_span('db.query', 0.0, ctxt=self.ctxt)
+        self.assertIn(self.root.span_id, self.ctxt.trace.to_header())
+        self.assertEqual(self.root.span_id, self.ctxt.trace.span_id)
+        self.assertEqual(outer.span_id,
+                         self._exported('inner')['parent_id'])
+        self.assertEqual(outer.span_id,
+                         self._exported('db.query')['parent_id'])
+        self.assertEqual(self.root.span_id,
+                         self._exported('outer')['parent_id'])
+
+    def test_span_closes_on_error(self):
+        def fail():
+            with tracing.span('failing', self.ctxt):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual('ValueError', self._exported('failing')['tags'][
+            'error'])
+        self.assertIn(self.root.span_id, self.ctxt.trace.to_header())
+
+    def test_threads_sharing_a_context_keep_their_spans(self):
+        opened = threading.Event()
+        release = threading.Event()
+        seen = {}
+
+        def first():
+            with tracing.span('first', self.ctxt) as span:
+                seen['first'] = span
+                opened.set()
+                release.wait(5)
+                seen['first_header'] = self.ctxt.trace.to_header()
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        self.assertTrue(opened.wait(5))
+        # The span open in the other thread is not the parent of ours.
+        self.assertNotIn(seen['first'].span_id,
+                         self.ctxt.trace.to_header())
+        with tracing.span('second', self.ctxt) as second:
+            self.assertEqual(self.root.span_id, second.parent_id)
+            release.set()
+            thread.join(5)
+            self.assertIn(second.span_id, self.ctxt.trace.to_header())
+        self.assertIn(seen['first'].span_id, seen['first_header'])
+        self.assertEqual(self.root.span_id,
+                         self._exported('first')['parent_id'])
+        self.assertEqual(self.root.span_id,
+                         self._exported('second')['parent_id'])
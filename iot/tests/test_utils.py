@@ -0,0 +1,64 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+from oslo_concurrency import processutils
+
+from iot.common import utils
+from iot.tests import base
+
+_WARN = ('sh', '-c', 'echo out; echo warning >&2')
+_FAIL = ('sh', '-c', 'echo out; echo error >&2; exit 3')
+
+
+class TrycmdTestCase(base.TestCase):
+    """trycmd() returns what oslo's trycmd() returns."""
+
+    def _assert_unchanged(self, cmd, **kwargs):
+        expected = processutils.trycmd(*cmd, **kwargs)
+        self.assertEqual(expected, utils.trycmd(*cmd, **kwargs))
+        return expected
+
+    def test_success(self):
+        out, err = self._assert_unchanged(('echo', 'out'))
+        self.assertEqual(('out\n', ''), (out, err))
+
+    def test_warnings_kept(self):
+        out, err = self._assert_unchanged(_WARN)
+        self.assertEqual(('out\n', 'warning\n'), (out, err))
+
+    def test_warnings_discarded(self):
+        out, err = self._assert_unchanged(_WARN, discard_warnings=True)
+        self.assertEqual(('out\n', ''), (out, err))
+
+    def test_failure(self):
+        out, err = self._assert_unchanged(_FAIL)
+        self.assertEqual('', out)
+        self.assertIn('Exit code: 3', err)
+        self.assertIn('error', err)
+
+    def test_failure_error_not_discarded(self):
+        out, err = self._assert_unchanged(_FAIL, discard_warnings=True)
+        self.assertIn('Exit code: 3', err)
+
+    def test_failure_recorded(self):
+        with mock.patch.object(utils, 'record_command') as record:
+            utils.trycmd(*_FAIL)
+        record.assert_called_once_with(_FAIL, mock.ANY, 3)
+
+    def test_run_as_root_uses_rootwrap(self):
+        with mock.patch.object(processutils, 'execute',
+                               return_value=('out', 'warning')) as execute:
+            self.assertEqual(('out', ''), utils.trycmd(
+                'ls', run_as_root=True, discard_warnings=True))
+        execute.assert_called_once_with(
+            'ls', run_as_root=True, root_helper=utils._get_root_helper())